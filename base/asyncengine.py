@@ -0,0 +1,387 @@
+#
+# Asyncio engine fetching jd of queued jobids with many requests in flight,
+# parsing and saving are left to the site's content scraper
+#
+# =====================================================================
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import aiohttp
+
+from settings.settings import (
+    ASYNC_CONCURRENCY,
+    ASYNC_PER_HOST,
+    ASYNC_TIMEOUT,
+    CONNECT_TIMEOUT,
+    HEDGE_JD_FETCHES,
+    HEDGE_PERCENTILE,
+    JD_DEADLINE,
+    READ_TIMEOUT,
+    USE_PROXIES,
+)
+from utils.circuit import is_block
+from utils.deadline import Deadline
+from utils.retry import (
+    CONNECTION,
+    ERROR_COUNTERS,
+    INCOMPLETE,
+    OK,
+    PROXY,
+    REQUEST,
+    SSL,
+    TIMEOUT,
+    classify_status,
+)
+
+# Status codes saved as <missing> unless the scraper sets missing_status
+MISSING_STATUS = (404, 410)
+
+
+def proxy_url(proxy):
+    """Return the url aiohttp connects to a proxy of the pool with,
+    the pool keeps them as "ip:port" as requests takes them
+    """
+    if not proxy or "://" in proxy:
+        return proxy
+    return "http://" + proxy
+
+
+class AsyncContentEngine:
+    """Run a content scraper with one event loop instead of one request
+    at a time. The scraper provides content_url(jobid),
+    parse_job_content(html), rqueue, jd_writer, record and log,
+    site is the name its unfinished work is recorded under.
+
+    Connections per host are capped by the connector, so raising
+    ASYNC_CONCURRENCY never puts more than ASYNC_PER_HOST sockets
+    on a site.
+    """
+
+    def __init__(
+        self,
+        scraper,
+        site,
+        concurrency=ASYNC_CONCURRENCY,
+        per_host=ASYNC_PER_HOST,
+        timeout=ASYNC_TIMEOUT,
+    ):
+        self.scraper = scraper
+        self.site = site
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.missing_status = getattr(scraper, "missing_status", MISSING_STATUS)
+        self.retry_empty_page = getattr(scraper, "retry_empty_page", False)
+
+        # Redis pops and db writes block, they run off the event loop.
+        # The jd writer is not thread safe so it gets a single thread
+        self._redis = ThreadPoolExecutor(max_workers=1)
+        self._db = ThreadPoolExecutor(max_workers=1)
+
+    def run(self):
+        """Scrape jobids from the queue until it dries up"""
+        try:
+            asyncio.run(self.main())
+        finally:
+            self._redis.shutdown()
+            self._db.shutdown()
+
+    async def call(self, executor, func, *args):
+        """Run a blocking call on executor without blocking the loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+    async def main(self):
+        jobids = asyncio.Queue(maxsize=self.concurrency * 2)
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.per_host
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.timeout, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT
+        )
+
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            fetchers = [
+                asyncio.create_task(self.fetcher(session, jobids))
+                for _ in range(self.concurrency)
+            ]
+            report = await self.feeder(jobids)
+            for _ in fetchers:
+                await jobids.put(None)
+            await asyncio.gather(*fetchers)
+
+        # Save whatever is left in the batch
+        await self.call(self._db, partial(self.scraper.jd_writer.flush, final=True))
+        if report:
+            # Put record into queue for latter use
+            self.scraper.record_http_stats()
+            await self.call(self._redis, self.scraper.rqueue.put, self.scraper.record)
+
+    async def feeder(self, jobids):
+        """Move jobids from the Redis queue to the fetchers
+
+        # Returns:
+            True if the session records were reached, False if the
+            queue stayed empty
+        """
+        rqueue = self.scraper.rqueue
+        num_record = 0
+        empty = 0
+        while True:
+            # Jobids left in the queue wait for the next session
+            if self.scraper.session_deadline.expired():
+                self.scraper.log.info("-Session deadline expired \n")
+                queued = await self.call(self._redis, rqueue.size)
+                await self.call(
+                    None,
+                    partial(
+                        self.scraper.record_unfinished,
+                        self.site,
+                        "session",
+                        queued=queued,
+                    ),
+                )
+                return True
+
+            item = await self.call(self._redis, rqueue.pop, True, 10)
+            if not item:
+                empty += 1
+                if empty >= 3:
+                    return False
+                continue
+
+            if isinstance(item, bytes):
+                item = item.decode("utf-8")
+
+            # A dict or an item with length >=50 is a json record,
+            # put back to queue for latter use
+            if isinstance(item, dict) or len(item) >= 50:
+                num_record += 1
+                await self.call(self._redis, rqueue.put, item)
+                if num_record >= 90:
+                    return True
+            else:
+                await jobids.put(item)
+
+    async def fetcher(self, session, jobids):
+        """Scrape jobids until a None is received"""
+        while True:
+            jobid = await jobids.get()
+            if jobid is None:
+                return
+            deadline = Deadline(JD_DEADLINE, parent=self.scraper.session_deadline)
+            try:
+                await asyncio.wait_for(
+                    self.fetch_job_content(session, jobid), deadline.remaining()
+                )
+            except asyncio.TimeoutError:
+                self.scraper.log.info("-Deadline of jobid {} expired \n".format(jobid))
+                await self.call(
+                    None,
+                    partial(
+                        self.scraper.record_unfinished, self.site, "jd", jobid=jobid
+                    ),
+                )
+            except Exception as ex:
+                self.scraper.log.exception("-Unknown Exceptions: {} \n".format(ex))
+                self.scraper.record["other_errors"] += 1
+
+    async def fetch_job_content(self, session, jobid):
+        """Fetch, parse and save jd of jobid, retried by the scraper's
+        retry policy
+
+        Jobids are queued once, when their info row is inserted, so
+        the existed-jd check is left to the insert's ON CONFLICT
+        """
+        scraper = self.scraper
+        record = scraper.record
+        headers = scraper.get_headers()
+
+        url = scraper.content_url(jobid)
+        scraper.retry.started(url)
+        attempt = 0
+        while True:
+            attempt += 1
+
+            jd = None
+            jd_start = time.time()
+            try:
+                if HEDGE_JD_FETCHES:
+                    status, html = await self.get_page_hedged(session, url, headers)
+                else:
+                    status, html = await self.get_page(session, url, headers)
+
+            except aiohttp.ClientSSLError as s:
+                scraper.log.exception("-SSL Error: {}".format(s))
+                outcome = SSL
+            except (aiohttp.ClientProxyConnectionError, aiohttp.InvalidURL) as p:
+                scraper.log.exception("-Proxy Error: {}".format(p))
+                outcome = PROXY
+            except aiohttp.ClientConnectionError as ce:
+                scraper.log.exception("-Connection Error: {} \n".format(ce))
+                outcome = CONNECTION
+            except asyncio.TimeoutError as t:
+                scraper.log.exception("-Request timed out: {} \n".format(t))
+                outcome = TIMEOUT
+            except aiohttp.ClientError as e:
+                scraper.log.exception("-Request failed: {} \n".format(e))
+                outcome = REQUEST
+
+            else:
+                if status in self.missing_status:
+                    jd = "<missing>"
+                    outcome = OK
+                elif status == 200:
+                    # Parsing runs off the loop so sockets keep being read
+                    jd = await self.call(None, scraper.parse_job_content, html)
+                    if jd is None and self.retry_empty_page:
+                        outcome = INCOMPLETE
+                    else:
+                        outcome = OK
+                else:
+                    outcome = classify_status(status)
+
+            if jd:
+                await self.call(self._db, scraper.jd_writer.add, jobid, jd)
+                record["total_time_jd"] += time.time() - jd_start
+                scraper.log.info("-saved: {}".format(jobid))
+                return
+
+            if outcome in ERROR_COUNTERS:
+                record[ERROR_COUNTERS[outcome]] += 1
+
+            delay = scraper.retry.retry_delay(url, outcome, attempt, record=record)
+            if delay is None:
+                if outcome != OK:
+                    scraper.log.debug("-Cant to get jd jobid: {} \n".format(jobid))
+                return
+            if outcome == PROXY:
+                await self.call(self._redis, scraper.reset_proxy_pool)
+            await asyncio.sleep(delay)
+            headers = scraper.get_headers()
+
+    async def get_page(self, session, url, headers):
+        """Make one request for url once the rate limit of its host allows
+
+        # Returns:
+            status and html of the page, html is None unless status is 200
+        """
+        scraper = self.scraper
+
+        # Every process pauses while the host blocks us
+        while True:
+            wait, probe = await self.call(None, scraper.breaker.check, url)
+            if not wait:
+                break
+            scraper.record["total_time_circuit_wait"] += wait
+            await asyncio.sleep(wait)
+
+        # Token of the host is shared with every other process
+        waited = await self.call(None, scraper.limiter.reserve, url)
+        if waited > 0:
+            await asyncio.sleep(waited)
+            scraper.record["total_time_rate_wait"] += waited
+
+        proxy = None
+        if USE_PROXIES:
+            proxies = await self.call(None, scraper.get_proxies)
+            proxy = proxies and proxies["https"]
+
+        # Outcome of the request adjusts the rate of the host, the health
+        # of the proxy and the circuit of the host
+        start = time.time()
+        try:
+            async with session.get(
+                url, headers=headers, proxy=proxy_url(proxy)
+            ) as page:
+                status = page.status
+                html = None
+                if status == 200:
+                    html = (await page.read()).decode("utf-8", "ignore")
+        except (
+            aiohttp.ClientSSLError,
+            aiohttp.ClientProxyConnectionError,
+            aiohttp.InvalidURL,
+        ):
+            # Not a sign of the host being overloaded
+            scraper.proxy_pool.report(proxy, False)
+            await self.call(None, scraper.breaker.report, url, None, probe)
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            scraper.proxy_pool.report(proxy, False)
+            await self.call(None, scraper.limiter.observe, url)
+            await self.call(None, scraper.breaker.report, url, None, probe)
+            raise
+        except BaseException:
+            # Cancelled by the deadline or a hedge, or failed otherwise.
+            # The probe is given up off the loop without waiting, as a
+            # cancelled task must not block nor await
+            if probe is not None:
+                loop = asyncio.get_running_loop()
+                loop.run_in_executor(None, scraper.breaker.report, url, None, probe)
+            raise
+        elapsed = time.time() - start
+        await self.call(None, scraper.limiter.observe, url, status, elapsed)
+
+        # Anything but a page or a missing job means the proxy is blocked
+        ok = status < 300 or status in self.missing_status
+        scraper.proxy_pool.report(proxy, ok, elapsed)
+
+        blocked = is_block(status, self.missing_status)
+        opened = await self.call(None, scraper.breaker.report, url, not blocked, probe)
+        if opened:
+            scraper.record["circuit_opens"] += 1
+        return status, html
+
+    async def get_page_hedged(self, session, url, headers):
+        """Make one request for url, sending a second one with other
+        headers if the first is slower than HEDGE_PERCENTILE of recent
+        requests. The first response wins and the other is cancelled.
+
+        # Returns:
+            status and html of the page, see get_page
+        """
+        scraper = self.scraper
+        latency = scraper.hedge_latency
+
+        start = time.time()
+        first = asyncio.ensure_future(self.get_page(session, url, headers))
+        pending = {first}
+        error = None
+        try:
+            threshold = latency.percentile(HEDGE_PERCENTILE)
+            done, _ = await asyncio.wait(pending, timeout=threshold)
+            if done:
+                pending = set()
+                page = first.result()
+                latency.add(time.time() - start)
+                return page
+
+            hedge = asyncio.ensure_future(
+                self.get_page(session, url, scraper.get_headers())
+            )
+            pending.add(hedge)
+            scraper.record["hedges_sent"] += 1
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is hedge:
+                        scraper.record["hedge_wins"] += 1
+                    latency.add(time.time() - start)
+                    return task.result()
+            raise error
+        finally:
+            # Also when the jd deadline cancels this request
+            for task in pending:
+                task.cancel()
@@ -5,15 +5,56 @@
 # ===============================================================
 
 
+import json
 import smtplib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from datetime import datetime
 from itertools import cycle
 
-import pandas as pd
-from psycopg2.pool import ThreadedConnectionPool
+import requests
+from psycopg2.errors import InvalidSqlStatementName
+from redis.exceptions import RedisError
+
+from base.session import connection_stats, get_session
+from base.pool import get_pool
+from settings.settings import (
+    DB_LAZY_CONNECT,
+    HEDGE_PERCENTILE,
+    MISSING_JD_CHUNK_SIZE,
+    PARTITION_ARCHIVE_SCHEMA,
+    PARTITION_MONTHS_AHEAD,
+    PARTITIONED_TABLES,
+    PIPELINE_FETCHERS,
+    PROXY_MIN_HEALTHY,
+    REGISTRY_CHECK_SECONDS,
+    USE_PROXIES,
+)
+from utils.circuit import CircuitBreaker, is_block
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.latency import LatencyWindow
+from utils.proxypool import ProxyPool
+from utils.ratelimit import RateLimiter
+from utils.RedisQueue import RedisQueue
+from utils.registry import Registry
+from utils.retry import (
+    ERROR_COUNTERS,
+    OK,
+    PROXY,
+    RetryPolicy,
+    classify_error,
+    classify_status,
+)
+from utils.utils import month_start, read_proxies, read_user_agents
+
+
+def close_page(future):
+    """Close the response of a request nobody waits for anymore"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
 
-from utils.utils import download_free_proxies
 
 # 'object' passing into class makes it a new-style class in modern python
 
@@ -24,69 +65,371 @@ class ScraperBase:
     def __init__(self):
         self.NOW = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.connect_db()
-        proxies = self.load_proxies()
-        headers = self.load_user_headers()
-        self.proxy_pool = cycle(proxies)
+
+        # Proxies and headers shared by all scrapers, kept by refresher.py
+        self.registry = Registry()
+        self.registry_version, proxies, headers = self.load_registry()
+        self.registry_checked = time.time()
+        if not proxies:
+            proxies = self.load_proxies()
+        if not headers:
+            headers = self.load_user_headers()
+        self.proxy_pool = ProxyPool(proxies)
         self.header_pool = cycle(headers)
 
+        # HTTP session shared by scrapers of this process
+        self.session = get_session()
+        self.http_baseline = connection_stats(self.session)
+        self.limiter = RateLimiter()
+        self.breaker = CircuitBreaker()
+        self.retry = RetryPolicy()
+
+        # Hedged requests: latencies they are timed against and the
+        # threads racing them, two for each pipeline fetcher so requests
+        # never queue for a thread and skew the latencies
+        self.hedge_latency = LatencyWindow()
+        self.hedge_executor = ThreadPoolExecutor(max_workers=PIPELINE_FETCHERS * 2)
+        # Counters of record are updated by these threads and by those
+        # of the pipeline at once, see count
+        self.record_lock = threading.Lock()
+
+        # Deadline of the whole session, set by the runner, and of the
+        # work in progress, which requests are timed out against
+        self.session_deadline = Deadline()
+        self.deadline = self.session_deadline
+
+        # Site -> True if its {site}jobs is partitioned, asked once
+        self.partitioned = {}
+
     # +  -  -  - PROXIES AND HEADERS -  -  - +
 
+    def load_registry(self):
+        """Return version, proxies and headers shared in Redis,
+        version 0 and empty sets if they cannot be read
+        """
+        try:
+            return self.registry.load()
+        except RedisError as e:
+            print(e)
+            return 0, set(), set()
+
+    def sync_registry(self):
+        """Pick up a new version of shared proxies and headers,
+        looked for at most every REGISTRY_CHECK_SECONDS
+        """
+        if time.time() - self.registry_checked < REGISTRY_CHECK_SECONDS:
+            return
+        self.registry_checked = time.time()
+        try:
+            if self.registry.version() <= self.registry_version:
+                return
+        except RedisError as e:
+            print(e)
+            return
+
+        version, proxies, headers = self.load_registry()
+        if version:
+            self.registry_version = version
+            # Health of proxies already known is kept
+            self.proxy_pool.add(proxies)
+            if headers:
+                self.header_pool = cycle(headers)
+
     def load_proxies(self):
-        """Load proxies from csv file and return a set of proxies"""
+        """Load proxies from csv file and return a set of proxies
+        # used until refresher.py has shared any
+        """
         proxies = set()
         try:
-            df = pd.read_csv("./utils/proxy_files/proxies.csv")
-            for i, r in df.iterrows():
-                proxy = ":".join([r["IP Address"], str(r["Port"])[:-2]])
-                proxies.add(proxy)
+            proxies.update(read_proxies())
         except Exception as e:
             print(e)
 
         return proxies
 
     def load_user_headers(self):
-        """Load headers from csv file and return a set of headers"""
-        headers = set()
-        df = pd.read_csv("./utils/proxy_files/user_agents.csv")
-        for i, r in df.iterrows():
-            headers.add(r["User agent"])
-        return headers
+        """Load headers from csv file and return a set of headers
+        # used until refresher.py has shared any
+        """
+        return set(read_user_agents())
 
     def get_proxies(self):
-        """Get the next proxy in proxy pool"""
-        proxy = next(self.proxy_pool)
+        """Get a proxy from proxy pool, healthier proxies more often"""
+        self.sync_registry()
+        proxy = self.proxy_pool.pick()
+        if proxy is None:
+            return None
         return {"http": proxy, "https": proxy}
 
     def get_headers(self):
         """Get the next header in header pool"""
+        self.sync_registry()
         headers = next(self.header_pool)
         return {"User-Agent": headers}
 
     def reset_proxy_pool(self):
-        """Download new proxies, save to csv and load csv"""
-        download_free_proxies()
-        proxies = self.load_proxies()
-        self.proxy_pool = cycle(proxies)
+        """Ask refresher.py for new proxies without waiting for them
+        # only when too few proxies of the pool are left healthy
+        """
+        if self.proxy_pool.healthy() >= PROXY_MIN_HEALTHY:
+            return
+        try:
+            self.registry.request_refresh()
+        except RedisError as e:
+            print(e)
+        # Look for the new version on the next pick
+        self.registry_checked = 0
+
+    # +  -  -  - HTTP -  -  - +
+
+    def http_get(self, url, hedge=False, **kwargs):
+        """Get url with the HTTP session shared by this process
+        # failed attempts are counted in record and retried by the
+        # retry policy, with new headers and proxy
+        # each attempt is hedged if hedge, see http_get_hedged
+        # raises the error of the last attempt if all failed
+        """
+        record = getattr(self, "record", None)
+        self.retry.started(url)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if hedge:
+                    page = self.http_get_hedged(url, **kwargs)
+                else:
+                    page = self.http_get_once(url, **kwargs)
+                error = None
+                outcome = self.classify_page(page, kwargs)
+            except requests.exceptions.RequestException as e:
+                page = None
+                error = e
+                outcome = classify_error(e)
+
+            if outcome in ERROR_COUNTERS:
+                self.count(ERROR_COUNTERS[outcome])
+
+            # Counts retries in record
+            with self.record_lock:
+                delay = self.retry.retry_delay(
+                    url, outcome, attempt, self.deadline, record
+                )
+            if delay is None:
+                if error is not None:
+                    raise error
+                return page
+
+            if page is not None:
+                page.close()
+            if outcome == PROXY:
+                self.reset_proxy_pool()
+            if "headers" in kwargs:
+                kwargs["headers"] = self.get_headers()
+            time.sleep(delay)
+
+    def classify_page(self, page, kwargs):
+        """Return outcome of a response, statuses the caller handles
+        itself are not retried: those of a missing job and redirects
+        requested with allow_redirects=False
+        """
+        status = page.status_code
+        if status in getattr(self, "missing_status", ()):
+            return OK
+        if 300 <= status < 400 and not kwargs.get("allow_redirects", True):
+            return OK
+        return classify_status(status)
+
+    def http_get_once(self, url, **kwargs):
+        """Make one request for url
+        # headers and proxies are given per request so rotation still works
+        # waits for the rate limit of the host shared by all processes,
+        # which adapts to the responses
+        # waits while the circuit of the host is open
+        # raises DeadlineExceeded once the current deadline has passed
+        """
+        probe = self.wait_circuit(url)
+
+        waited = self.limiter.acquire(url)
+        if waited:
+            self.count("total_time_rate_wait", waited)
+
+        # Requests never outlive the work in progress
+        try:
+            self.deadline.check()
+        except DeadlineExceeded:
+            self.breaker.report(url, None, probe)
+            raise
+        kwargs.setdefault("timeout", self.deadline.timeout())
+
+        if USE_PROXIES and "proxies" not in kwargs:
+            kwargs["proxies"] = self.get_proxies()
+        proxy = (kwargs.get("proxies") or {}).get("https")
+
+        # Outcome of the request adjusts the rate of the host,
+        # the health of the proxy and the circuit of the host
+        start = time.time()
+        try:
+            page = self.session.get(url, **kwargs)
+        except (requests.exceptions.ProxyError, requests.exceptions.SSLError):
+            # Not a sign of the host being overloaded
+            self.proxy_pool.report(proxy, False)
+            self.breaker.report(url, None, probe)
+            raise
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            self.proxy_pool.report(proxy, False)
+            self.limiter.observe(url)
+            self.breaker.report(url, None, probe)
+            raise
+        except Exception:
+            self.breaker.report(url, None, probe)
+            raise
+        elapsed = time.time() - start
+        self.limiter.observe(url, page.status_code, elapsed)
+
+        # Anything but a page or a missing job means the proxy is blocked
+        status = page.status_code
+        self.proxy_pool.report(proxy, status < 300 or status in (404, 410), elapsed)
+
+        blocked = is_block(status, getattr(self, "missing_status", ()))
+        if self.breaker.report(url, not blocked, probe):
+            self.count("circuit_opens")
+        return page
+
+    def wait_circuit(self, url):
+        """Wait while the circuit of the host of url is open
+        # Returns:
+            probe token if this request probes the host, else None
+        # raises DeadlineExceeded if the deadline passes while waiting
+        """
+        while True:
+            self.deadline.check()
+            wait, probe = self.breaker.check(url)
+            if not wait:
+                return probe
+            left = self.deadline.remaining()
+            if left is not None:
+                wait = min(wait, left)
+            self.count("total_time_circuit_wait", wait)
+            time.sleep(wait)
+
+    def http_get_hedged(self, url, **kwargs):
+        """Make one request for url, sending a second one with other
+        headers and proxy if the first is slower than HEDGE_PERCENTILE of
+        recent requests
+        # the first response wins, the loser is cancelled if not sent yet,
+        # else closed when it arrives, as requests cannot be interrupted
+        # raises the error of the first request failing if both failed
+        """
+        if USE_PROXIES and "proxies" not in kwargs:
+            kwargs["proxies"] = self.get_proxies()
+
+        start = time.time()
+        first = self.hedge_executor.submit(self.http_get_once, url, **kwargs)
+        threshold = self.hedge_latency.percentile(HEDGE_PERCENTILE)
+        done, _ = wait([first], timeout=threshold)
+        if done:
+            page = first.result()
+            self.hedge_latency.add(time.time() - start)
+            return page
+
+        hedge_kwargs = dict(kwargs, headers=self.get_headers())
+        if USE_PROXIES:
+            hedge_kwargs["proxies"] = self.other_proxies(kwargs["proxies"])
+        hedge = self.hedge_executor.submit(self.http_get_once, url, **hedge_kwargs)
+        self.count("hedges_sent")
+
+        pending = {first, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                for loser in (first, hedge):
+                    if loser is not future and not loser.cancel():
+                        loser.add_done_callback(close_page)
+                if future is hedge:
+                    self.count("hedge_wins")
+                self.hedge_latency.add(time.time() - start)
+                return future.result()
+        raise error
+
+    def other_proxies(self, proxies):
+        """Get a proxy other than proxies if the pool has a healthy one"""
+        for _ in range(3):
+            other = self.get_proxies()
+            if other != proxies:
+                break
+        return other
+
+    def start_deadline(self, seconds):
+        """Start the deadline of a piece of work, ending no later than
+        the session, and time requests out against it
+        """
+        self.deadline = Deadline(seconds, parent=self.session_deadline)
+        return self.deadline
+
+    def record_unfinished(self, site, stage, **item):
+        """Keep work cut by a deadline in the {site}_unfinished queue
+
+        # Arguments:
+            site: name of the site
+            stage: "category", "jd" or "session"
+            item: what was left, e.g. category/page or jobid
+        """
+        item["stage"] = stage
+        item["at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        RedisQueue("{}_unfinished".format(site)).put(item)
+        self.count("deadlines_expired")
+
+    def count(self, key, amount=1):
+        """Add amount to a counter of record, if the scraper keeps one
+        # fetch and hedge threads count into the same record, so counters
+        # are only updated under record_lock
+        """
+        record = getattr(self, "record", None)
+        if record is None:
+            return
+        with self.record_lock:
+            record[key] = record.get(key, 0) + amount
+
+    def record_http_stats(self):
+        """Put requests and new connections made by this scraper into record"""
+
+        requests_made, connections = connection_stats(self.session)
+        self.record["http_requests"] = requests_made - self.http_baseline[0]
+        self.record["http_new_connections"] = connections - self.http_baseline[1]
 
     # +  -  -  - DATABASE -  -  - +
 
     def connect_db(self):
-        """Connect to db on cloud"""
-        self._connpool = ThreadedConnectionPool(
-            1,
-            2,
-            database="bitko",
-            user="steve",
-            host="localhost",
-            port="5432",
-        )
+        """Use the connection pool shared by this process"""
+        self._connpool = None
+        if not DB_LAZY_CONNECT:
+            self._connpool = get_pool()
+
+    def getconn(self):
+        """Get a connection from the conn pool and record the wait"""
+
+        if self._connpool is None:
+            self._connpool = get_pool()
+
+        # Get available connection from pool, wait if all are in use
+        wait_start = time.time()
+        conn = self._connpool.getconn()
+        wait_end = time.time()
+
+        self.count("db_checkouts")
+        self.count("total_time_db_wait", wait_end - wait_start)
+
+        return conn
 
     @contextmanager
     def cursor(self):
         """Get a cursor from the conn pool"""
 
-        # Get available connection from pool
-        conn = self._connpool.getconn()
+        conn = self.getconn()
         conn.autocommit = True
         try:
             # Return a generator cursor() created on the fly
@@ -95,41 +438,363 @@ class ScraperBase:
             # Return the connection back to connection pool
             self._connpool.putconn(conn)
 
-    def query_list(self, sql):
+    @contextmanager
+    def server_cursor(self, name):
+        """Get a named cursor, rows stay on server and are fetched in chunks"""
+
+        conn = self.getconn()
+        # Named cursors only live inside a transaction
+        conn.autocommit = False
+        try:
+            yield conn.cursor(name=name)
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+            self._connpool.putconn(conn)
+
+    def query_list(self, sql, params=None):
         with self.cursor() as cur:
-            cur.execute(sql)
+            cur.execute(sql, params)
             results = [i for i in cur.fetchall()]
         return results
 
-    def query_one(self, sql):
+    def query_one(self, sql, params=None):
         with self.cursor() as cur:
-            cur.execute(sql)
+            cur.execute(sql, params)
             result = cur.fetchone()
         return result
 
-    def execute(self, sql):
+    def execute(self, sql, params=None):
         """Execute sql command"""
         with self.cursor() as cur:
-            cur.execute(sql)
+            cur.execute(sql, params)
+
+    def execute_prepared(self, cur, name, sql, params):
+        """Execute a statement prepared once per connection
+
+        # Arguments:
+            cur: cursor of the connection running the statement
+            name: statement name, unique for each sql (and site)
+            sql: statement using $1, $2... as placeholders
+            params: tuple of values bound to the placeholders
+        """
+
+        prepared = self._connpool.prepared.setdefault(id(cur.connection), set())
+        prepare_sql = "PREPARE {} AS {}".format(name, sql)
+        execute_sql = "EXECUTE {} ({})".format(name, ", ".join(["%s"] * len(params)))
+
+        if name not in prepared:
+            cur.execute(prepare_sql)
+            prepared.add(name)
+
+        try:
+            cur.execute(execute_sql, params)
+        except InvalidSqlStatementName:
+            # Connection was replaced in pool, prepare it again
+            cur.execute(prepare_sql)
+            cur.execute(execute_sql, params)
 
     # +  -  -  - QUERIES -  -  - +
 
     def creat_table_db(self, site):
         """
-        Create table for job scraper
+        Create tables for job scraper
         # Columns:
-            primary key, info, jd
+            {site}jobs: primary key, jobid, info, scraped_at
+            {site}jd: jobid, jd, scraped_at (append only)
+            {site}jobids: jobid, only for a partitioned {site}jobs
+        # If PARTITIONED_TABLES, a new {site}jobs is partitioned by month
+        # of scraped_at, an existing table is kept as it is
         """
 
+        if PARTITIONED_TABLES:
+            jobs_sql = """
+                CREATE TABLE IF NOT EXISTS {0}jobs
+                (
+                    id uuid NOT NULL DEFAULT uuid_generate_v4(),
+                    jobid TEXT NOT NULL,
+                    info json,
+                    scraped_at TIMESTAMP NOT NULL DEFAULT now(),
+                    PRIMARY KEY (jobid, scraped_at)
+                ) PARTITION BY RANGE (scraped_at);
+              """
+        else:
+            jobs_sql = """
+                CREATE TABLE IF NOT EXISTS {0}jobs
+                (
+                    id uuid PRIMARY KEY DEFAULT uuid_generate_v4(),
+                    jobid TEXT,
+                    info json,
+                    scraped_at TIMESTAMP DEFAULT now()
+                );
+              """
+
         sql = """
             CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
-            CREATE TABLE IF NOT EXISTS {}jobs
+            {1}
+            CREATE TABLE IF NOT EXISTS {0}jd
             (
-                id uuid PRIMARY KEY DEFAULT uuid_generate_v4(),
-                info json,
-                jd TEXT
+                jobid TEXT PRIMARY KEY,
+                jd TEXT NOT NULL,
+                scraped_at TIMESTAMP NOT NULL DEFAULT now()
             );
           """.format(
+            site, jobs_sql.format(site)
+        )
+
+        with self.cursor() as cur:
+            cur.execute(sql)
+
+        self.migrate_jobid_column(site)
+        self.migrate_scraped_at_column(site)
+        self.migrate_jd_table(site)
+
+        if self.is_partitioned(site):
+            self.create_partitions(site)
+            self.migrate_jobids_table(site)
+
+    def is_partitioned(self, site):
+        """Check if {site}jobs is a partitioned table"""
+
+        sql = """
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = %s;
+            """
+
+        if self.query_one(sql, ("{}jobs".format(site),)):
+            return True
+        return False
+
+    def is_partitioned_cached(self, site):
+        """is_partitioned, asked once per site as tables keep their layout"""
+
+        if site not in self.partitioned:
+            self.partitioned[site] = self.is_partitioned(site)
+        return self.partitioned[site]
+
+    def create_partitions(self, site, months_ahead=PARTITION_MONTHS_AHEAD):
+        """Create monthly partitions of {site}jobs from this month
+        to `months_ahead` months later, plus a default partition
+        """
+
+        this_month = month_start(datetime.now().date())
+
+        sql = """
+            CREATE TABLE IF NOT EXISTS {0}jobs_default
+            PARTITION OF {0}jobs DEFAULT;
+            """.format(
+            site
+        )
+
+        for i in range(months_ahead + 1):
+            start = month_start(this_month, i)
+            end = month_start(this_month, i + 1)
+            sql += """
+                CREATE TABLE IF NOT EXISTS {0}jobs_{1}
+                PARTITION OF {0}jobs
+                FOR VALUES FROM ('{2}') TO ('{3}');
+                """.format(
+                site, start.strftime("y%Ym%m"), start, end
+            )
+
+        with self.cursor() as cur:
+            cur.execute(sql)
+
+    def archive_partitions(self, site, keep_months):
+        """Detach monthly partitions of {site}jobs older than `keep_months`
+        months and move them to PARTITION_ARCHIVE_SCHEMA
+
+        # Returns:
+            names of archived partitions
+        """
+
+        oldest = month_start(datetime.now().date(), -keep_months)
+
+        sql = """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s;
+            """
+
+        archived = []
+        for (name,) in self.query_list(sql, ("{}jobs".format(site),)):
+            # Partition names end with y<year>m<month>
+            month = name[len(site) + len("jobs_") :]
+            if not month.startswith("y"):
+                continue
+            if datetime.strptime(month, "y%Ym%m").date() >= oldest:
+                continue
+
+            sql = """
+                ALTER TABLE {0}jobs DETACH PARTITION {1};
+                CREATE SCHEMA IF NOT EXISTS {2};
+                ALTER TABLE {1} SET SCHEMA {2};
+                """.format(
+                site, name, PARTITION_ARCHIVE_SCHEMA
+            )
+
+            with self.cursor() as cur:
+                cur.execute(sql)
+            archived.append(name)
+
+        return archived
+
+    def has_column(self, table, column):
+        """Check if a column exists in table"""
+
+        sql = """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = %s
+            AND column_name = %s;
+            """
+
+        with self.cursor() as cur:
+            cur.execute(sql, (table, column))
+            result = cur.fetchone()
+
+        if result:
+            return True
+        return False
+
+    def migrate_jobid_column(self, site):
+        """
+        Make sure table has a typed jobid column with a unique index
+        # Tables created before the column existed are backfilled from
+        # info->>'jobid' and duplicated jobids are removed (rows with jd kept)
+        """
+
+        if not self.has_column("{}jobs".format(site), "jobid"):
+            sql = """
+                ALTER TABLE {0}jobs ADD COLUMN IF NOT EXISTS jobid TEXT;
+
+                UPDATE {0}jobs SET jobid = info->>'jobid'
+                WHERE jobid IS NULL;
+
+                DELETE FROM {0}jobs a USING {0}jobs b
+                WHERE a.jobid = b.jobid
+                AND (
+                    (a.jd IS NULL AND b.jd IS NOT NULL)
+                    OR ((a.jd IS NULL) = (b.jd IS NULL) AND a.ctid > b.ctid)
+                );
+                """.format(
+                site
+            )
+
+            with self.cursor() as cur:
+                cur.execute(sql)
+
+        # Unique indexes of a partitioned table must contain scraped_at,
+        # jobids are kept unique by {site}jobids instead
+        if self.is_partitioned(site):
+            unique = ""
+        else:
+            unique = "UNIQUE"
+
+        sql = """
+            CREATE {1} INDEX IF NOT EXISTS {0}jobs_jobid_idx
+            ON {0}jobs (jobid);
+            """.format(
+            site, unique
+        )
+
+        with self.cursor() as cur:
+            cur.execute(sql)
+
+    def migrate_jobids_table(self, site):
+        """
+        Make sure a partitioned {site}jobs has its {site}jobids table
+        # Every jobid is inserted there first in the same statement as its
+        # row of {site}jobs, its primary key keeps jobids unique across
+        # partitions and across processes inserting at once
+        # Jobids of archived partitions stay, they are not scraped again
+        """
+
+        if self.query_one("SELECT to_regclass(%s)", ("{}jobids".format(site),))[0]:
+            return
+
+        sql = """
+            CREATE TABLE IF NOT EXISTS {0}jobids
+            (
+                jobid TEXT PRIMARY KEY
+            );
+
+            INSERT INTO {0}jobids (jobid)
+            SELECT DISTINCT jobid FROM {0}jobs
+            WHERE jobid IS NOT NULL
+            ON CONFLICT DO NOTHING;
+            """.format(
+            site
+        )
+
+        with self.cursor() as cur:
+            cur.execute(sql)
+
+    def migrate_scraped_at_column(self, site):
+        """
+        Make sure table has a typed scraped_at column
+        # Tables created before the column existed are backfilled from
+        # info->>'scraped_at'
+        """
+
+        if not self.has_column("{}jobs".format(site), "scraped_at"):
+            sql = """
+                ALTER TABLE {0}jobs ADD COLUMN IF NOT EXISTS scraped_at TIMESTAMP;
+
+                UPDATE {0}jobs SET scraped_at = (info->>'scraped_at')::timestamp
+                WHERE scraped_at IS NULL;
+
+                ALTER TABLE {0}jobs ALTER COLUMN scraped_at SET DEFAULT now();
+                """.format(
+                site
+            )
+
+            with self.cursor() as cur:
+                cur.execute(sql)
+
+        if not self.is_partitioned(site):
+            # Rows are appended in time order, a small brin index is enough
+            sql = """
+                CREATE INDEX IF NOT EXISTS {0}jobs_scraped_at_idx
+                ON {0}jobs USING brin (scraped_at);
+                """.format(
+                site
+            )
+
+            with self.cursor() as cur:
+                cur.execute(sql)
+
+    def migrate_jd_table(self, site):
+        """
+        Move jd out of {site}jobs into the append only {site}jd table
+        # {site}jobs_with_jd view keeps the old (id, jobid, info, jd) shape
+        # for readers of the old table
+        """
+
+        if self.has_column("{}jobs".format(site), "jd"):
+            sql = """
+                INSERT INTO {0}jd (jobid, jd)
+                SELECT jobid, jd FROM {0}jobs
+                WHERE jobid IS NOT NULL
+                AND jd IS NOT NULL
+                ON CONFLICT (jobid) DO NOTHING;
+
+                DROP VIEW IF EXISTS {0}jobs_with_jd;
+                ALTER TABLE {0}jobs DROP COLUMN jd;
+                """.format(
+                site
+            )
+
+            with self.cursor() as cur:
+                cur.execute(sql)
+
+        sql = """
+            CREATE OR REPLACE VIEW {0}jobs_with_jd AS
+            SELECT j.id, j.jobid, j.info, d.jd
+            FROM {0}jobs j
+            LEFT JOIN {0}jd d ON d.jobid = j.jobid;
+            """.format(
             site
         )
 
@@ -147,75 +812,183 @@ class ScraperBase:
         with self.cursor() as cur:
             cur.execute(sql)
 
+    def insert_jobs_sql(self, site):
+        """
+        Statement inserting arrays of jobids ($1), info ($2) and
+        scraped_at ($3) into {site}jobs, returning the jobids inserted
+        # Jobids already in the table are skipped, a jobid must not be
+        # twice in the arrays
+        """
+
+        if self.is_partitioned_cached(site):
+            # Partitioned tables have no unique index on jobid alone,
+            # only jobids new to {site}jobids are inserted
+            sql = """
+                WITH v AS (
+                    SELECT * FROM unnest($1::text[], $2::text[], $3::timestamp[])
+                        AS v (jobid, info, scraped_at)
+                ), new AS (
+                    INSERT INTO {0}jobids (jobid)
+                    SELECT jobid FROM v
+                    ON CONFLICT DO NOTHING
+                    RETURNING jobid
+                )
+                INSERT INTO {0}jobs (jobid, info, scraped_at)
+                SELECT v.jobid, v.info::json, v.scraped_at
+                FROM v JOIN new ON new.jobid = v.jobid
+                RETURNING jobid
+              """
+        else:
+            sql = """
+                INSERT INTO {0}jobs (jobid, info, scraped_at)
+                SELECT v.jobid, v.info::json, v.scraped_at
+                FROM unnest($1::text[], $2::text[], $3::timestamp[])
+                    AS v (jobid, info, scraped_at)
+                ON CONFLICT DO NOTHING
+                RETURNING jobid
+              """
+
+        return sql.format(site)
+
     def to_table_db(self, new_info, site):
-        """Add new information scraped to db table"""
+        """Add new information scraped to db table
+        # Returns:
+            True if the row was inserted, False if jobid already existed
+        """
 
-        sql = """
-            INSERT INTO {}jobs (info)
-            VALUES ('{}');
-          """
+        info = json.loads(new_info)
 
         with self.cursor() as cur:
-            cur.execute(sql.format(site, new_info))
+            self.execute_prepared(
+                cur,
+                "{}_to_table_db".format(site),
+                self.insert_jobs_sql(site),
+                ([info["jobid"]], [new_info], [info["scraped_at"]]),
+            )
+            inserted = cur.rowcount == 1
+        return inserted
+
+    def jobids_table(self, site):
+        """Table to look jobids up in, {site}jobids of a partitioned
+        {site}jobs also keeps jobids of archived partitions
+        """
+
+        if self.is_partitioned_cached(site):
+            return "{}jobids".format(site)
+        return "{}jobs".format(site)
 
     def check_existed_jobid(self, jobid, site):
         """Query db to see if a job already existed"""
 
         sql = """
-            SELECT info->>'jobid'
-            FROM {}jobs
-            WHERE info->>'jobid'='{}';
+            SELECT jobid
+            FROM {}
+            WHERE jobid = $1
             """.format(
-            site, jobid
+            self.jobids_table(site)
         )
 
-        result = self.query_one(sql)
+        with self.cursor() as cur:
+            self.execute_prepared(
+                cur, "{}_check_existed_jobid".format(site), sql, (jobid,)
+            )
+            result = cur.fetchone()
+
         if result:
             return True
         return False
 
+    def filter_new_jobids(self, jobids, site):
+        """Check a whole page of jobids in one query
+        # Returns:
+            set of jobids not yet in db table
+        """
+
+        if not jobids:
+            return set()
+
+        sql = """
+            SELECT jobid
+            FROM {}
+            WHERE jobid = ANY($1::text[])
+            """.format(
+            self.jobids_table(site)
+        )
+
+        with self.cursor() as cur:
+            self.execute_prepared(
+                cur, "{}_filter_new_jobids".format(site), sql, (list(jobids),)
+            )
+            existed = {i[0] for i in cur.fetchall()}
+        return set(jobids) - existed
+
     def jd_to_db(self, jobid, content, site):
-        """Save jd to db"""
+        """Save jd to db, jd of a jobid is only saved once"""
 
         sql = """
-            UPDATE {}jobs
-            SET jd = '{}'
-            WHERE (info ->> 'jobid') = '{}';
+            INSERT INTO {}jd (jobid, jd)
+            VALUES ($1, $2)
+            ON CONFLICT (jobid) DO NOTHING
             """.format(
-            site, content, jobid
+            site
         )
 
         with self.cursor() as cur:
-            cur.execute(sql)
+            self.execute_prepared(
+                cur, "{}_jd_to_db".format(site), sql, (jobid, content)
+            )
 
     def check_existed_jd(self, jobid, site):
         """Check if jd of jobid already scraped"""
 
         sql = """
-            SELECT jd FROM {}jobs
-            WHERE (info ->> 'jobid') = '{}'
-            AND jd IS NOT NULL;
+            SELECT jobid FROM {}jd
+            WHERE jobid = $1
             """.format(
-            site, jobid
+            site
         )
-        result = self.query_one(sql)
+
+        with self.cursor() as cur:
+            self.execute_prepared(
+                cur, "{}_check_existed_jd".format(site), sql, (jobid,)
+            )
+            result = cur.fetchone()
 
         if result:
             return True
         return False
 
-    def jobs_missing_jd(self, site):
-        """Get jobid from main table where jd is missing"""
+    def iter_jobs_missing_jd(self, site, chunk_size=MISSING_JD_CHUNK_SIZE):
+        """Stream jobids from main table where jd is missing
+
+        # Returns:
+            generator of lists of at most chunk_size jobids
+        """
 
         sql = """
-            SELECT info->>'jobid' from {}jobs
-            WHERE
-            jd is null;
+            SELECT j.jobid FROM {0}jobs j
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {0}jd d WHERE d.jobid = j.jobid
+            );
             """.format(
             site
         )
 
-        result = [i[0] for i in self.query_list(sql)]
+        with self.server_cursor("{}_missing_jd".format(site)) as cur:
+            cur.itersize = chunk_size
+            cur.execute(sql)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [i[0] for i in rows]
+
+    def jobs_missing_jd(self, site):
+        """Get jobid from main table where jd is missing"""
+
+        result = []
+        for jobids in self.iter_jobs_missing_jd(site):
+            result.extend(jobids)
         return result
 
     # +  -  -  - NOTIFY EXCEPTIONS -  -  - +
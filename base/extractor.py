@@ -0,0 +1,227 @@
+#
+# Extraction of job articles from field specs declared in settings,
+# compiled once per site so an article is walked once for all fields
+#
+# =====================================================================
+
+from functools import partial
+
+MISSING = "<missing>"
+
+# Salary units, eg: a year -> yearly
+PERIODS = {
+    "hour": "hourly",
+    "day": "daily",
+    "week": "weekly",
+    "month": "monthly",
+    "year": "yearly",
+}
+
+
+# +  -  -  - POST-PROCESSORS -  -  - +
+
+# A post-processor gets the key of its field and the tag found, None if
+# no selector matched, and returns the fields to set
+
+
+def text(key, tag, missing=MISSING, strip=" \n", trim=None):
+    """Text of tag
+
+    # Arguments:
+        missing: value if not found, None to leave the field out
+        strip: characters stripped off the text, None to keep it as is
+        trim: characters stripped off after, e.g. a trailing ",..."
+    """
+    if tag is None:
+        return {} if missing is None else {key: missing}
+    result = tag.get_text()
+    if strip is not None:
+        result = result.strip(strip)
+    if trim is not None:
+        result = result.strip(trim)
+    return {key: result}
+
+
+def first_word(key, tag):
+    """First word of the text of tag, e.g. a number of reviews"""
+    if tag is None:
+        return {key: MISSING}
+    return {key: tag.get_text().strip(" \n").split()[0]}
+
+
+def location(key, tag, states):
+    """Location, split into jobState and jobArea
+
+    # Arguments:
+        states: short names of states to their full names
+    """
+    info = {key: MISSING, "jobState": MISSING, "jobArea": MISSING}
+    if tag is None:
+        return info
+
+    result = tag.get_text().strip(" \n")
+    info[key] = result
+    words = result.split()
+
+    # separate location into state and area
+    if len(words) >= 2:
+        info["jobState"] = words[-1]
+        info["jobArea"] = " ".join(words[:-1])
+
+        # check if location is the same as state's full name
+        for k, val in states.items():
+            if " ".join(words) == val:
+                info["jobState"] = k
+                info["jobArea"] = MISSING
+    elif len(words) == 1:
+        for k, val in states.items():
+            if words[0] == k or words[0] == val:
+                info["jobState"] = k
+    return info
+
+
+def salary(key, tag):
+    """Salary with its unit, e.g. "$24 hourly" or "$40,000-$50,000 yearly",
+    left out if the text is neither
+    """
+    if tag is None:
+        return {key: MISSING}
+    words = tag.get_text().strip(" \n").split()
+    if len(words) == 3 and words[2] in PERIODS:
+        # eg: $24 an hour
+        return {key: "{} {}".format(words[0], PERIODS[words[2]])}
+    if len(words) == 5 and words[4] in PERIODS:
+        # eg: $40,000 - $50,000 a year
+        return {key: "{}-{} {}".format(words[0], words[2], PERIODS[words[4]])}
+    return {}
+
+
+def sponsored(key, tag):
+    """Whether the job ad is sponsored and by who"""
+    if tag is None:
+        return {key: False, "sponsored_by": MISSING}
+    words = tag.get_text().strip(" \n").split()
+    return {key: True, "sponsored_by": words[-1] if len(words) >= 2 else MISSING}
+
+
+def advertiser(key, tag, strip=None, prefix=19):
+    """Text of a company link, and advertiserid from its href"""
+    info = text(key, tag, missing=None, strip=strip)
+    if tag is not None and tag.has_attr("href"):
+        advertiserid = tag["href"][prefix:]
+        if advertiserid.isdigit():
+            info["advertiserid"] = advertiserid
+        else:
+            info["advertiserid"] = "<missing advertiserid>"
+    return info
+
+
+PROCESSORS = {
+    "text": text,
+    "first_word": first_word,
+    "location": location,
+    "salary": salary,
+    "sponsored": sponsored,
+    "advertiser": advertiser,
+}
+
+
+# +  -  -  - COMPILING -  -  - +
+
+
+def compile_selector(selector):
+    """Return tag name and test of the attrs of a tag for one selector
+
+    # Arguments:
+        selector: dict of the tag "name", a "class" it has (several
+                  classes if separated by spaces) and exact "attrs"
+    """
+    cls = selector.get("class")
+    attrs = list(selector.get("attrs", {}).items())
+
+    def match(tag_attrs):
+        if cls is not None:
+            classes = tag_attrs.get("class") or []
+            if isinstance(classes, str):
+                classes = classes.split()
+            if cls not in classes and cls != " ".join(classes):
+                return False
+        for name, value in attrs:
+            if tag_attrs.get(name) != value:
+                return False
+        return True
+
+    return selector.get("name"), match
+
+
+class Extractor:
+    """Extractor of the fields of a site's job articles.
+
+    Each field of `fields` is a dict with:
+        key: name of the field in the info of a job
+        select: selectors tried in order, see compile_selector
+        process: name of a post-processor in PROCESSORS, "text" if left out
+        other keys: options of the post-processor
+
+    A field no selector matches is still given to its post-processor,
+    which sets it to MISSING ("<missing>") as the scrapers always did,
+    or leaves it out for fields with missing=None. An article missing
+    fields is never dropped, it is up to the scraper to skip it.
+
+    Selectors are indexed by tag name, so every tag of an article is
+    checked once against all fields instead of searched once per field.
+    """
+
+    def __init__(self, fields):
+        self.processors = []
+        # tag name, None for any tag -> [(field, rank, match)]
+        self.selectors = {}
+
+        for index, spec in enumerate(fields):
+            options = {
+                k: v for k, v in spec.items() if k not in ("key", "select", "process")
+            }
+            process = PROCESSORS[spec.get("process", "text")]
+            self.processors.append((spec["key"], partial(process, **options)))
+
+            for rank, selector in enumerate(spec["select"]):
+                name, match = compile_selector(selector)
+                self.selectors.setdefault(name, []).append((index, rank, match))
+
+        self.any_tag = self.selectors.pop(None, [])
+
+    def extract(self, article):
+        """Return the fields of one job article"""
+
+        found = [None] * len(self.processors)
+        ranks = [None] * len(self.processors)
+        # Fields found with their first selector, done for good
+        settled = 0
+
+        for tag in article.find_all(True):
+            for index, rank, match in self.selectors.get(tag.name, ()):
+                settled += self.offer(found, ranks, index, rank, match, tag)
+            for index, rank, match in self.any_tag:
+                settled += self.offer(found, ranks, index, rank, match, tag)
+            if settled == len(found):
+                break
+
+        info = {}
+        for (key, process), tag in zip(self.processors, found):
+            info.update(process(key, tag))
+        return info
+
+    def offer(self, found, ranks, index, rank, match, tag):
+        """Keep tag for a field if it is the first matching a selector
+        tried before the one kept so far
+
+        # Returns:
+            1 if the field is now found with its first selector, else 0
+        """
+        if ranks[index] is not None and ranks[index] <= rank:
+            return 0
+        if not match(tag.attrs):
+            return 0
+        found[index] = tag
+        ranks[index] = rank
+        return 1 if rank == 0 else 0
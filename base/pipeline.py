@@ -0,0 +1,239 @@
+#
+# Pipeline engine fetching jd of queued jobids in stages: I/O threads
+# fetch pages, a process pool parses them and one writer saves the jds
+#
+# =====================================================================
+
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import requests
+
+from settings.settings import (
+    HEDGE_JD_FETCHES,
+    PIPELINE_FETCHERS,
+    PIPELINE_PARSERS,
+    PIPELINE_QUEUE_SIZE,
+    RETRY_MAX_ATTEMPTS,
+)
+from utils.deadline import DeadlineExceeded
+
+# Status codes saved as <missing> unless the scraper sets missing_status
+MISSING_STATUS = (404, 410)
+
+
+class ContentPipeline:
+    """Run a content scraper as three stages sized apart:
+
+        feeder -> jobids -> `fetchers` threads -> pages -> writer
+                                                    \\-> `parsers` processes
+
+    Fetch threads keep the network busy while pages are parsed in other
+    processes, and the writer alone touches the jd writer, which is not
+    thread safe. Pages in flight are bounded by `queue_size`. Counters
+    of the record are only updated with scraper.count, as all threads
+    count into it.
+
+    The scraper provides content_url(jobid), parse_job_content(html) as
+    a module function, rqueue, jd_writer, record, log and http_get.
+    Requests are bounded by the session deadline and the retry policy.
+    """
+
+    def __init__(
+        self,
+        scraper,
+        site,
+        fetchers=PIPELINE_FETCHERS,
+        parsers=PIPELINE_PARSERS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+    ):
+        self.scraper = scraper
+        self.site = site
+        self.fetchers = fetchers
+        self.parsers = parsers
+        self.missing_status = getattr(scraper, "missing_status", MISSING_STATUS)
+        self.retry_empty_page = getattr(scraper, "retry_empty_page", False)
+
+        self.jobids = queue.Queue(maxsize=fetchers * 2)
+        self.pages = queue.Queue(maxsize=queue_size)
+        self.pool = None
+        # Fetches of jobids whose page came back without its jd
+        self.attempts = {}
+
+    def run(self):
+        """Scrape jobids from the queue until it dries up"""
+        scraper = self.scraper
+        # Fetch threads share the session deadline, a jd deadline
+        # could not be told apart between them
+        scraper.deadline = scraper.session_deadline
+
+        # Parsers are started lazily by the first pages handed over, from
+        # a fetch thread: they are spawned, as forking a process running
+        # threads could copy a lock some thread holds
+        with ProcessPoolExecutor(
+            max_workers=self.parsers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            self.pool = pool
+            fetchers = [
+                threading.Thread(target=self.fetcher, daemon=True)
+                for _ in range(self.fetchers)
+            ]
+            writer = threading.Thread(target=self.writer, daemon=True)
+            for thread in fetchers + [writer]:
+                thread.start()
+
+            report = self.feeder()
+            for _ in fetchers:
+                self.jobids.put(None)
+            for thread in fetchers:
+                thread.join()
+            self.pages.put(None)
+            writer.join()
+
+        # Save whatever is left in the batch
+        try:
+            scraper.jd_writer.flush(final=True)
+        except Exception as ex:
+            scraper.log.exception("-Unknown Exceptions: {} \n".format(ex))
+            scraper.count("other_errors")
+        if report:
+            # Put record into queue for latter use
+            scraper.record_http_stats()
+            scraper.rqueue.put(scraper.record)
+
+    def feeder(self):
+        """Move jobids from the Redis queue to the fetchers
+
+        # Returns:
+            True if the session records were reached, False if the
+            queue stayed empty
+        """
+        scraper = self.scraper
+        rqueue = scraper.rqueue
+        num_record = 0
+        empty = 0
+        while True:
+            # Jobids left in the queue wait for the next session
+            if scraper.session_deadline.expired():
+                scraper.log.info("-Session deadline expired \n")
+                scraper.record_unfinished(self.site, "session", queued=rqueue.size())
+                return True
+
+            item = rqueue.pop(True, 10)
+            if not item:
+                empty += 1
+                if empty >= 3:
+                    return False
+                continue
+
+            if isinstance(item, bytes):
+                item = item.decode("utf-8")
+
+            # A dict or an item with length >=50 is a json record,
+            # put back to queue for latter use
+            if isinstance(item, dict) or len(item) >= 50:
+                num_record += 1
+                rqueue.put(item)
+                if num_record >= 90:
+                    return True
+            else:
+                self.jobids.put(item)
+
+    def fetcher(self):
+        """Fetch pages of jobids until a None is received, handing
+        them to the parsers
+        """
+        scraper = self.scraper
+        while True:
+            jobid = self.jobids.get()
+            if jobid is None:
+                return
+
+            start = time.time()
+            try:
+                page = scraper.http_get(
+                    scraper.content_url(jobid),
+                    hedge=HEDGE_JD_FETCHES,
+                    headers=scraper.get_headers(),
+                )
+                status = page.status_code
+                if status in self.missing_status:
+                    jd = "<missing>"
+                elif status == 200:
+                    jd = self.pool.submit(
+                        scraper.parse_job_content,
+                        page.content.decode("utf-8", "ignore"),
+                    )
+                else:
+                    scraper.log.debug("-Cant to get jd jobid: {} \n".format(jobid))
+                    continue
+            except DeadlineExceeded:
+                scraper.record_unfinished(self.site, "jd", jobid=jobid)
+                continue
+            except requests.exceptions.RequestException as e:
+                # Already retried with backoff and counted by http_get
+                scraper.log.exception("-Request failed: {} \n".format(e))
+                continue
+            except Exception as ex:
+                scraper.log.exception("-Unknown Exceptions: {} \n".format(ex))
+                scraper.count("other_errors")
+                continue
+
+            self.hand_over(jobid, jd, start)
+
+    def hand_over(self, jobid, jd, start):
+        """Put a page on the writer's queue, waiting while the parsers
+        are behind but not past the session deadline
+        """
+        scraper = self.scraper
+        while True:
+            try:
+                self.pages.put((jobid, jd, start), timeout=1)
+                return
+            except queue.Full:
+                if scraper.session_deadline.expired():
+                    scraper.record_unfinished(self.site, "jd", jobid=jobid)
+                    return
+
+    def writer(self):
+        """Save jds as they are parsed, in the order pages were fetched"""
+        scraper = self.scraper
+        while True:
+            item = self.pages.get()
+            if item is None:
+                return
+
+            jobid, jd, start = item
+            try:
+                if isinstance(jd, Future):
+                    jd = jd.result()
+            except Exception as ex:
+                scraper.log.exception("-Unknown Exceptions: {} \n".format(ex))
+                scraper.count("other_errors")
+                continue
+
+            if jd:
+                # The writer must keep draining pages whatever happens,
+                # or the fetchers would wait on a full queue
+                try:
+                    scraper.jd_writer.add(jobid, jd)
+                except Exception as ex:
+                    scraper.log.exception("-Unknown Exceptions: {} \n".format(ex))
+                    scraper.count("other_errors")
+                    continue
+                scraper.count("total_time_jd", time.time() - start)
+                scraper.log.info("-saved: {}".format(jobid))
+                self.attempts.pop(jobid, None)
+            elif self.retry_empty_page:
+                # Fetched again later, the fetchers may be waiting on
+                # this stage so it is not put on their queue
+                attempts = self.attempts.get(jobid, 0) + 1
+                if attempts < RETRY_MAX_ATTEMPTS:
+                    self.attempts[jobid] = attempts
+                    scraper.rqueue.put(jobid)
+                else:
+                    self.attempts.pop(jobid, None)
+                    scraper.log.debug("-Cant to get jd jobid: {} \n".format(jobid))
@@ -0,0 +1,62 @@
+#
+# Connection pool shared by all scrapers of one process
+#
+# ===============================================================
+
+
+import os
+import threading
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from settings.settings import DB_HOST, DB_POOL_MAX, DB_POOL_MIN
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+class SharedConnectionPool:
+    """A ThreadedConnectionPool which waits for a free connection
+    instead of raising PoolError when all connections are in use
+    """
+
+    def __init__(self, dsn=DB_HOST, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX):
+        self.pid = os.getpid()
+        self._pool = ThreadedConnectionPool(minconn, maxconn, dsn=dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+        # Names of statements already prepared, by connection
+        self.prepared = {}
+
+    def getconn(self):
+        """Wait for a free slot then get a connection"""
+        self._slots.acquire()
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        """Return a connection to pool and free its slot"""
+        try:
+            self._pool.putconn(conn)
+            if conn.closed:
+                self.prepared.pop(id(conn), None)
+        finally:
+            self._slots.release()
+
+
+def get_pool():
+    """Return the pool of current process, create it if needed
+
+    Processes forked by multiprocessing get their own pool
+    instead of sharing the sockets of their parent
+    """
+
+    global _POOL
+
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.pid != os.getpid():
+            _POOL = SharedConnectionPool()
+    return _POOL
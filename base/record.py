@@ -29,9 +29,27 @@ class ScraperRecord(ScraperBase):
             "proxy_errors": 0,
             "conn_errors": 0,
             "request_errors": 0,
+            "timeout_errors": 0,
+            "bounces": 0,
+            "server_errors": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
             "other_errors": 0,
             "total_subcat": 0,
             "total_time_jd": 0,
+            "jd_rows_written": 0,
+            "jd_flushes": 0,
+            "total_time_jd_flush": 0,
+            "db_checkouts": 0,
+            "total_time_db_wait": 0,
+            "http_requests": 0,
+            "http_new_connections": 0,
+            "total_time_rate_wait": 0,
+            "deadlines_expired": 0,
+            "circuit_opens": 0,
+            "total_time_circuit_wait": 0,
         }
 
         # Variables keeping record of scraper
@@ -55,8 +73,10 @@ class ScraperRecord(ScraperBase):
         """Get number of jobs without jd"""
 
         sql = """
-            SELECT COUNT(*) FROM {}jobs
-            WHERE jd IS NULL;
+            SELECT COUNT(*) FROM {0}jobs j
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {0}jd d WHERE d.jobid = j.jobid
+            );
         """.format(
             site
         )
@@ -68,7 +88,7 @@ class ScraperRecord(ScraperBase):
         """Get number of jobs with jd = '<missing>'"""
 
         sql = """
-            SELECT COUNT(*) FROM {}jobs
+            SELECT COUNT(*) FROM {}jd
             WHERE jd = '<missing>';
         """.format(
             site
@@ -77,18 +97,42 @@ class ScraperRecord(ScraperBase):
         result = str(self.query_one(sql)).strip("(,)")
         return result
 
+    def get_session_stats(self, site):
+        """Get total jobs, jobs without jd and jobs with jd = '<missing>'
+        in a single pass over the site tables
+
+        # Returns:
+            dictionary with keys total_jobs, null_jd, missing_jd
+        """
+
+        sql = """
+            SELECT
+                COUNT(*),
+                COUNT(*) FILTER (WHERE d.jobid IS NULL),
+                COUNT(*) FILTER (WHERE d.jd = '<missing>')
+            FROM {0}jobs j
+            LEFT JOIN {0}jd d ON d.jobid = j.jobid;
+        """.format(
+            site
+        )
+
+        total_jobs, null_jd, missing_jd = self.query_one(sql)
+        return {
+            "total_jobs": total_jobs,
+            "null_jd": null_jd,
+            "missing_jd": missing_jd,
+        }
+
     def record_to_db(self):
         """Insert json record to db"""
 
         sql = """
             INSERT INTO jobscrapers (body)
-            VALUES ('{}');
-        """.format(
-            json.dumps(self.record)
-        )
+            VALUES (%s);
+        """
 
         with self.cursor() as cur:
-            cur.execute(sql)
+            cur.execute(sql, (json.dumps(self.record),))
 
     # +  -  -  - DATA PROCESSING -  -  - +
 
@@ -164,6 +208,15 @@ class ScraperRecord(ScraperBase):
             print("avg select {}".format(e))
             return 0.0
 
+    def calc_hedge_rate(self, hedges, requests):
+        """Calculate share of requests that were hedges"""
+        try:
+            result = float(hedges) / float(requests)
+            return round(result, 5)
+        except Exception as e:
+            print("hedge rate {}".format(e))
+            return 0.0
+
     def prepare_records(self):
         """Calculate all neccessary values for records
         and update record
@@ -193,6 +246,32 @@ class ScraperRecord(ScraperBase):
             self.raw_record["last_session_jobs"], self.raw_record["total_time_select"]
         )
 
+        self.record["avg_time_jd_flush"] = self.calc_avg_jd(
+            self.raw_record["jd_flushes"], self.raw_record["total_time_jd_flush"]
+        )
+
+        self.record["jd_rows_written"] = self.raw_record["jd_rows_written"]
+
+        self.record["avg_time_db_wait"] = self.calc_avg_select(
+            self.raw_record["db_checkouts"], self.raw_record["total_time_db_wait"]
+        )
+
+        self.record["db_checkouts"] = self.raw_record["db_checkouts"]
+
+        self.record["http_requests"] = self.raw_record["http_requests"]
+
+        self.record["http_new_connections"] = self.raw_record["http_new_connections"]
+
+        self.record["total_time_rate_wait"] = self.raw_record["total_time_rate_wait"]
+
+        self.record["deadlines_expired"] = self.raw_record["deadlines_expired"]
+
+        self.record["circuit_opens"] = self.raw_record["circuit_opens"]
+
+        self.record["total_time_circuit_wait"] = self.raw_record[
+            "total_time_circuit_wait"
+        ]
+
         self.record["site"] = self.raw_record["site"]
 
         self.record["null_jd"] = self.raw_record["null_jd"]
@@ -211,6 +290,24 @@ class ScraperRecord(ScraperBase):
 
         self.record["request_errors"] = self.raw_record["request_errors"]
 
+        self.record["timeout_errors"] = self.raw_record["timeout_errors"]
+
+        self.record["bounces"] = self.raw_record["bounces"]
+
+        self.record["server_errors"] = self.raw_record["server_errors"]
+
+        self.record["retries"] = self.raw_record["retries"]
+
+        self.record["retries_denied"] = self.raw_record["retries_denied"]
+
+        self.record["hedges_sent"] = self.raw_record["hedges_sent"]
+
+        self.record["hedge_wins"] = self.raw_record["hedge_wins"]
+
+        self.record["hedge_rate"] = self.calc_hedge_rate(
+            self.raw_record["hedges_sent"], self.raw_record["http_requests"]
+        )
+
         self.record["last_session_start"] = self.raw_record["session_start"]
 
         self.record["last_session_finish"] = self.raw_record["session_finish"]
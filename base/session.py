@@ -0,0 +1,97 @@
+#
+# HTTP session shared by all scrapers of one process
+# Keeps connections alive so a page does not cost a new TCP+TLS handshake
+#
+# ===============================================================
+
+
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from settings.settings import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+class CountingAdapter(HTTPAdapter):
+    """An HTTPAdapter keeping the requests and connections of the pools
+    its managers evict, which would otherwise be lost with the pool
+    """
+
+    def __init__(self, *args, **kwargs):
+        # Set before HTTPAdapter.__init__ creates the pool manager
+        self.evicted_lock = threading.Lock()
+        self.evicted_requests = 0
+        self.evicted_connections = 0
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.count_evictions(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        self.count_evictions(manager)
+        return manager
+
+    def count_evictions(self, manager):
+        """Add the counts of a pool to the totals when manager drops it"""
+
+        def dispose(pool):
+            with self.evicted_lock:
+                self.evicted_requests += pool.num_requests
+                self.evicted_connections += pool.num_connections
+            pool.close()
+
+        manager.pools.dispose_func = dispose
+
+
+def get_session():
+    """Return the session of current process, create it if needed"""
+
+    global _SESSION
+
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION.pid != os.getpid():
+            session = requests.Session()
+            adapter = CountingAdapter(
+                pool_connections=HTTP_POOL_CONNECTIONS,
+                pool_maxsize=HTTP_POOL_MAXSIZE,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+
+            # Do not keep cookies between requests, like requests.get
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+            session.pid = os.getpid()
+            _SESSION = session
+    return _SESSION
+
+
+def connection_stats(session):
+    """Return (requests, new connections) made by session so far
+    # pools still held by the managers are counted with the totals of
+    # those they evicted, only kept by a CountingAdapter
+    """
+
+    requests_made = 0
+    connections = 0
+
+    for adapter in set(session.adapters.values()):
+        requests_made += getattr(adapter, "evicted_requests", 0)
+        connections += getattr(adapter, "evicted_connections", 0)
+        managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+        for manager in managers:
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool:
+                    requests_made += pool.num_requests
+                    connections += pool.num_connections
+
+    return requests_made, connections
@@ -0,0 +1,257 @@
+#
+# Batch writers buffering scraped rows before saving them to db
+#
+# ===============================================================
+
+
+import json
+import time
+
+from settings.settings import (
+    INFO_BATCH_RETRIES,
+    INFO_BATCH_SECONDS,
+    INFO_BATCH_SIZE,
+    JD_BATCH_RETRIES,
+    JD_BATCH_SECONDS,
+    JD_BATCH_SIZE,
+)
+
+
+class InfoBatchWriter:
+    """Buffer job info of one scraper and insert them with one query per batch"""
+
+    def __init__(
+        self,
+        scraper,
+        site,
+        size=INFO_BATCH_SIZE,
+        seconds=INFO_BATCH_SECONDS,
+        retries=INFO_BATCH_RETRIES,
+    ):
+        self.scraper = scraper
+        self.site = site
+        self.size = size
+        self.seconds = seconds
+        self.retries = retries
+        self.rows = []
+        self.last_flush = time.time()
+        # Flushes failed in a row
+        self.failures = 0
+
+    def add(self, info):
+        """Buffer one job info, flush if batch is full or too old"""
+
+        self.rows.append((info["jobid"], json.dumps(info), info["scraped_at"]))
+
+        if len(self.rows) >= self.size:
+            return self.flush()
+        if time.time() - self.last_flush >= self.seconds:
+            return self.flush()
+        return []
+
+    def flush(self, final=False):
+        """Insert all buffered rows then put new jobids to Redis queue
+        # a failed batch is kept for the next flush, after `retries`
+        # failures in a row its rows are inserted one by one instead
+        # so a bad row cannot hold back the others
+        # a final flush has no next flush, its rows are inserted one by
+        # one as soon as the batch fails
+
+        # Returns:
+            inserted: list of jobids which were not in db table yet
+        """
+
+        self.last_flush = time.time()
+        if not self.rows:
+            return []
+
+        rows, self.rows = self.rows, []
+
+        insert_query_start = time.time()
+        try:
+            inserted = self.insert(rows)
+        except Exception as ex:
+            self.failures += 1
+            if not final and self.failures <= self.retries:
+                # Keep rows for the next flush
+                self.rows = rows + self.rows
+                raise
+            self.scraper.log.exception(
+                "-Batch failed {} times, inserting rows one by one: {} \n".format(
+                    self.failures, ex
+                )
+            )
+            inserted = self.insert_rows(rows)
+        self.failures = 0
+        insert_query_end = time.time()
+        self.scraper.count(
+            "total_time_insert", insert_query_end - insert_query_start
+        )
+
+        # Batch is committed, content scrapers can now pick up jobids
+        for jobid in inserted:
+            self.scraper.rqueue.put(jobid)
+
+        return inserted
+
+    def insert(self, rows):
+        """Insert rows with one INSERT ... SELECT FROM unnest
+
+        # Returns:
+            inserted: list of jobids which were not in db table yet
+        """
+
+        # Only keep the first info of a jobid scraped twice in one batch
+        batch = {}
+        for jobid, info, scraped_at in rows:
+            batch.setdefault(jobid, (info, scraped_at))
+
+        with self.scraper.cursor() as cur:
+            self.scraper.execute_prepared(
+                cur,
+                "{}_info_batch".format(self.site),
+                self.scraper.insert_jobs_sql(self.site),
+                (
+                    list(batch.keys()),
+                    [i[0] for i in batch.values()],
+                    [i[1] for i in batch.values()],
+                ),
+            )
+            return [i[0] for i in cur.fetchall()]
+
+    def insert_rows(self, rows):
+        """Insert rows one by one, dropping those which fail
+
+        # Returns:
+            inserted: list of jobids which were not in db table yet
+        """
+
+        inserted = []
+        for row in rows:
+            try:
+                inserted += self.insert([row])
+            except Exception as ex:
+                self.scraper.log.exception(
+                    "-Dropped info of jobid {}: {} \n".format(row[0], ex)
+                )
+                self.scraper.count("other_errors")
+        return inserted
+
+
+class JdBatchWriter:
+    """Buffer jd of one content scraper and save them with one query per batch"""
+
+    def __init__(
+        self,
+        scraper,
+        site,
+        size=JD_BATCH_SIZE,
+        seconds=JD_BATCH_SECONDS,
+        retries=JD_BATCH_RETRIES,
+    ):
+        self.scraper = scraper
+        self.site = site
+        self.size = size
+        self.seconds = seconds
+        self.retries = retries
+        self.rows = []
+        self.last_flush = time.time()
+        # Flushes failed in a row
+        self.failures = 0
+
+    def add(self, jobid, jd):
+        """Buffer one jd, flush if batch is full or too old"""
+
+        self.rows.append((jobid, jd))
+
+        if len(self.rows) >= self.size:
+            return self.flush()
+        if time.time() - self.last_flush >= self.seconds:
+            return self.flush()
+        return 0
+
+    def flush(self, final=False):
+        """Insert all buffered jd
+        # a failed batch is kept for the next flush, after `retries`
+        # failures in a row its rows are inserted one by one instead
+        # a final flush has no next flush, its rows are inserted one by
+        # one as soon as the batch fails
+
+        # Returns:
+            written: number of rows inserted
+        """
+
+        self.last_flush = time.time()
+        if not self.rows:
+            return 0
+
+        rows, self.rows = self.rows, []
+
+        flush_start = time.time()
+        try:
+            written = self.insert(rows)
+        except Exception as ex:
+            self.failures += 1
+            if not final and self.failures <= self.retries:
+                # Keep rows for the next flush
+                self.rows = rows + self.rows
+                raise
+            self.scraper.log.exception(
+                "-Batch failed {} times, inserting rows one by one: {} \n".format(
+                    self.failures, ex
+                )
+            )
+            written = self.insert_rows(rows)
+        self.failures = 0
+        flush_end = time.time()
+
+        self.scraper.count("jd_rows_written", written)
+        self.scraper.count("jd_flushes")
+        self.scraper.count("total_time_jd_flush", flush_end - flush_start)
+
+        return written
+
+    def insert(self, rows):
+        """Insert rows with one INSERT ... SELECT FROM unnest
+
+        # Returns:
+            written: number of rows inserted
+        """
+
+        # Only keep the last jd of a jobid scraped twice in one batch
+        batch = dict(rows)
+
+        sql = """
+            INSERT INTO {}jd (jobid, jd)
+            SELECT * FROM unnest($1::text[], $2::text[])
+            ON CONFLICT (jobid) DO NOTHING
+          """.format(
+            self.site
+        )
+
+        with self.scraper.cursor() as cur:
+            self.scraper.execute_prepared(
+                cur,
+                "{}_jd_batch".format(self.site),
+                sql,
+                (list(batch.keys()), list(batch.values())),
+            )
+            return cur.rowcount
+
+    def insert_rows(self, rows):
+        """Insert rows one by one, dropping those which fail
+
+        # Returns:
+            written: number of rows inserted
+        """
+
+        written = 0
+        for row in rows:
+            try:
+                written += self.insert([row])
+            except Exception as ex:
+                self.scraper.log.exception(
+                    "-Dropped jd of jobid {}: {} \n".format(row[0], ex)
+                )
+                self.scraper.count("other_errors")
+        return written
@@ -7,16 +7,55 @@ import re
 import time
 
 import requests
-from bs4 import BeautifulSoup
 
 from base.base import ScraperBase
+from base.writer import JdBatchWriter
 from settings import indeedsettings
+from settings.settings import HEDGE_JD_FETCHES, JD_DEADLINE
+from utils.deadline import DeadlineExceeded
 from utils.RedisQueue import RedisQueue
+from utils.soup import make_soup, strainer
+
+# Tags of job ad pages kept when parsing
+PARSE_ONLY = strainer(indeedsettings.JD_PARSE_ONLY)
+
+
+def parse_job_content(html):
+    """Extract job description from a job ad page
+
+    # Arguments:
+        html: decoded html of the job ad page
+    # Returns:
+        jd as html string, "<missing>" if the page has no jd,
+        None if the page is incomplete and worth fetching again
+    """
+    soup = make_soup(re.sub("<!--|-->", "", html), PARSE_ONLY)
+
+    # Find the block containing job description
+    jd = soup.find("div", class_="jobsearch-JobComponent-description icl-u-xs-mt--md")
+    if not jd:
+        # if not found, try other tags
+        jd = soup.find("span", class_="summary")
+    if not jd:
+        jd = soup.find("span", id="job_summary")
+    if jd:
+        # Get the content
+        # content = jd.get_text(separator="\n\n",
+        #                       strip=True).replace("'", "''")
+        return str(jd)
+    if soup.find("div", class_="container"):
+        return "<missing>"
+    return None
 
 
 class IndeedJobContentScraper(ScraperBase):
     """A scraper to look for full description of jobs"""
 
+    # Used by the async engine: indeed redirects expired jobs with 302
+    # and sometimes serves a page without jd that works on a retry
+    missing_status = (404, 410, 302)
+    retry_empty_page = True
+
     def __init__(self):
         super().__init__()
         # Specify redis queue being used
@@ -33,9 +72,30 @@ class IndeedJobContentScraper(ScraperBase):
             "proxy_errors": 0,
             "conn_errors": 0,
             "request_errors": 0,
+            "timeout_errors": 0,
+            "bounces": 0,
+            "server_errors": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "circuit_opens": 0,
+            "total_time_circuit_wait": 0,
             "other_errors": 0,
+            "jd_rows_written": 0,
+            "jd_flushes": 0,
+            "total_time_jd_flush": 0,
+            "db_checkouts": 0,
+            "total_time_db_wait": 0,
+            "http_requests": 0,
+            "http_new_connections": 0,
+            "total_time_rate_wait": 0,
+            "deadlines_expired": 0,
         }
 
+        # Jd are saved to db in batches
+        self.jd_writer = JdBatchWriter(self, "indeed")
+
         # Setting up logger
         # REFERENCE:
         # https://tutorialedge.net/python/python-logging-best-practices/
@@ -60,15 +120,20 @@ class IndeedJobContentScraper(ScraperBase):
         """Return dictionary with key = areas being recorded"""
         return self.record
 
+    # Module function, so the pipeline engine can run it in other processes
+    parse_job_content = staticmethod(parse_job_content)
+
+    def content_url(self, jobid):
+        """Return url of the job ad of jobid"""
+        return "{}{}".format(indeedsettings.CONTENT_URL, jobid)
+
     def scrape_job_content(self, jobid):
         """Scrape content of jobid"""
 
         start = time.time()
+        self.start_deadline(JD_DEADLINE)
         existed_id = 0
         loop_count = 0
-        proxy_failed = 0
-        conn_failed = 0
-        request_failed = 0
         redirect = 0
 
         # First, check if jobid is already scraped or not
@@ -84,8 +149,11 @@ class IndeedJobContentScraper(ScraperBase):
             try:
                 jd_start = time.time()
 
-                url = "{}{}".format(indeedsettings.CONTENT_URL, jobid)
-                html_page = requests.get(url, headers=self.headers)
+                html_page = self.http_get(
+                    self.content_url(jobid),
+                    hedge=HEDGE_JD_FETCHES,
+                    headers=self.headers,
+                )
                 finished = False
                 status = html_page.status_code
 
@@ -100,115 +168,62 @@ class IndeedJobContentScraper(ScraperBase):
                 elif status == 404:
                     self.log.debug("-404 error for: {} \n".format(jobid))
                     content = "<missing>"
-                    self.jd_to_db(jobid, content, "indeed")
+                    self.jd_writer.add(jobid, content)
                     jd_end = time.time()
                     self.record["total_time_jd"] += jd_end - jd_start
                     finished = True
                 elif status == 410 or status == 302:
                     self.log.debug("jd expired for {} \n".format(jobid))
                     content = "<missing>"
-                    self.jd_to_db(jobid, content, "indeed")
+                    self.jd_writer.add(jobid, content)
                     jd_end = time.time()
                     self.record["total_time_jd"] += jd_end - jd_start
                     finished = True
                 elif status == 200:
                     page_content = html_page.text
                     html_page.close()
-                    soup = BeautifulSoup(
-                        re.sub("<!--|-->", "", page_content), "html5lib"
-                    )
-
-                    # Find the block containing job description
-                    jd = soup.find(
-                        "div",
-                        class_="jobsearch-JobComponent-description icl-u-xs-mt--md",
-                    )
-                    if not jd:
-                        # if not found, try other tags
-                        jd = soup.find("span", class_="summary")
-                        if not jd:
-                            jd = soup.find("span", id="job_summary")
-                            if not jd:
-                                jd = soup.find("div", class_="container")
-                                if jd:
-                                    content = "<missing>"
-                                    self.jd_to_db(jobid, content, "indeed")
-                                    break
-                                else:
-                                    loop_count += 1
-                                    # If loop 3 times and still got nothing, break
-                                    if loop_count == 3:
-                                        self.log.debug(
-                                            "-Cant to get jd jobid: {} \n".format(jobid)
-                                        )
-                                        finished = True
-                                        break
-                                    continue
-
-                    if jd:
-                        # Get the content
-                        # content = jd.get_text(separator="\n\n",
-                        #                       strip=True).replace("'", "''")
-                        content = str(jd).replace("'", "''")
+                    content = self.parse_job_content(page_content)
+                    if content == "<missing>":
+                        self.jd_writer.add(jobid, content)
+                        break
+                    elif content:
                         print(content)
-                        self.jd_to_db(jobid, content, "indeed")
+                        self.jd_writer.add(jobid, content)
                         jd_end = time.time()
                         self.record["total_time_jd"] += jd_end - jd_start
                         finished = True
                         # print("-saved: {}".format(jobid))
                         self.log.info("-saved: {}".format(jobid))
+                    else:
+                        loop_count += 1
+                        # If loop 3 times and still got nothing, break
+                        if loop_count == 3:
+                            self.log.debug("-Cant to get jd jobid: {} \n".format(jobid))
+                            finished = True
+                            break
+                        continue
                 else:
                     finished = True
 
-            except requests.exceptions.SSLError as s:
-                time.sleep(0.1)
-                self.proxies = self.get_proxies()
-                self.log.exception("-SSL Error: {}".format(s))
-                self.record["ssl_errors"]
-
-            except requests.exceptions.ProxyError as p:
-                proxy_failed += 1
-                time.sleep(0.1)
-                self.log.exception("-Proxy Error: {}".format(p))
-                if proxy_failed >= 3:
-                    proxy_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["proxy_errors"]
-
-            except requests.exceptions.ConnectionError as ce:
-                conn_failed += 1
-                time.sleep(0.1)
-                self.log.exception("-Connection Error: {} \n".format(ce))
-                if conn_failed >= 3:
-                    conn_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["conn_errors"]
-
             except requests.exceptions.RequestException as e:
-                request_failed += 1
-                time.sleep(0.1)
+                # Already retried with backoff and counted by http_get,
+                # the jd is left to the nullcontent scraper
                 self.log.exception("-Request failed: {} \n".format(e))
-                if request_failed >= 3:
-                    request_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["request_errors"]
+                break
+
+            except DeadlineExceeded as d:
+                self.log.info("-Deadline of jobid {} expired: {} \n".format(jobid, d))
+                self.record_unfinished("indeed", "jd", jobid=jobid)
+                break
 
             except KeyboardInterrupt:
                 self.log.debug("-Keyboard Interrupted")
+                self.jd_writer.flush()
                 break
 
             except Exception as ex:
                 self.log.exception("-Unknown Exceptions: {} \n".format(ex))
-                self.record["other_errors"]
+                self.record["other_errors"] += 1
 
         self.log.info(
             "Total time scraping jobid {} = {}".format(jobid, time.time() - start)
@@ -221,6 +236,15 @@ class IndeedJobContentScraper(ScraperBase):
         empty = 0
         while True:
             # Pop jobid from Redis Queue
+            # Jobids left in the queue wait for the next session
+            if self.session_deadline.expired():
+                self.log.info("-Session deadline expired \n")
+                self.record_unfinished("indeed", "session", queued=self.rqueue.size())
+                self.jd_writer.flush()
+                self.record_http_stats()
+                self.rqueue.put(self.record)
+                break
+
             jobid = self.rqueue.pop(timeout=10)
 
             # print("queue size: {}".format(self.rqueue.size()))
@@ -232,7 +256,10 @@ class IndeedJobContentScraper(ScraperBase):
                     print(num_record)
                     if num_record >= 90:
                         self.rqueue.put(jobid)
+                        # Save buffered jd before reporting
+                        self.jd_writer.flush()
                         # Put record into queue for latter use
+                        self.record_http_stats()
                         self.rqueue.put(self.record)
                         break
                     else:
@@ -244,3 +271,7 @@ class IndeedJobContentScraper(ScraperBase):
                 empty += 1
                 if empty >= 3:
                     break
+
+        # Save whatever is left in the batch
+        self.jd_writer.flush(final=True)
+        self.log.info("Proxies: {}".format(self.proxy_pool.stats()))
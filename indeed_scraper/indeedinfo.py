@@ -5,18 +5,22 @@
 # =====================================================================
 
 
-import json
 import logging
 import logging.handlers as handlers
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import requests
-from bs4 import BeautifulSoup
 
 from base.base import ScraperBase
+from base.extractor import Extractor
+from base.writer import InfoBatchWriter
 from settings import indeedsettings
+from settings.settings import CATEGORY_DEADLINE
+from utils.deadline import DeadlineExceeded
+from utils.dates import posted_time, within_days
 from utils.RedisQueue import RedisQueue
+from utils.soup import make_soup, strainer
 
 
 class IndeedJobInfoScraper(ScraperBase):
@@ -27,6 +31,13 @@ class IndeedJobInfoScraper(ScraperBase):
         # Specify redis queue being used
         self.rqueue = RedisQueue("indeed_queue")
 
+        # Parse only the tags of pages read by this scraper
+        self.parse_only = strainer(indeedsettings.INFO_PARSE_ONLY)
+        self.subcategory_parse_only = strainer(indeedsettings.SUBCATEGORY_PARSE_ONLY)
+
+        # Fields of job articles, compiled once
+        self.extractor = Extractor(indeedsettings.INDEED_FIELDS)
+
         # Get proxy/header
         self.headers = self.get_headers()
         self.proxies = self.get_proxies()
@@ -42,10 +53,28 @@ class IndeedJobInfoScraper(ScraperBase):
             "proxy_errors": 0,
             "conn_errors": 0,
             "request_errors": 0,
+            "timeout_errors": 0,
+            "bounces": 0,
+            "server_errors": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "circuit_opens": 0,
+            "total_time_circuit_wait": 0,
             "other_errors": 0,
             "total_subcat": 0,
+            "db_checkouts": 0,
+            "total_time_db_wait": 0,
+            "http_requests": 0,
+            "http_new_connections": 0,
+            "total_time_rate_wait": 0,
+            "deadlines_expired": 0,
         }
 
+        # Job info are saved to db in batches
+        self.info_writer = InfoBatchWriter(self, "indeed")
+
         # Setting up logger
         # REFERENCE:
         # https://tutorialedge.net/python/python-logging-best-practices/
@@ -67,49 +96,6 @@ class IndeedJobInfoScraper(ScraperBase):
         """Return dictionary with key = areas being recorded"""
         return self.record
 
-    def get_original_post_time(self, jobListingDate, day_limit):
-        """Calculate the original post time of a job by Seek
-
-        # Arguments:
-            jobListingDate: the date(string) got from job ad
-            day_limit: limit how many days ago when job ads were posted
-
-        # Returns:
-            original_time: Date and time of job post
-            today_job: Boolean value whether date was 1 day ago (true) or longer (false)
-        """
-
-        time = jobListingDate.split()
-
-        today_job = True
-
-        # if jobListingDate = "Just posted" or "Today"
-        if (time[0] == "Just") or (time[0] == "Today"):
-            return datetime.now().strftime("%Y-%m-%d %H:%M:%S"), today_job
-
-        if (time[1] == "day") or (time[1] == "days"):
-            if time[0] == "30+":
-                delta = timedelta(days=30)
-                if int(float(day_limit)) == 1:
-                    today_job = False
-            else:
-                delta = timedelta(days=int(time[0]))
-                if int(float(time[0])) > int(float(day_limit)):
-                    today_job = False
-
-        elif (time[1] == "hours") or (time[1] == "hour"):
-            delta = timedelta(hours=int(time[0]))
-
-        elif (time[1] == "minutes") or (time[1] == "minute"):
-            delta = timedelta(minutes=int(time[0]))
-
-        elif (time[1] == "seconds") or (time[1] == "second"):
-            delta = timedelta(seconds=int(time[0]))
-
-        original_time = (datetime.now() - delta).strftime("%Y-%m-%d %H:%M:%S")
-
-        return original_time, today_job
-
     def column_results_div(self, url, headers, proxies):
         """Find html tag containing all job articles
 
@@ -122,48 +108,33 @@ class IndeedJobInfoScraper(ScraperBase):
         """
 
         redirects = 0
-        proxy_failed = 0
 
+        # Failed requests are retried by http_get, what is left
+        # is raised to the page loop
         done = False
 
         while not done:
-            try:
-                html_page = requests.get(url, headers=headers)
-                # proxies=proxies)
-                # Check status of web page
-                if 300 <= html_page.status_code < 400:
-                    redirects += 1
-
-                    self.log.debug(
-                        "-Being redirected: {} \n".format(html_page.status_code)
-                    )
+            html_page = self.http_get(url, headers=headers)
+            # proxies=proxies)
+            # Check status of web page
+            if 300 <= html_page.status_code < 400:
+                redirects += 1
 
-                    headers = self.get_headers()
-                    proxies = self.get_proxies()
+                self.log.debug("-Being redirected: {} \n".format(html_page.status_code))
 
-                    if redirects > 2:
-                        self.reset_proxy_pool()
-                    if redirects > 4:
-                        done = True
-                        redirects = 0
+                headers = self.get_headers()
+                proxies = self.get_proxies()
 
-                elif html_page.status_code == 200:
-                    soup = BeautifulSoup(html_page.text, "html.parser")
-                    col_results = soup.find("td", id="resultsCol")
+                if redirects > 2:
+                    self.reset_proxy_pool()
+                if redirects > 4:
                     done = True
+                    redirects = 0
 
-            except requests.exceptions.ProxyError as p:
-                time.sleep(0.1)
-                proxy_failed += 1
-                self.log.exception(
-                    "-Proxy failed for colresults #{}: {} \n".format(proxy_failed, p)
-                )
-
-                if proxy_failed >= 3:
-                    self.reset_proxy_pool()
-                    proxy_failed = 0
-                done = False
-                self.record["proxy_errors"] += 1
+            elif html_page.status_code == 200:
+                soup = make_soup(html_page.text, self.parse_only)
+                col_results = soup.find("td", id="resultsCol")
+                done = True
 
         return col_results
 
@@ -184,9 +155,9 @@ class IndeedJobInfoScraper(ScraperBase):
                     loop_count = 0
                 # Parse page content
                 print(">>> URL: ", url)
-                html_page = requests.get(url, headers=self.headers)
+                html_page = self.http_get(url, headers=self.headers)
                 # proxies=self.proxies)
-                soup = BeautifulSoup(html_page.text, "html.parser")
+                soup = make_soup(html_page.text, self.subcategory_parse_only)
                 table = soup.find("table", id="titles")
 
                 # Store name of subcategory as key,
@@ -200,6 +171,15 @@ class IndeedJobInfoScraper(ScraperBase):
                     subcategory_dict[subcategory_name] = subcategory_link
                 done = True
 
+            except DeadlineExceeded:
+                raise
+
+            except requests.exceptions.RequestException as e:
+                # Already retried with backoff and counted by http_get,
+                # try again until the category deadline
+                self.log.exception("-Request failed: {} \n".format(e))
+                self.headers = self.get_headers()
+
             except Exception as e:
                 self.log.exception(
                     "-Exception when get subcategory dict: {} \n".format(e)
@@ -216,14 +196,24 @@ class IndeedJobInfoScraper(ScraperBase):
 
         return subcategory_dict
 
-    def scrape_job_info(self, article, day_limit):
+    def get_jobid(self, article):
+        """Return jobid of ONE job article"""
+
+        jobid = article.get("data-jk")
+        if not jobid:
+            jobid = article.get("data-tk")
+        return jobid
+
+    def scrape_job_info(self, article, day_limit, now):
         """Scrape information of ONE job article
 
         # Arguments:
             article: single job article extracted from html tag
             day_limit: limitation for how many days ago was the job posted
         # Return:
-            info: job's information in dictionary format
+            info: job's information in dictionary format, fields missing
+                  from the article set to "<missing>", {} if the job was
+                  not posted within day_limit
             time_limit: whether job was posted within day_limit
 
         """
@@ -231,175 +221,31 @@ class IndeedJobInfoScraper(ScraperBase):
         info = {}
 
         # Get job id
-        jobid = article.get("data-jk")
-        if not jobid:
-            jobid = article.get("data-tk")
+        jobid = self.get_jobid(article)
 
         # For checking job listing time is within given limit
         time_limit = True
 
-        select_query_start = time.time()
-        if self.check_existed_jobid(jobid, "indeed"):
-            self.log.debug("--jobid already scraped: {}  \n".format(jobid))
-            select_query_end = time.time()
-            self.record["total_time_select"] += select_query_end - select_query_start
-            # If already scraped, return empty dictionary
-            return {}, time_limit
-
-        else:
-            select_query_end = time.time()
-            self.record["total_time_select"] += select_query_end - select_query_start
-            info = {
-                "jobid": jobid,
-                "scraped_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-
-            # Find information based on defined attributes
-            for key, value in indeedsettings.INDEED_ATTRIBUTES.items():
-
-                # scrape job title
-                if value == "jobtitle":
-                    result = article.find("a", class_="{}".format(value))
-                    if result:
-                        result = result.get_text().strip(" \n").replace("'", "''")
-                        info[key] = result
-                    else:
-                        result = article.find("a", class_="jobtitle turnstileLink")
-                        if result:
-                            result = result.get_text().strip(" \n").replace("'", "''")
-                            info[key] = result
-                        else:
-                            result = article.find("a")
-
-                            if result is None:
-                                info[key] = "<missing>"
-                            else:
-                                result = (
-                                    result.get_text().strip(" \n").replace("'", "''")
-                                )
-                                info[key] = result
-
-                # scrape job company
-                elif value == "company":
-                    result = article.find(class_="{}".format(value))
-                    if result is None:
-                        info[key] = "<missing>"
-                    else:
-                        result = result.get_text().strip(" \n").replace("'", "''")
-                        info[key] = result
-
-                # scrape job short description
-                elif value == "summary":
-                    result = article.find(class_="{}".format(value))
-                    if result is None:
-                        info[key] = "<missing>"
-                    else:
-                        result = result.get_text().strip(" \n").replace("'", "''")
-                        result = result.strip(",...")
-                        info[key] = "{}".format(result)
-
-                # scrape job location
-                elif value == "location":
-                    result = article.find(class_="{}".format(value))
-                    info["jobState"] = "<missing>"
-                    info["jobArea"] = "<missing>"
-                    if result is None:
-                        info[key] = "<missing>"
-                    else:
-                        result = result.get_text().strip(" \n")
-                        info[key] = result.replace("'", "''")
-
-                        new_value = result.split()
-
-                        # separate location into state and area
-                        if len(new_value) >= 2:
-                            info["jobState"] = new_value[-1]
-                            info["jobArea"] = " ".join(new_value[:-1]).replace(
-                                "'", "''"
-                            )
+        info = {
+            "jobid": jobid,
+            "scraped_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+        }
 
-                            # scan STATES dictionary
-                            for k, val in indeedsettings.INDEED_STATES.items():
-                                if " ".join(new_value) == val:
-                                    info["jobState"] = k
-                                    info["jobArea"] = "<missing>"
-                        elif len(new_value) == 1:
-                            for k, val in indeedsettings.INDEED_STATES.items():
-                                if new_value[0] == k or new_value[0] == val:
-                                    info["jobState"] = k
-
-                # scrape job listing date
-                elif value == "date":
-                    result = article.find("span", class_="{}".format(value))
-                    if result:
-                        result = result.get_text().strip(" \n")
-                        post_time, time_limit = self.get_original_post_time(
-                            result, day_limit
-                        )
+        # Find information based on defined fields
+        info.update(self.extractor.extract(article))
 
-                        if time_limit == False:
-                            # if job listed is older than specified day_limit,
-                            # stop scraping
-                            self.log.info("-Finishing scraping today's jobs \n")
-                            return {}, time_limit
-                        info[key] = post_time
-                    else:
-                        info[key] = "<missing>"
-
-                # scrape job sponsorship
-                elif value == "sponsoredGray":
-                    result = article.find("span", class_="{}".format(value))
-                    if result:
-                        # whether job ad is sponsored or not, and by who
-                        info[key] = True
-                        result = result.get_text().strip(" \n").split()
-                        if len(result) >= 2:
-                            info["sponsored_by"] = result[-1].replace("'", "''")
-                        else:
-                            info["sponsored_by"] = "<missing>"
-                    else:
-                        info[key] = False
-                        info["sponsored_by"] = "<missing>"
-
-                # scrape job salary
-                elif value == "no-wrap":
-                    result = article.find("span", class_="{}".format(value))
-                    if result:
-                        result = result.get_text().strip(" \n").split()
-
-                        # re-format salary unit, eg: a year -> yearly
-                        period = ["hour", "day", "week", "month", "year"]
-                        periodically = [
-                            "hourly",
-                            "daily",
-                            "weekly",
-                            "monthly",
-                            "yearly",
-                        ]
-                        for idx in range(len(period)):
-                            if len(result) == 3:
-                                # eg: $24 an hour
-                                if result[2] == period[idx]:
-                                    info[key] = "{} {}".format(
-                                        result[0], periodically[idx]
-                                    )
-                            if len(result) == 5:
-                                # eg: $40,000 - $50,000 a year
-                                if result[4] == period[idx]:
-                                    info[key] = "{}-{} {}".format(
-                                        result[0], result[2], periodically[idx]
-                                    )
-                    else:
-                        info[key] = "<missing>"
-
-                # scrape job num of reviews
-                elif value == "slNoUnderline":
-                    result = article.find("span", class_="{}".format(value))
-                    if result:
-                        result = result.get_text().strip(" \n").split()
-                        info[key] = result[0]
-                    else:
-                        info[key] = "<missing>"
+        # Check job listing time is within given limit
+        posted = posted_time(info["jobListingDate"], now)
+        if posted is None:
+            info["jobListingDate"] = "<missing>"
+        else:
+            time_limit = within_days(posted, now, day_limit)
+            if time_limit == False:
+                # if job listed is older than specified day_limit,
+                # stop scraping
+                self.log.info("-Finishing scraping today's jobs \n")
+                return {}, time_limit
+            info["jobListingDate"] = posted.strftime("%Y-%m-%d %H:%M:%S")
 
         return info, time_limit
 
@@ -419,9 +265,7 @@ class IndeedJobInfoScraper(ScraperBase):
         # jobs_list = []
         i = 0
         page_num = 0
-        proxy_failed = 0
         scraped_page = 0
-        conn_failed = 0
         request_failed = 0
 
         # Check if day_limit is 1, get url tail of latest job posts
@@ -446,12 +290,39 @@ class IndeedJobInfoScraper(ScraperBase):
                     break
                 existed_id = 0  # existed jobid in 1 page
 
+                articles = column_results.select(".row")
+
+                # Check the whole page for already scraped jobids
+                select_query_start = time.time()
+                new_jobids = self.filter_new_jobids(
+                    [self.get_jobid(article) for article in articles], "indeed"
+                )
+                select_query_end = time.time()
+                self.record["total_time_select"] += (
+                    select_query_end - select_query_start
+                )
+
+                # One reference time for the whole page
+                now = datetime.now()
+
                 # Loop all job articles
-                for article in column_results.select(".row"):
+                for article in articles:
+
+                    jobid = self.get_jobid(article)
+                    if jobid not in new_jobids:
+                        self.log.debug("--jobid already scraped: {}  \n".format(jobid))
+                        existed_id += 1
+                        # if >4 jobid already scraped, skip page
+                        if existed_id > 4:
+                            scraped_page += 1
+                            break
+                        continue
 
                     start_info = time.time()
                     # Get job information
-                    scraped_data, daily_job = self.scrape_job_info(article, day_limit)
+                    scraped_data, daily_job = self.scrape_job_info(
+                        article, day_limit, now
+                    )
 
                     # Check if it is today's job
                     if not daily_job:
@@ -463,17 +334,9 @@ class IndeedJobInfoScraper(ScraperBase):
                         scraped_data["jobClassification"] = category
                         scraped_data["jobSubClassification"] = subcategory
 
-                        # +  -  -  - Put to Redis Queue -  -  - +
-                        self.rqueue.put(scraped_data["jobid"])
-
-                        insert_query_start = time.time()
-                        # +  -  -  - Save to db -  -  - +
-                        self.to_table_db(json.dumps(scraped_data), "indeed")
-
-                        insert_query_end = time.time()
-                        self.record["total_time_insert"] += (
-                            insert_query_end - insert_query_start
-                        )
+                        # +  -  -  - Save to db in batches -  -  - +
+                        # jobids are put to Redis Queue once batch is committed
+                        self.info_writer.add(scraped_data)
 
                         # Get total time scraped 1 job info
                         end_info = time.time()
@@ -487,9 +350,6 @@ class IndeedJobInfoScraper(ScraperBase):
                             )
                         )
                         i += 1
-                    else:
-                        # If 'scrape info' function returns {}, id already scraped
-                        existed_id += 1
 
                     # if >4 jobid already scraped, skip page
                     if existed_id > 4:
@@ -504,50 +364,28 @@ class IndeedJobInfoScraper(ScraperBase):
                     )
                 page_num += 10
 
-            except requests.exceptions.SSLError as s:
-                time.sleep(0.1)
-                self.proxies = self.get_proxies()
-                self.log.exception("-SLLError: {} \n".format(s))
-                self.record["ssl_errors"] += 1
-
-            except requests.exceptions.ProxyError as p:
-                time.sleep(0.1)
-                self.log.exception("-Proxy failed #{}: {} \n".format(proxy_failed, p))
-                proxy_failed += 1
-                if proxy_failed >= 3:
-                    proxy_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["proxy_errors"] += 1
-
-            except requests.exceptions.ConnectionError as ce:
-                conn_failed += 1
-                self.log.exception("-Connection Error: {} \n".format(ce))
-                time.sleep(0.1)
-                if conn_failed >= 3:
-                    conn_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["conn_errors"] += 1
-
-            except requests.exceptions.RequestException as re:
+            except requests.exceptions.RequestException as e:
+                # Already retried with backoff and counted by http_get,
+                # give up after 3 failed pages
                 request_failed += 1
                 self.log.exception(
-                    "-Request failed #{}: {} \n".format(request_failed, re)
+                    "-Request failed #{}: {} \n".format(request_failed, e)
                 )
-                time.sleep(0.1)
-                msg = "-TOPIC: jobinfo - {} \n".format(re)
+                self.headers = self.get_headers()
                 if request_failed >= 3:
                     request_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["request_errors"] += 1
+                    finished = True
+
+            except DeadlineExceeded as d:
+                self.log.info("-Deadline of {} expired: {} \n".format(subcategory, d))
+                self.record_unfinished(
+                    "indeed",
+                    "category",
+                    category=category,
+                    subcategory=subcategory,
+                    page=page_num,
+                )
+                break
 
             except KeyboardInterrupt:
                 self.log.debug(
@@ -555,6 +393,7 @@ class IndeedJobInfoScraper(ScraperBase):
                         subcategory
                     )
                 )
+                self.info_writer.flush()
                 break
 
             except Exception as ex:
@@ -573,6 +412,7 @@ class IndeedJobInfoScraper(ScraperBase):
         """
 
         start_cat = time.time()
+        self.start_deadline(CATEGORY_DEADLINE)
 
         message = "-Category: {} \n".format(category)
         self.log.info(message)
@@ -591,7 +431,12 @@ class IndeedJobInfoScraper(ScraperBase):
             category_url = "{}/browsejobs/{}".format(indeedsettings.INFO_URL, category)
 
         # Get subcategories
-        subcategory_dict = self.get_subcategory_dict(category_url)
+        try:
+            subcategory_dict = self.get_subcategory_dict(category_url)
+        except DeadlineExceeded as d:
+            self.log.info("-Deadline of {} expired: {} \n".format(category, d))
+            self.record_unfinished("indeed", "category", category=category)
+            subcategory_dict = {}
         self.record["total_subcat"] = len(subcategory_dict)
 
         # Scrape subcategory
@@ -603,8 +448,16 @@ class IndeedJobInfoScraper(ScraperBase):
             end_subcat = time.time()
             self.record["total_time_subcat"] += end_subcat - start_subcat
 
+        # Save whatever is left in the batch
+        try:
+            self.info_writer.flush(final=True)
+        except Exception as e:
+            self.log.exception("-DB Error: {} \n".format(e))
+
         self.log.info("Finished scraping info at {} \n".format(self.NOW))
         end_cat = time.time()
         self.record["total_time_cat"] = end_cat - start_cat
         self.log.info("\nRecord: {}\n".format(self.record))
+        self.log.info("Proxies: {}".format(self.proxy_pool.stats()))
+        self.record_http_stats()
         self.rqueue.put(self.record)
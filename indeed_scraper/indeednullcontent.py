@@ -11,7 +11,7 @@ import logging
 import multiprocessing
 from datetime import datetime
 
-from indeedcontent import IndeedJobContentScraper
+from indeed_scraper.indeedcontent import IndeedJobContentScraper
 
 
 class IndeedJobMissingContent(IndeedJobContentScraper):
@@ -21,25 +21,38 @@ class IndeedJobMissingContent(IndeedJobContentScraper):
         super().__init__()
 
 
+# Scraper of each worker process
+content_scraper = None
+
+
+def init_worker():
+    """Init one scraper per worker process"""
+
+    global content_scraper
+    content_scraper = IndeedJobMissingContent()
+
+
 def get_jobids():
-    """Get list of jobids with null jd"""
+    """Stream chunks of jobids with null jd"""
 
     s = IndeedJobMissingContent()
-    jobids = s.jobs_missing_jd("indeed")
+    return s.iter_jobs_missing_jd("indeed")
 
-    print(len(jobids))
-    return jobids
 
+def main(jobids):
+    """Scrape content of a chunk of jobids then save the batch"""
 
-def main(jobid):
-    """Init scraper and start scraping content"""
-
-    content_scraper = IndeedJobMissingContent()
-    content_scraper.scrape_job_content(jobid)
+    for jobid in jobids:
+        content_scraper.scrape_job_content(jobid)
+    content_scraper.jd_writer.flush(final=True)
+    return len(jobids)
 
 
 if __name__ == "__main__":
-    p = multiprocessing.Pool(processes=10)
-    p.map(main, get_jobids())
+    p = multiprocessing.Pool(processes=10, initializer=init_worker)
+    total = 0
+    for done in p.imap_unordered(main, get_jobids()):
+        total += done
+        print(total)
     p.close()
     p.join()
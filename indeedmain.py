@@ -2,10 +2,15 @@ import multiprocessing
 import sys
 import time
 from datetime import datetime
+from functools import partial
 
+from base.asyncengine import AsyncContentEngine
+from base.pipeline import ContentPipeline
 from base.record import ScraperRecord
 from indeed_scraper import indeedcontent, indeedinfo
 from settings import indeedsettings
+from settings.settings import PARTITION_KEEP_MONTHS, SESSION_DEADLINE
+from utils.deadline import Deadline
 
 RECORD = {
     "total_jobs": 0,
@@ -19,13 +24,20 @@ RECORD = {
 }
 
 
-def run_content_scraper():
+def run_content_scraper(session_deadline):
     s = indeedcontent.IndeedJobContentScraper()
-    s.scraper()
+    s.session_deadline = session_deadline
+    if indeedsettings.CONTENT_ENGINE == "async":
+        AsyncContentEngine(s, "indeed").run()
+    elif indeedsettings.CONTENT_ENGINE == "pipeline":
+        ContentPipeline(s, "indeed").run()
+    else:
+        s.scraper()
 
 
-def run_info_scraper(category):
+def run_info_scraper(category, session_deadline):
     scraper = indeedinfo.IndeedJobInfoScraper()
+    scraper.session_deadline = session_deadline
     scraper.run(category)
 
 
@@ -34,14 +46,14 @@ def process_records():
     then send results to database
     """
     global RECORD
-    s = ScraperRecord("indeed_queue")
+    s = ScraperRecord("indeed_queue", indeedsettings.SERVICE_NAME)
 
     # +  -  -  - Query fields that dont need calculating -  -  - +
-    final = s.get_total_jobs("indeed").strip("(,)")
-    RECORD["last_session_jobs"] = str(int(final) - int(RECORD["total_jobs"]))
-    RECORD["total_jobs"] = final
-    RECORD["null_jd"] = s.get_null_jd("indeed").strip("(,)")
-    RECORD["missing_jd"] = s.get_missing_jd("indeed").strip("(,)")
+    stats = s.get_session_stats(indeedsettings.SERVICE_NAME)
+    RECORD["last_session_jobs"] = stats["total_jobs"] - int(RECORD["total_jobs"])
+    RECORD["total_jobs"] = stats["total_jobs"]
+    RECORD["null_jd"] = stats["null_jd"]
+    RECORD["missing_jd"] = stats["missing_jd"]
     RECORD["session_finish"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # +  -  -  - Calculate other fields -  -  - +
@@ -57,8 +69,15 @@ def run():
     # if sys.argv[1] == 'info':
     """Create a pool of scraping-info processes"""
 
+    # Workers stop cleanly once the session budget is spent,
+    # so the barriers below never wait on a stalled worker
+    session_deadline = Deadline(SESSION_DEADLINE)
+
     p = multiprocessing.Pool(processes=4)
-    p.map(run_info_scraper, indeedsettings.INDEED_CATEGORY)
+    p.map(
+        partial(run_info_scraper, session_deadline=session_deadline),
+        indeedsettings.INDEED_CATEGORY,
+    )
     p.close()
     p.join()
 
@@ -71,7 +90,9 @@ def run():
     slaves = 5
     workers = []
     for i in range(slaves):
-        w = multiprocessing.Process(target=run_content_scraper)
+        w = multiprocessing.Process(
+            target=run_content_scraper, args=(session_deadline,)
+        )
         w.start()
         workers.append(w)
         print("Start #", i)
@@ -89,6 +110,9 @@ def main():
     # +  -  -  - Get starting time/jobs -  -  - +
     RECORD["session_start"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     s = ScraperRecord("indeed_queue", indeedsettings.SERVICE_NAME)
+    # Archived before counting jobs so last_session_jobs stays right
+    if PARTITION_KEEP_MONTHS:
+        s.archive_partitions(indeedsettings.SERVICE_NAME, PARTITION_KEEP_MONTHS)
     RECORD["total_jobs"] = s.get_total_jobs(indeedsettings.SERVICE_NAME).strip("(,)")
 
     # +  -  -  - Run scraper -  -  - +
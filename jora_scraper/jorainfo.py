@@ -5,21 +5,30 @@
 # =====================================================================
 
 
-import json
 import logging
 import logging.handlers as handlers
 import smtplib
 import sys
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import psycopg2
 import requests
-from bs4 import BeautifulSoup
 
 from base.base import ScraperBase
-from settings.jorasettings import JORA_ATTRIBUTES, JORA_STATES, URL
+from base.extractor import Extractor
+from base.writer import InfoBatchWriter
+from settings.jorasettings import (
+    INFO_PARSE_ONLY,
+    JORA_FIELDS,
+    SUBCATEGORY_PARSE_ONLY,
+    URL,
+)
+from settings.settings import CATEGORY_DEADLINE
+from utils.deadline import DeadlineExceeded
+from utils.dates import posted_time, within_days
 from utils.RedisQueue import RedisQueue
+from utils.soup import make_soup, strainer
 
 
 class JoraJobInfoScraper(ScraperBase):
@@ -30,6 +39,13 @@ class JoraJobInfoScraper(ScraperBase):
         # Specify redis queue being used
         self.rqueue = RedisQueue("jora_queue")
 
+        # Parse only the tags of pages read by this scraper
+        self.parse_only = strainer(INFO_PARSE_ONLY)
+        self.subcategory_parse_only = strainer(SUBCATEGORY_PARSE_ONLY)
+
+        # Fields of job articles, compiled once
+        self.extractor = Extractor(JORA_FIELDS)
+
         # Get proxy/header
         self.headers = self.get_headers()
         self.proxies = self.get_proxies()
@@ -45,10 +61,28 @@ class JoraJobInfoScraper(ScraperBase):
             "proxy_errors": 0,
             "conn_errors": 0,
             "request_errors": 0,
+            "timeout_errors": 0,
+            "bounces": 0,
+            "server_errors": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "circuit_opens": 0,
+            "total_time_circuit_wait": 0,
             "other_errors": 0,
             "total_subcat": 0,
+            "db_checkouts": 0,
+            "total_time_db_wait": 0,
+            "http_requests": 0,
+            "http_new_connections": 0,
+            "total_time_rate_wait": 0,
+            "deadlines_expired": 0,
         }
 
+        # Job info are saved to db in batches
+        self.info_writer = InfoBatchWriter(self, "jora")
+
         # Setting up logger
         # REFERENCE:
         # https://tutorialedge.net/python/python-logging-best-practices/
@@ -70,51 +104,6 @@ class JoraJobInfoScraper(ScraperBase):
         """Return dictionary with key = areas being recorded"""
         return self.record
 
-    def get_original_post_time(self, jobListingDate, day_limit):
-        """Calculate the original post time of a job"""
-
-        time = jobListingDate.split()
-
-        today_job = True
-
-        # print(time)
-        if time[0] == "about":
-            # eg: about 4 hours ago
-            if time[2] == "hour" or time[2] == "hours":
-                delta = timedelta(hours=int(time[1]))
-            # eg: about 1 month ago
-            elif time[2] == "month":
-                delta = timedelta(days=30)
-                # today_job = False
-            # eg: about 2 months ago
-            elif time[2] == "months":
-                delta = timedelta(days=int(time[1]) * 30)
-                # today_job = False
-
-        elif (time[1] == "day") or (time[1] == "days"):
-            delta = timedelta(days=int(time[0]))
-            if int(time[0]) > int(float(day_limit)):
-                today_job = False
-
-        elif (time[1] == "minutes") or (time[1] == "minute"):
-            delta = timedelta(minutes=int(time[0]))
-
-        elif (time[1] == "seconds") or (time[1] == "second"):
-            delta = timedelta(seconds=int(time[0]))
-
-        elif time[0] == "less":
-            delta = timedelta(minutes=int(1))
-
-        try:
-            self.log.info("-- Time scraped raw: {} \n".format(jobListingDate))
-            original_time = (datetime.now() - delta).strftime("%Y-%m-%d %H:%M:%S")
-        except Exception as e:
-            # self.notify_exception(
-            #     "-time exception at {}: {} \n".format(time, e))
-            self.log.debug("-time exception at {}: {} \n".format(time, e))
-            original_time = "<missing>"
-        return original_time, today_job
-
     def get_subcategory_dict(self, url):
         """Return dictionary of subcategories within one category of job"""
 
@@ -130,8 +119,8 @@ class JoraJobInfoScraper(ScraperBase):
                     time.sleep(0.1)
                     loop_count = 0
                 # parse page content
-                html_page = requests.get(url, headers=self.headers)
-                soup = BeautifulSoup(html_page.text, "html.parser")
+                html_page = self.http_get(url, headers=self.headers)
+                soup = make_soup(html_page.text, self.subcategory_parse_only)
                 table = soup.find("div", class_="browse keyword")
                 # store name of subcategory as key,
                 # link to subcategory as value
@@ -148,6 +137,13 @@ class JoraJobInfoScraper(ScraperBase):
                     # assign key, value
                     subcategory_dict[subcategory_name] = subcategory_link
                 done = True
+            except DeadlineExceeded:
+                raise
+            except requests.exceptions.RequestException as e:
+                # Already retried with backoff and counted by http_get,
+                # try again until the category deadline
+                self.log.exception("-Request failed: {} \n".format(e))
+                self.headers = self.get_headers()
             except Exception as e:
                 time.sleep(0.1)
                 self.log.exception(
@@ -165,186 +161,82 @@ class JoraJobInfoScraper(ScraperBase):
 
         return subcategory_dict
 
-    def scrape_job_info(self, article, day_limit):
-        """Scrape information of ONE job article"""
+    def get_jobid(self, article):
+        """Return jobid of ONE job article"""
+        return article.attrs["id"][2:]
+
+    def scrape_job_info(self, article, day_limit, now):
+        """Scrape information of ONE job article
+        # fields missing from the article are set to "<missing>",
+        # info is {} if the job was not posted within day_limit
+        """
 
         info = {}
         # get job id
-        jobid = article.attrs["id"][2:]
+        jobid = self.get_jobid(article)
         # to check job listing time is within given limit
         time_limit = True
 
-        select_query_start = time.time()
-        if self.check_existed_jobid(jobid, "jora"):
-            self.log.debug("--jobid already scraped: {}  \n".format(jobid))
-            select_query_end = time.time()
-            self.record["total_time_select"] += select_query_end - select_query_start
-            return {}, time_limit
-        else:
-            select_query_end = time.time()
-            self.record["total_time_select"] += select_query_end - select_query_start
-            info = {
-                "jobid": jobid,
-                "scraped_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-
-            # find information based on defined attributes
-            for key, value in JORA_ATTRIBUTES.items():
-
-                # scrape job title
-                if value == "jobtitle":
-                    result = article.a
-                    if result:
-                        result = result.get_text().strip(" \n").replace("'", "''")
-                        info[key] = result
-                    else:
-                        info[key] = "<missing>"
-
-                # scrape job company
-                elif value == "company":
-                    result = article.find("span", class_="company")
-                    if result:
-                        result = result.get_text().strip(" \n").replace("'", "''")
-                        info[key] = result
-                    else:
-                        info[key] = "<missing>"
-
-                # scrape job location
-                elif value == "location":
-                    result = article.find("span", class_="location")
-                    info["jobState"] = "<missing>"
-                    info["jobArea"] = "<missing>"
-                    if result is None:
-                        info[key] = "<missing>"
-                    else:
-                        result = result.get_text().strip(" \n")
-                        info[key] = result.replace("'", "''")
-
-                        new_value = result.split()
-
-                        # separate location into state and area
-                        if len(new_value) >= 2:
-                            info["jobState"] = new_value[-1]
-                            info["jobArea"] = " ".join(new_value[:-1]).replace(
-                                "'", "''"
-                            )
+        info = {
+            "jobid": jobid,
+            "scraped_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+        }
 
-                            # check if location is the same as state's full name
-                            for k, val in JORA_STATES.items():
-                                if " ".join(new_value) == val:
-                                    info["jobState"] = k
-                                    info["jobArea"] = "<missing>"
-                        elif len(new_value) == 1:
-                            for k, val in JORA_STATES.items():
-                                if new_value[0] == k or new_value[0] == val:
-                                    info["jobState"] = k
-
-                # scrape job salary
-                elif value == "salary":
-                    result = article.find("div", class_="salary")
-                    if result:
-                        result = result.get_text().strip(" \n").split()
-
-                        # re-format salary unit, eg: a year -> yearly
-                        period = ["hour", "day", "week", "month", "year"]
-                        periodically = [
-                            "hourly",
-                            "daily",
-                            "weekly",
-                            "monthly",
-                            "yearly",
-                        ]
-                        for idx in range(len(period)):
-                            if len(result) == 3:
-                                # eg: $24 an hour
-                                if result[2] == period[idx]:
-                                    info[key] = "{} {}".format(
-                                        result[0], periodically[idx]
-                                    )
-                            if len(result) == 5:
-                                # eg: $40,000 - $50,000 a year
-                                if result[4] == period[idx]:
-                                    info[key] = "{}-{} {}".format(
-                                        result[0], result[2], periodically[idx]
-                                    )
-                    else:
-                        info[key] = "<missing>"
-
-                # scrape job listing date
-                elif value == "date":
-                    result = article.find("span", class_="date")
-                    if result:
-                        result = result.get_text().strip(" \n")
-                        post_time, time_limit = self.get_original_post_time(
-                            result, day_limit
-                        )
+        # find information based on defined fields
+        info.update(self.extractor.extract(article))
+
+        # check job listing time is within given limit
+        listing_date = info["jobListingDate"]
+        self.log.info("-- Time scraped raw: {} \n".format(listing_date))
+        posted = posted_time(listing_date, now)
+        if posted is None:
+            info["jobListingDate"] = "<missing>"
+        else:
+            # jobs "about N months ago" show up among new ones,
+            # they do not end the scraping
+            time_limit = within_days(posted, now, day_limit) or (
+                "month" in listing_date
+            )
+            if time_limit == False:
+                # if job listed is older than specified day_limit,
+                # stop scraping
+                self.log.info("-Finishing scraping today's jobs \n")
+                return {}, time_limit
+            info["jobListingDate"] = posted.strftime("%Y-%m-%d %H:%M:%S")
 
-                        if time_limit == False:
-                            # if job listed is older than specified day_limit,
-                            # stop scraping
-                            self.log.info("-Finishing scraping today's jobs \n")
-                            return {}, time_limit
-                        info[key] = post_time
-                    else:
-                        info[key] = "<missing>"
-
-                # scrape job short description
-                elif value == "summary":
-                    result = article.find("div", class_="summary")
-                    if result is None:
-                        info[key] = "<missing>"
-                    else:
-                        result = result.get_text().strip(" \n").replace("'", "''")
-                        result = result.strip(",...")
-                        info[key] = "{}".format(result)
         return info, time_limit
 
     def get_job_div(self, url, headers, proxies):
         """Find div containing all job articles"""
 
         redirects = 0
-        proxy_failed = 0
 
+        # Failed requests are retried by http_get, what is left
+        # is raised to the page loop
         done = False
         while not done:
-            try:
-                html_page = requests.get(url, headers=headers)
-                if 300 <= html_page.status_code < 400:
-                    redirects += 1
-                    self.log.debug(
-                        "-Being redirected: {} \n".format(html_page.status_code)
-                    )
-
-                    headers = self.get_headers()
-                    proxies = self.get_proxies()
+            html_page = self.http_get(url, headers=headers)
+            if 300 <= html_page.status_code < 400:
+                redirects += 1
+                self.log.debug("-Being redirected: {} \n".format(html_page.status_code))
 
-                    if redirects > 2:
-                        self.reset_proxy_pool()
-                    if redirects > 4:
-                        done = True
-                        redirects = 0
+                headers = self.get_headers()
+                proxies = self.get_proxies()
 
-                elif html_page.status_code == 200:
-                    soup = BeautifulSoup(html_page.text, "html.parser")
-                    job_results = soup.find("ul", id="jobresults")
-                    done = True
-
-                else:
-                    job_results = None
+                if redirects > 2:
+                    self.reset_proxy_pool()
+                if redirects > 4:
                     done = True
+                    redirects = 0
 
-            except requests.exceptions.ProxyError as p:
-                time.sleep(0.1)
-                proxy_failed += 1
-                self.log.exception(
-                    "-Proxy failed for colresults #{}: {} \n".format(proxy_failed, p)
-                )
+            elif html_page.status_code == 200:
+                soup = make_soup(html_page.text, self.parse_only)
+                job_results = soup.find("ul", id="jobresults")
+                done = True
 
-                if proxy_failed >= 3:
-                    self.reset_proxy_pool()
-                    proxy_failed = 0
-                done = False
-                self.record["proxy_errors"] += 1
+            else:
+                job_results = None
+                done = True
 
         return job_results
 
@@ -357,10 +249,8 @@ class JoraJobInfoScraper(ScraperBase):
 
         i = 0
         page_num = 1
-        proxy_failed = 0
         scraped_page = 0
         jobs_scraped = 0
-        conn_failed = 0
         request_failed = 0
 
         # check if day_limit is 1, get url tail of latest job posts
@@ -386,12 +276,37 @@ class JoraJobInfoScraper(ScraperBase):
                 except:
                     break
                 if article_list:
+                    # check the whole page for already scraped jobids
+                    select_query_start = time.time()
+                    new_jobids = self.filter_new_jobids(
+                        [self.get_jobid(article) for article in article_list], "jora"
+                    )
+                    select_query_end = time.time()
+                    self.record["total_time_select"] += (
+                        select_query_end - select_query_start
+                    )
+
+                    # one reference time for the whole page
+                    now = datetime.now()
+
                     for article in article_list:
 
+                        jobid = self.get_jobid(article)
+                        if jobid not in new_jobids:
+                            self.log.debug(
+                                "--jobid already scraped: {}  \n".format(jobid)
+                            )
+                            existed_id += 1
+                            # if >3 jobid already scraped, skip page
+                            if existed_id > 3:
+                                scraped_page += 1
+                                break
+                            continue
+
                         start_info = time.time()
 
                         scraped_data, daily_job = self.scrape_job_info(
-                            article, day_limit
+                            article, day_limit, now
                         )
 
                         if scraped_data:
@@ -399,17 +314,9 @@ class JoraJobInfoScraper(ScraperBase):
                             scraped_data["jobSubClassification"] = subcategory
                             jobs_scraped += 1
 
-                            # +  -  -  - Put to Redis Queue -  -  - +
-                            self.rqueue.put(scraped_data["jobid"])
-
-                            insert_query_start = time.time()
-                            # +  -  -  - Save to db -  -  - +
-                            self.to_table_db(json.dumps(scraped_data), "jora")
-
-                            insert_query_end = time.time()
-                            self.record["total_time_insert"] += (
-                                insert_query_end - insert_query_start
-                            )
+                            # +  -  -  - Save to db in batches -  -  - +
+                            # jobids are put to Redis Queue once batch is committed
+                            self.info_writer.add(scraped_data)
 
                             # Get total time scraped 1 job info
                             end_info = time.time()
@@ -417,7 +324,9 @@ class JoraJobInfoScraper(ScraperBase):
 
                             self.log.info(
                                 "--- {}. {}: {} \n".format(
-                                    i, scraped_data["jobid"], scraped_data["jobTitle"]
+                                    i,
+                                    scraped_data["jobid"],
+                                    scraped_data["jobTitle"],
                                 )
                             )
                             i += 1
@@ -443,49 +352,28 @@ class JoraJobInfoScraper(ScraperBase):
                     )
                 page_num += 1
 
-            except requests.exceptions.SSLError as s:
-                time.sleep(0.1)
-                self.proxies = self.get_proxies()
-                self.log.exception("-SLLError: {} \n".format(s))
-                self.record["ssl_errors"] += 1
-
-            except requests.exceptions.ProxyError as p:
-                time.sleep(0.1)
-                self.log.exception("-Proxy failed #{}: {} \n".format(proxy_failed, p))
-                proxy_failed += 1
-                if proxy_failed >= 3:
-                    proxy_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["proxy_errors"] += 1
-
-            except requests.exceptions.ConnectionError as ce:
-                time.sleep(0.1)
-                conn_failed += 1
-                self.log.exception("-Connection Error: {} \n".format(ce))
-                if conn_failed >= 3:
-                    conn_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["conn_errors"] += 1
-
-            except requests.exceptions.RequestException as re:
-                time.sleep(0.1)
+            except requests.exceptions.RequestException as e:
+                # Already retried with backoff and counted by http_get,
+                # give up after 3 failed pages
                 request_failed += 1
                 self.log.exception(
-                    "-Request failed #{}: {} \n".format(request_failed, re)
+                    "-Request failed #{}: {} \n".format(request_failed, e)
                 )
+                self.headers = self.get_headers()
                 if request_failed >= 3:
                     request_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["request_errors"] += 1
+                    finished = True
+
+            except DeadlineExceeded as d:
+                self.log.info("-Deadline of {} expired: {} \n".format(subcategory, d))
+                self.record_unfinished(
+                    "jora",
+                    "category",
+                    category=category,
+                    subcategory=subcategory,
+                    page=page_num,
+                )
+                break
 
             except KeyboardInterrupt:
                 self.log.exception(
@@ -493,6 +381,7 @@ class JoraJobInfoScraper(ScraperBase):
                         subcategory
                     )
                 )
+                self.info_writer.flush()
                 break
 
             except Exception as ex:
@@ -505,6 +394,7 @@ class JoraJobInfoScraper(ScraperBase):
         """Run scraper for a particular job category"""
 
         start_cat = time.time()
+        self.start_deadline(CATEGORY_DEADLINE)
 
         message = "-Category: {} \n".format(category)
         self.log.info(message)
@@ -521,7 +411,12 @@ class JoraJobInfoScraper(ScraperBase):
             category_url = "{}/findjobs/{}".format(URL, category.lower())
 
         # get subcategories
-        subcategory_dict = self.get_subcategory_dict(category_url)
+        try:
+            subcategory_dict = self.get_subcategory_dict(category_url)
+        except DeadlineExceeded as d:
+            self.log.info("-Deadline of {} expired: {} \n".format(category, d))
+            self.record_unfinished("jora", "category", category=category)
+            subcategory_dict = {}
         self.record["total_subcat"] = len(subcategory_dict)
 
         # scrape subcategory
@@ -533,8 +428,16 @@ class JoraJobInfoScraper(ScraperBase):
             end_subcat = time.time()
             self.record["total_time_subcat"] += end_subcat - start_subcat
 
+        # Save whatever is left in the batch
+        try:
+            self.info_writer.flush(final=True)
+        except Exception as e:
+            self.log.exception("-DB Error: {} \n".format(e))
+
         self.log.info("Finished scraping info at {} \n".format(self.NOW))
         end_cat = time.time()
         self.record["total_time_cat"] = end_cat - start_cat
         self.log.info("\nRecord: {}\n".format(self.record))
+        self.log.info("Proxies: {}".format(self.proxy_pool.stats()))
+        self.record_http_stats()
         self.rqueue.put(self.record)
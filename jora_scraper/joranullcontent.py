@@ -11,7 +11,7 @@ import multiprocessing
 import time
 from datetime import datetime
 
-from joracontent import JoraJobContentScraper
+from jora_scraper.joracontent import JoraJobContentScraper
 
 
 class JoraJobMissingContent(JoraJobContentScraper):
@@ -21,26 +21,38 @@ class JoraJobMissingContent(JoraJobContentScraper):
         super().__init__()
 
 
+# Scraper of each worker process
+content_scraper = None
+
+
+def init_worker():
+    """Init one scraper per worker process"""
+
+    global content_scraper
+    content_scraper = JoraJobMissingContent()
+
+
 def get_jobids():
-    """Get list of jobids missing jd"""
+    """Stream chunks of jobids missing jd"""
 
     s = JoraJobMissingContent()
-    jobids = s.jobs_missing_jd("jora")
-
-    print(len(jobids))
-    return jobids
+    return s.iter_jobs_missing_jd("jora")
 
 
-def main(jobid):
-    """Init scraper and run"""
+def main(jobids):
+    """Scrape content of a chunk of jobids then save the batch"""
 
-    content_scraper = JoraJobMissingContent()
-    content_scraper.scrape_job_content(jobid)
+    for jobid in jobids:
+        content_scraper.scrape_job_content(jobid)
+    content_scraper.jd_writer.flush(final=True)
+    return len(jobids)
 
 
 if __name__ == "__main__":
-
-    p = multiprocessing.Pool(processes=10)
-    p.map(main, get_jobids())
+    p = multiprocessing.Pool(processes=10, initializer=init_worker)
+    total = 0
+    for done in p.imap_unordered(main, get_jobids()):
+        total += done
+        print(total)
     p.close()
     p.join()
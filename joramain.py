@@ -2,10 +2,15 @@ import multiprocessing
 import sys
 import time
 from datetime import datetime
+from functools import partial
 
+from base.asyncengine import AsyncContentEngine
+from base.pipeline import ContentPipeline
 from base.record import ScraperRecord
 from jora_scraper import joracontent, jorainfo
-from settings.jorasettings import JORA_CATEGORIES, SERVICE_NAME
+from settings.jorasettings import CONTENT_ENGINE, JORA_CATEGORIES, SERVICE_NAME
+from settings.settings import PARTITION_KEEP_MONTHS, SESSION_DEADLINE
+from utils.deadline import Deadline
 
 RECORD = {
     "total_jobs": 0,
@@ -19,13 +24,20 @@ RECORD = {
 }
 
 
-def run_content_scraper():
+def run_content_scraper(session_deadline):
     s = joracontent.JoraJobContentScraper()
-    s.scraper()
+    s.session_deadline = session_deadline
+    if CONTENT_ENGINE == "async":
+        AsyncContentEngine(s, "jora").run()
+    elif CONTENT_ENGINE == "pipeline":
+        ContentPipeline(s, "jora").run()
+    else:
+        s.scraper()
 
 
-def run_info_scraper(category):
+def run_info_scraper(category, session_deadline):
     scraper = jorainfo.JoraJobInfoScraper()
+    scraper.session_deadline = session_deadline
     scraper.run(category)
 
 
@@ -34,14 +46,14 @@ def process_records():
     then send results to database
     """
     global RECORD
-    s = ScraperRecord("jora_queue")
+    s = ScraperRecord("jora_queue", SERVICE_NAME)
 
     # +  -  -  - Query fields that dont need calculating -  -  - +
-    final = s.get_total_jobs("jora").strip("(,)")
-    RECORD["last_session_jobs"] = str(int(final) - int(RECORD["total_jobs"]))
-    RECORD["total_jobs"] = final
-    RECORD["null_jd"] = s.get_null_jd("jora").strip("(,)")
-    RECORD["missing_jd"] = s.get_missing_jd("jora").strip("(,)")
+    stats = s.get_session_stats(SERVICE_NAME)
+    RECORD["last_session_jobs"] = stats["total_jobs"] - int(RECORD["total_jobs"])
+    RECORD["total_jobs"] = stats["total_jobs"]
+    RECORD["null_jd"] = stats["null_jd"]
+    RECORD["missing_jd"] = stats["missing_jd"]
     RECORD["session_finish"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # +  -  -  - Calculate other fields -  -  - +
@@ -56,8 +68,12 @@ def run():
 
     # if sys.argv[1] == 'info':
     """Create a pool of scraping-info processes"""
+    # Workers stop cleanly once the session budget is spent,
+    # so the barriers below never wait on a stalled worker
+    session_deadline = Deadline(SESSION_DEADLINE)
+
     p = multiprocessing.Pool(processes=4)
-    p.map(run_info_scraper, JORA_CATEGORIES)
+    p.map(partial(run_info_scraper, session_deadline=session_deadline), JORA_CATEGORIES)
     p.close()
     p.join()
 
@@ -70,7 +86,9 @@ def run():
     slaves = 5
     workers = []
     for i in range(slaves):
-        w = multiprocessing.Process(target=run_content_scraper)
+        w = multiprocessing.Process(
+            target=run_content_scraper, args=(session_deadline,)
+        )
         w.start()
         workers.append(w)
         print("Start #", i)
@@ -87,6 +105,9 @@ def main():
     # +  -  -  - Get starting time/jobs -  -  - +
     RECORD["session_start"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     s = ScraperRecord("jora_queue", SERVICE_NAME)
+    # Archived before counting jobs so last_session_jobs stays right
+    if PARTITION_KEEP_MONTHS:
+        s.archive_partitions(SERVICE_NAME, PARTITION_KEEP_MONTHS)
     RECORD["total_jobs"] = s.get_total_jobs(SERVICE_NAME).strip("(,)")
 
     # +  -  -  - Run scraper -  -  - +
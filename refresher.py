@@ -0,0 +1,67 @@
+#
+# Keep the proxies and user agents shared by scrapers fresh in Redis.
+# One refresher runs next to all scrapers, which never download lists
+# themselves but ask for a refresh when short of healthy proxies
+#
+# =====================================================================
+
+import time
+
+from settings.settings import REGISTRY_MIN_INTERVAL, REGISTRY_REFRESH_SECONDS
+from utils.registry import Registry
+from utils.utils import (
+    download_agent_headers,
+    download_free_proxies,
+    read_proxies,
+    read_user_agents,
+)
+
+
+def download():
+    """Return freshly downloaded proxies and user agents,
+    an empty list for any download that failed
+    """
+    try:
+        proxies = download_free_proxies()
+    except Exception as e:
+        print("proxies download failed: {}".format(e))
+        proxies = []
+
+    try:
+        agents = download_agent_headers()
+    except Exception as e:
+        print("user agents download failed: {}".format(e))
+        agents = []
+
+    return proxies, agents
+
+
+def main():
+    registry = Registry()
+
+    # Start scrapers with the last downloaded files until a download works
+    if not registry.version():
+        version = registry.publish(read_proxies(), read_user_agents())
+        print("seeded registry from csv: version {}".format(version))
+
+    while True:
+        proxies, agents = download()
+        version = registry.publish(proxies, agents)
+        print(
+            "published version {}: {} proxies, {} user agents".format(
+                version, len(proxies), len(agents)
+            )
+        )
+        refreshed = time.time()
+
+        registry.wait_refresh_request(REGISTRY_REFRESH_SECONDS)
+
+        # Requests right after a refresh wait, so a herd of scrapers
+        # short of proxies makes one download
+        wait = REGISTRY_MIN_INTERVAL - (time.time() - refreshed)
+        if wait > 0:
+            time.sleep(wait)
+
+
+if __name__ == "__main__":
+    main()
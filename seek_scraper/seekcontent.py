@@ -10,13 +10,55 @@
 
 import logging
 import logging.handlers as handlers
+import re
 import time
 
 import requests
-from bs4 import BeautifulSoup
 
 from base.base import ScraperBase
+from base.writer import JdBatchWriter
+from settings.seeksettings import JD_PARSE_ONLY
+from settings.settings import HEDGE_JD_FETCHES, JD_DEADLINE
+from utils.deadline import DeadlineExceeded
 from utils.RedisQueue import RedisQueue
+from utils.soup import make_soup, strainer
+
+# Tags of job ad pages kept when parsing
+PARSE_ONLY = strainer(JD_PARSE_ONLY)
+
+# <div data-automation="expiredJobPage"> of an expired job ad, with the
+# value quoted either way or not at all
+EXPIRED_PAGE = re.compile(
+    r"""<div\b[^>]*\bdata-automation\s*=\s*(["']?)expiredJobPage\1[\s/>]""",
+    re.IGNORECASE,
+)
+
+
+def is_job_expired(html):
+    # Looked up in the raw page, which is then parsed for the jd only
+    return EXPIRED_PAGE.search(html) is not None
+
+
+def parse_job_content(html):
+    """Extract job description from a job ad page
+
+    # Arguments:
+        html: decoded html of the job ad page
+    # Returns:
+        jd as html string, None if the job is expired or has no jd
+    """
+    if is_job_expired(html):
+        return None
+    soup = make_soup(html, PARSE_ONLY)
+    content = soup.find("div", class_="templatetext")
+    if not content:
+        content = soup.find("div", class_="_2e4Pi2B")
+    if content:
+        # s = content.get_text().replace(r"'", r"''")
+        # jd = re.sub(r'\n\s*\n', r'\n\n',
+        #             s.strip(), flags=re.M)
+        return str(content)
+    return None
 
 
 class SeekJobContentScraper(ScraperBase):
@@ -38,9 +80,30 @@ class SeekJobContentScraper(ScraperBase):
             "proxy_errors": 0,
             "conn_errors": 0,
             "request_errors": 0,
+            "timeout_errors": 0,
+            "bounces": 0,
+            "server_errors": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "circuit_opens": 0,
+            "total_time_circuit_wait": 0,
             "other_errors": 0,
+            "jd_rows_written": 0,
+            "jd_flushes": 0,
+            "total_time_jd_flush": 0,
+            "db_checkouts": 0,
+            "total_time_db_wait": 0,
+            "http_requests": 0,
+            "http_new_connections": 0,
+            "total_time_rate_wait": 0,
+            "deadlines_expired": 0,
         }
 
+        # Jd are saved to db in batches
+        self.jd_writer = JdBatchWriter(self, "seek")
+
         # Setting up logger
         # REFERENCE:
         # https://tutorialedge.net/python/python-logging-best-practices/
@@ -65,19 +128,18 @@ class SeekJobContentScraper(ScraperBase):
         """Return dictionary with key = areas being recorded"""
         return self.record
 
-    def is_job_expired(self, soup):
-        content = soup.find("div", attrs={"data-automation": "expiredJobPage"})
-        if content:
-            return True
-        return False
+    # Module function, so the pipeline engine can run it in other processes
+    parse_job_content = staticmethod(parse_job_content)
+
+    def content_url(self, jobid):
+        """Return url of the job ad of jobid"""
+        return "".join(["https://www.seek.com.au/job/", jobid])
 
     def scrape_job_content(self, jobid):
 
         start = time.time()
+        self.start_deadline(JD_DEADLINE)
         existed_id = 0
-        proxy_failed = 0
-        conn_failed = 0
-        request_failed = 0
         redirect = 0
 
         if self.check_existed_jd(jobid, "seek"):
@@ -90,8 +152,11 @@ class SeekJobContentScraper(ScraperBase):
         done = False
         while not done:
             try:
-                url = "".join(["https://www.seek.com.au/job/", jobid])
-                page = requests.get(url, headers=self.headers)
+                page = self.http_get(
+                    self.content_url(jobid),
+                    hedge=HEDGE_JD_FETCHES,
+                    headers=self.headers,
+                )
                 done = False
                 status = page.status_code
 
@@ -107,7 +172,7 @@ class SeekJobContentScraper(ScraperBase):
                 elif status == 404:
                     self.log.debug("-404 error for: {} \n".format(jobid))
                     jd = "<missing>"
-                    self.jd_to_db(jobid, jd, "seek")
+                    self.jd_writer.add(jobid, jd)
                     jd_end = time.time()
                     self.record["total_time_jd"] += jd_end - jd_start
                     print("saved <missing>: {}".format(jobid))
@@ -115,31 +180,20 @@ class SeekJobContentScraper(ScraperBase):
                 elif status == 410:
                     self.log.info("jobid expired: {} \n".format(jobid))
                     jd = "<missing>"
-                    self.jd_to_db(jobid, jd, "seek")
+                    self.jd_writer.add(jobid, jd)
                     jd_end = time.time()
                     self.record["total_time_jd"] += jd_end - jd_start
                     print("saved 410 <missing>: {}".format(jobid))
                     done = True
                 elif status == 200:
-                    soup = BeautifulSoup(
-                        page.content.decode("utf-8", "ignore"), "html.parser"
-                    )
-                    if not self.is_job_expired(soup):
-                        content = soup.find("div", class_="templatetext")
-                        if not content:
-                            content = soup.find("div", class_="_2e4Pi2B")
-                        if content:
-                            # s = content.get_text().replace(r"'", r"''")
-                            # jd = re.sub(r'\n\s*\n', r'\n\n',
-                            #             s.strip(), flags=re.M)
-
-                            jd = str(content).replace(r"'", r"''")
-                            self.jd_to_db(jobid, jd, "seek")
-                            jd_end = time.time()
-                            self.record["total_time_jd"] += jd_end - jd_start
-
-                            print("saved: {}".format(jobid))
-                            self.log.info("saved: {}".format(jobid))
+                    jd = self.parse_job_content(page.content.decode("utf-8", "ignore"))
+                    if jd:
+                        self.jd_writer.add(jobid, jd)
+                        jd_end = time.time()
+                        self.record["total_time_jd"] += jd_end - jd_start
+
+                        print("saved: {}".format(jobid))
+                        self.log.info("saved: {}".format(jobid))
 
                     done = True
                 else:
@@ -148,64 +202,42 @@ class SeekJobContentScraper(ScraperBase):
                     "Total time scraping 1 job = {}s".format(time.time() - start)
                 )
 
-            except requests.exceptions.SSLError as s:
-                time.sleep(0.1)
-                self.proxies = self.get_proxies()
-                self.log.exception("-SLLError: {} \n".format(s))
-                self.record["ssl_errors"]
-
-            except requests.exceptions.ProxyError as p:
-                time.sleep(0.1)
-                proxy_failed += 1
-                self.log.exception("-Proxy failed: {} \n".format(p))
-                self.proxies = self.get_proxies()
-                if proxy_failed >= 3:
-                    proxy_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["proxy_errors"]
-
-            except requests.exceptions.ConnectionError as ce:
-                conn_failed += 1
-                self.log.exception("-Connection Error: {} \n".format(ce))
-                time.sleep(0.1)
-                if conn_failed >= 3:
-                    conn_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["conn_errors"]
-
             except requests.exceptions.RequestException as e:
-                request_failed += 1
-                time.sleep(0.1)
+                # Already retried with backoff and counted by http_get,
+                # the jd is left to the nullcontent scraper
                 self.log.exception("-Request failed: {} \n".format(e))
-                if request_failed >= 3:
-                    request_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["request_errors"]
+                break
+
+            except DeadlineExceeded as d:
+                self.log.info("-Deadline of jobid {} expired: {} \n".format(jobid, d))
+                self.record_unfinished("seek", "jd", jobid=jobid)
+                break
 
             except KeyboardInterrupt:
                 self.log.exception(
                     "-Keyboard Interrupted: wait putting jobid to exception table"
                 )
+                self.jd_writer.flush()
                 break
 
             except Exception as ex:
                 self.log.exception("-Unknown Exceptions: {} \n".format(ex))
-                self.record["other_errors"]
+                self.record["other_errors"] += 1
 
     def scraper(self):
 
         num_record = 0
         empty = 0
         while True:
+            # Jobids left in the queue wait for the next session
+            if self.session_deadline.expired():
+                self.log.info("-Session deadline expired \n")
+                self.record_unfinished("seek", "session", queued=self.rqueue.size())
+                self.jd_writer.flush()
+                self.record_http_stats()
+                self.rqueue.put(self.record)
+                break
+
             jobid = self.rqueue.pop(timeout=10)
 
             if jobid:
@@ -215,7 +247,10 @@ class SeekJobContentScraper(ScraperBase):
                     print(num_record)
                     if num_record >= 90:
                         self.rqueue.put(jobid)
+                        # Save buffered jd before reporting
+                        self.jd_writer.flush()
                         # Put record into queue for latter use
+                        self.record_http_stats()
                         self.rqueue.put(self.record)
                         break
                     else:
@@ -228,3 +263,7 @@ class SeekJobContentScraper(ScraperBase):
                 empty += 1
                 if empty >= 3:
                     break
+
+        # Save whatever is left in the batch
+        self.jd_writer.flush(final=True)
+        self.log.info("Proxies: {}".format(self.proxy_pool.stats()))
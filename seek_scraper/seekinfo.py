@@ -8,18 +8,22 @@
 # =====================================================================
 
 
-import json
 import logging
 import logging.handlers as handlers
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import requests
-from bs4 import BeautifulSoup
 
 from base.base import ScraperBase
-from settings.seeksettings import SEEK_LINK, URL
+from base.extractor import Extractor
+from base.writer import InfoBatchWriter
+from settings.seeksettings import INFO_PARSE_ONLY, SEEK_FIELDS, SEEK_LINK, URL
+from settings.settings import CATEGORY_DEADLINE
+from utils.deadline import DeadlineExceeded
+from utils.dates import posted_times, within_days
 from utils.RedisQueue import RedisQueue
+from utils.soup import make_soup, strainer
 
 
 class SeekJobInfoScraper(ScraperBase):
@@ -30,6 +34,9 @@ class SeekJobInfoScraper(ScraperBase):
         # Specify redis queue being used
         self.rqueue = RedisQueue("seek_queue")
 
+        # Parse only the tags of pages read by this scraper
+        self.parse_only = strainer(INFO_PARSE_ONLY)
+
         # Variables keeping record of scraper
         self.record = {
             "total_time_info": 0,
@@ -41,10 +48,28 @@ class SeekJobInfoScraper(ScraperBase):
             "proxy_errors": 0,
             "conn_errors": 0,
             "request_errors": 0,
+            "timeout_errors": 0,
+            "bounces": 0,
+            "server_errors": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "circuit_opens": 0,
+            "total_time_circuit_wait": 0,
             "other_errors": 0,
             "total_subcat": 0,
+            "db_checkouts": 0,
+            "total_time_db_wait": 0,
+            "http_requests": 0,
+            "http_new_connections": 0,
+            "total_time_rate_wait": 0,
+            "deadlines_expired": 0,
         }
 
+        # Job info are saved to db in batches
+        self.info_writer = InfoBatchWriter(self, "seek")
+
         # Setting up logger
         # REFERENCE:
         # https://tutorialedge.net/python/python-logging-best-practices/
@@ -62,40 +87,13 @@ class SeekJobInfoScraper(ScraperBase):
         if not self.log.handlers:
             self.log.addHandler(logHandler)
 
-        self.key = [
-            "jobTitle",
-            "jobCompany",
-            "jobLocation",
-            "jobClassification",
-            "jobSubClassification",
-            "jobArea",
-            "jobListingDate",
-            "jobShortDescription",
-        ]
+        # Fields of job articles, compiled once
+        self.extractor = Extractor(SEEK_FIELDS)
 
     def get_records(self):
         """Return dictionary with key = areas being recorded"""
         return self.record
 
-    def get_original_post_time(self, jobListingDate, days):
-        """Calculate the original post time of a job by Seek"""
-
-        posted = jobListingDate[:-4]
-        posted_today = True
-        if "d" in posted:
-            gap = timedelta(days=int(posted[:-1]))
-            if int(posted[:-1]) > int(float(days)):
-                posted_today = False
-        elif "h" in posted:
-            gap = timedelta(hours=int(posted[:-1]))
-        elif "m" in posted:
-            gap = timedelta(minutes=int(posted[:-1]))
-        elif "s" in posted:
-            gap = timedelta(seconds=int(posted[:-1]))
-
-        origin_time = (datetime.now() - gap).strftime("%Y-%m-%d %H:%M")
-        return origin_time, posted_today
-
     def page_zero_result(self, soup):
         """Check if the page has any job"""
         zero = soup.find("div", attrs={"data-automation": "searchZeroResults"})
@@ -113,6 +111,7 @@ class SeekJobInfoScraper(ScraperBase):
         """Scrape all jobs of a given industry"""
 
         start_cat = time.time()
+        self.start_deadline(CATEGORY_DEADLINE)
 
         msg = "Start scraping for: {}".format(industry.upper())
         print(msg)
@@ -124,9 +123,7 @@ class SeekJobInfoScraper(ScraperBase):
         page_num = 1
         redirects = 0
         total_jobs = 0
-        conn_failed = 0
         zero_results = 0
-        proxy_failed = 0
         existed_jobid = 0
         request_failed = 0
 
@@ -147,7 +144,7 @@ class SeekJobInfoScraper(ScraperBase):
                 else:
                     allow_redirects = False
 
-                page = requests.get(
+                page = self.http_get(
                     url, headers=headers, allow_redirects=allow_redirects
                 )
 
@@ -163,8 +160,8 @@ class SeekJobInfoScraper(ScraperBase):
                         redirects = 0
 
                 elif page.status_code == 200:
-                    soup = BeautifulSoup(
-                        page.content.decode("utf-8", "ignore"), "html.parser"
+                    soup = make_soup(
+                        page.content.decode("utf-8", "ignore"), self.parse_only
                     )
 
                     # check total jobs found:
@@ -189,103 +186,77 @@ class SeekJobInfoScraper(ScraperBase):
                         job_articles = soup.find_all(
                             "article", attrs={"data-automation": "normalJob"}
                         )
+
+                        # check the whole page for already scraped jobids
+                        select_query_start = time.time()
+                        new_jobids = self.filter_new_jobids(
+                            [j["data-job-id"] for j in job_articles], "seek"
+                        )
+                        select_query_end = time.time()
+                        self.record["total_time_select"] += (
+                            select_query_end - select_query_start
+                        )
+
+                        # One reference time for the whole page
+                        now = datetime.now()
+                        scraped_at = now.strftime("%Y-%m-%d %H:%M:%S")
+
+                        # + -- -- Extract post info -- -- +
+
+                        infos = []
                         for j in job_articles:
                             jobid = j["data-job-id"]
 
-                            select_query_start = time.time()
-                            # check if jobid already scraped
-                            if self.check_existed_jobid(jobid, "seek"):
+                            if jobid not in new_jobids:
                                 existed_jobid += 1
-                                select_query_end = time.time()
-                                self.record["total_time_select"] += (
-                                    select_query_end - select_query_start
-                                )
-
                                 self.log.info(
                                     "-jobid already scraped: {} - #{}".format(
                                         jobid, existed_jobid
                                     )
                                 )
-                            else:
+                                continue
 
-                                select_query_end = time.time()
-                                self.record["total_time_select"] += (
-                                    select_query_end - select_query_start
-                                )
+                            info = {"jobid": jobid, "scraped_at": scraped_at}
+                            info.update(self.extractor.extract(j))
+                            infos.append(info)
 
-                                # + -- -- Extract post info -- -- +
-
-                                info = {
-                                    "jobid": jobid,
-                                    "scraped_at": datetime.now().strftime(
-                                        "%Y-%m-%d %H:%M:%S"
-                                    ),
-                                }
-
-                                for k in self.key:
-                                    tag = j.find(attrs={"data-automation": k})
-                                    if tag:
-
-                                        # IMPORTANT
-                                        info[k] = tag.text.replace(r"'", r"''")
-
-                                        if k == "jobCompany" and tag.has_attr("href"):
-                                            advertiserid = tag["href"][19:]
-
-                                            if advertiserid.isdigit():
-                                                info["advertiserid"] = advertiserid
-                                            else:
-                                                info["advertiserid"] = (
-                                                    "<missing advertiserid>"
-                                                )
-
-                                        if k == "jobListingDate":
-                                            info["posted_at"], posted_today = (
-                                                self.get_original_post_time(
-                                                    info[k], days
-                                                )
-                                            )
-                                            if not posted_today:
-                                                self.log.info(
-                                                    "Finished scraping today's job"
-                                                )
-                                                break
-
-                                # + -- -- Save to database -- -- +
-                                if posted_today:
-                                    try:
-                                        insert_query_start = time.time()
-                                        self.to_table_db(json.dumps(info), "seek")
-
-                                        insert_query_end = time.time()
-                                        self.record["total_time_insert"] += (
-                                            insert_query_end - insert_query_start
-                                        )
-
-                                        self.rqueue.put(info["jobid"])
-                                        info["saved_to_db"] = True
-                                    except Exception as e:
-                                        self.log.exception("db error: {}".format(e))
-                                        info["saved_to_db"] = False
-                                        info["exception"] = repr(e)
-
-                                    jobs.append(info)
-                                    self.log.info(
-                                        "--- {}. {}: {} \n".format(
-                                            i,
-                                            info["jobid"],
-                                            info["jobTitle"].encode("utf-8"),
-                                        )
-                                    )
-                                    i += 1
+                        posted = posted_times(
+                            [info.get("jobListingDate") for info in infos], now
+                        )
 
-                                    # Get total time scraped 1 job info
-                                    end_info = time.time()
-                                    self.record["total_time_info"] += (
-                                        end_info - start_info
+                        for info, posted_at in zip(infos, posted):
+                            # Jobs without a readable listing date are kept
+                            posted_today = True
+                            if posted_at is not None:
+                                info["posted_at"] = posted_at.strftime("%Y-%m-%d %H:%M")
+                                posted_today = within_days(posted_at, now, days)
+                            if not posted_today:
+                                self.log.info("Finished scraping today's job")
+
+                            # + -- -- Save to database -- -- +
+                            if posted_today:
+                                try:
+                                    # Saved with the next batch, jobid is
+                                    # queued once the batch is committed
+                                    self.info_writer.add(info)
+                                except Exception as e:
+                                    self.log.exception("db error: {}".format(e))
+
+                                jobs.append(info)
+                                self.log.info(
+                                    "--- {}. {}: {} \n".format(
+                                        i,
+                                        info["jobid"],
+                                        info["jobTitle"].encode("utf-8"),
                                     )
-                                else:
-                                    finished = True
+                                )
+                                i += 1
+
+                                # Get total time scraped 1 job info
+                                end_info = time.time()
+                                self.record["total_time_info"] += end_info - start_info
+                            else:
+                                finished = True
 
                     if existed_jobid >= 60:
                         finished = True
@@ -294,45 +265,24 @@ class SeekJobInfoScraper(ScraperBase):
                 else:
                     finished = True
 
-            except requests.exceptions.SSLError as s:
-                time.sleep(0.1)
-                self.proxies = self.get_proxies()
-                self.log.exception("-SLLError: {} \n".format(s))
-                self.record["ssl_errors"] += 1
-
-            except requests.exceptions.ProxyError as p:
-                time.sleep(0.1)
-                proxy_failed += 1
-                self.log.exception("Proxy failed #{}: {}".format(proxy_failed, p))
-                if proxy_failed >= 3:
-                    proxy_failed = 0
-                    self.reset_proxy_pool()
-                headers = self.get_headers()
-                proxies = self.get_proxies()
-                self.record["proxy_errors"] += 1
-
-            except requests.exceptions.ConnectionError as ce:
-                conn_failed += 1
-                self.log.exception("-Connection Error: {} \n".format(ce))
-                time.sleep(0.1)
-                if conn_failed >= 3:
-                    conn_failed = 0
-                    self.reset_proxy_pool()
-                    self.log.debug("-Re-downloading proxies \n")
-                self.headers = self.get_headers()
-                self.proxies = self.get_proxies()
-                self.record["conn_errors"] += 1
-
             except requests.exceptions.RequestException as e:
-                time.sleep(0.1)
+                # Already retried with backoff and counted by http_get,
+                # give up after 3 failed pages
                 request_failed += 1
-                self.log.exception("Request failed: {}".format(e))
+                self.log.exception(
+                    "-Request failed #{}: {} \n".format(request_failed, e)
+                )
                 headers = self.get_headers()
-                proxies = self.get_proxies()
                 if request_failed >= 3:
                     request_failed = 0
                     finished = True
-                self.record["request_errors"] += 1
+
+            except DeadlineExceeded as d:
+                self.log.info("Deadline of {} expired: {}".format(industry, d))
+                self.record_unfinished(
+                    "seek", "category", category=industry, page=page_num
+                )
+                break
 
             except KeyboardInterrupt:
                 self.log.exception(
@@ -340,6 +290,7 @@ class SeekJobInfoScraper(ScraperBase):
                         industry
                     )
                 )
+                self.info_writer.flush()
                 break
 
             except Exception as ex:
@@ -347,7 +298,15 @@ class SeekJobInfoScraper(ScraperBase):
                 self.log.exception(ex)
                 self.record["other_errors"] += 1
 
-            end_cat = time.time()
-            self.record["total_time_cat"] = end_cat - start_cat
-            self.log.info("\nRecord: {}\n".format(self.record))
-            self.rqueue.put(self.record)
+        # Save whatever is left in the batch
+        try:
+            self.info_writer.flush(final=True)
+        except Exception as e:
+            self.log.exception("db error: {}".format(e))
+
+        end_cat = time.time()
+        self.record["total_time_cat"] = end_cat - start_cat
+        self.log.info("\nRecord: {}\n".format(self.record))
+        self.log.info("Proxies: {}".format(self.proxy_pool.stats()))
+        self.record_http_stats()
+        self.rqueue.put(self.record)
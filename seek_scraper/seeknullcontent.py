@@ -21,25 +21,38 @@ class SeekJobMissingContent(SeekJobContentScraper):
         super().__init__()
 
 
+# Scraper of each worker process
+content_scraper = None
+
+
+def init_worker():
+    """Init one scraper per worker process"""
+
+    global content_scraper
+    content_scraper = SeekJobMissingContent()
+
+
 def get_jobids():
-    """Get list of jobids whose jd is null"""
+    """Stream chunks of jobids whose jd is null"""
 
     s = SeekJobMissingContent()
-    jobids = s.jobs_missing_jd("seek")
+    return s.iter_jobs_missing_jd("seek")
 
-    print(len(jobids))
-    return jobids
 
+def main(jobids):
+    """Scrape content of a chunk of jobids then save the batch"""
 
-def main(jobid):
-    """Init scraper and run"""
-
-    content_scraper = SeekJobMissingContent()
-    content_scraper.scrape_job_content(jobid)
+    for jobid in jobids:
+        content_scraper.scrape_job_content(jobid)
+    content_scraper.jd_writer.flush(final=True)
+    return len(jobids)
 
 
 if __name__ == "__main__":
-    p = multiprocessing.Pool(processes=10)
-    p.map(main, get_jobids())
+    p = multiprocessing.Pool(processes=10, initializer=init_worker)
+    total = 0
+    for done in p.imap_unordered(main, get_jobids()):
+        total += done
+        print(total)
     p.close()
     p.join()
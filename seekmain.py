@@ -1,9 +1,14 @@
 import multiprocessing
 from datetime import datetime
+from functools import partial
 
+from base.asyncengine import AsyncContentEngine
+from base.pipeline import ContentPipeline
 from base.record import ScraperRecord
 from seek_scraper import seekcontent, seekinfo
-from settings.seeksettings import SEEK_CATEGORIES, SERVICE_NAME
+from settings.seeksettings import CONTENT_ENGINE, SEEK_CATEGORIES, SERVICE_NAME
+from settings.settings import PARTITION_KEEP_MONTHS, SESSION_DEADLINE
+from utils.deadline import Deadline
 
 RECORD = {
     "total_jobs": 0,
@@ -17,13 +22,20 @@ RECORD = {
 }
 
 
-def run_content_scraper():
+def run_content_scraper(session_deadline):
     s = seekcontent.SeekJobContentScraper()
-    s.scraper()
+    s.session_deadline = session_deadline
+    if CONTENT_ENGINE == "async":
+        AsyncContentEngine(s, "seek").run()
+    elif CONTENT_ENGINE == "pipeline":
+        ContentPipeline(s, "seek").run()
+    else:
+        s.scraper()
 
 
-def run_info_scraper(category):
+def run_info_scraper(category, session_deadline):
     scraper = seekinfo.SeekJobInfoScraper()
+    scraper.session_deadline = session_deadline
     scraper.job_by_industry(category)
 
 
@@ -32,14 +44,14 @@ def process_records():
     then send results to database
     """
     global RECORD
-    s = ScraperRecord("seek_queue")
+    s = ScraperRecord("seek_queue", SERVICE_NAME)
 
     # +  -  -  - Query fields that dont need calculating -  -  - +
-    final = s.get_total_jobs("seek").strip("(,)")
-    RECORD["last_session_jobs"] = str(int(final) - int(RECORD["total_jobs"]))
-    RECORD["total_jobs"] = final
-    RECORD["null_jd"] = s.get_null_jd("seek").strip("(,)")
-    RECORD["missing_jd"] = s.get_missing_jd("seek").strip("(,)")
+    stats = s.get_session_stats(SERVICE_NAME)
+    RECORD["last_session_jobs"] = stats["total_jobs"] - int(RECORD["total_jobs"])
+    RECORD["total_jobs"] = stats["total_jobs"]
+    RECORD["null_jd"] = stats["null_jd"]
+    RECORD["missing_jd"] = stats["missing_jd"]
     RECORD["session_finish"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # +  -  -  - Calculate other fields -  -  - +
@@ -54,8 +66,12 @@ def run():
 
     # if sys.argv[1] == 'info':
     """Create a pool of scraping-info processes"""
+    # Workers stop cleanly once the session budget is spent,
+    # so the barriers below never wait on a stalled worker
+    session_deadline = Deadline(SESSION_DEADLINE)
+
     p = multiprocessing.Pool(processes=4)
-    p.map(run_info_scraper, SEEK_CATEGORIES)
+    p.map(partial(run_info_scraper, session_deadline=session_deadline), SEEK_CATEGORIES)
     p.close()
     p.join()
 
@@ -65,7 +81,9 @@ def run():
     slaves = 5
     workers = []
     for i in range(slaves):
-        w = multiprocessing.Process(target=run_content_scraper)
+        w = multiprocessing.Process(
+            target=run_content_scraper, args=(session_deadline,)
+        )
         w.start()
         workers.append(w)
         print("Start #", i)
@@ -82,6 +100,9 @@ def main():
     # +  -  -  - Get starting time/jobs -  -  - +
     RECORD["session_start"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     s = ScraperRecord("seek_queue", SERVICE_NAME)
+    # Archived before counting jobs so last_session_jobs stays right
+    if PARTITION_KEEP_MONTHS:
+        s.archive_partitions(SERVICE_NAME, PARTITION_KEEP_MONTHS)
     RECORD["total_jobs"] = s.get_total_jobs(SERVICE_NAME).strip("(,)")
 
     # +  -  -  - Run scraper -  -  - +
@@ -3,16 +3,21 @@ CONTENT_URL = "https://au.indeed.com/viewjob?jk="
 SERVICE_NAME = "indeed"
 LOG_FILE = "./logs/info_scrape_log.log"
 
-INDEED_ATTRIBUTES = {
-    "jobTitle": "jobtitle",
-    "jobCompany": "company",
-    "jobLocation": "location",
-    "jobShortDescription": "summary",
-    "jobListingDate": "date",
-    "sponsored": "sponsoredGray",
-    "salary": "no-wrap",
-    "numReviews": "slNoUnderline",
-}
+CONTENT_ENGINE = "process"
+
+HOST = "au.indeed.com"
+RATE_LIMIT = 3
+RATE_BURST = 6
+RATE_MIN = 1
+RATE_MAX = 12
+
+# Tags kept when parsing pages, see utils.soup.strainer: the rest of a
+# page is skipped instead of built into the tree.
+# Job ad pages are parsed whole: an incomplete page is told from a
+# missing jd by div.container, which wraps the whole page
+INFO_PARSE_ONLY = {"name": "td", "attrs": {"id": "resultsCol"}}
+SUBCATEGORY_PARSE_ONLY = {"name": "table", "attrs": {"id": "titles"}}
+JD_PARSE_ONLY = None
 
 INDEED_STATES = {
     "NSW": "New South Wales",
@@ -24,6 +29,44 @@ INDEED_STATES = {
     "VIC": "Victoria",
 }
 
+# Fields of a job article, see base.extractor.Extractor:
+# selectors are tried in order, process names the post-processor
+INDEED_FIELDS = [
+    {
+        "key": "jobTitle",
+        "select": [
+            {"name": "a", "class": "jobtitle"},
+            {"name": "a", "class": "jobtitle turnstileLink"},
+            {"name": "a"},
+        ],
+    },
+    {"key": "jobCompany", "select": [{"class": "company"}]},
+    {
+        "key": "jobLocation",
+        "select": [{"class": "location"}],
+        "process": "location",
+        "states": INDEED_STATES,
+    },
+    {"key": "jobShortDescription", "select": [{"class": "summary"}], "trim": ",..."},
+    # Turned into the post time by the scraper
+    {"key": "jobListingDate", "select": [{"name": "span", "class": "date"}]},
+    {
+        "key": "sponsored",
+        "select": [{"name": "span", "class": "sponsoredGray"}],
+        "process": "sponsored",
+    },
+    {
+        "key": "salary",
+        "select": [{"name": "span", "class": "no-wrap"}],
+        "process": "salary",
+    },
+    {
+        "key": "numReviews",
+        "select": [{"name": "span", "class": "slNoUnderline"}],
+        "process": "first_word",
+    },
+]
+
 
 INDEED_CATEGORY = [
     "Other",
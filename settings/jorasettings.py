@@ -1,6 +1,20 @@
 URL = "https://au.jora.com"
 SERVICE_NAME = "jora"
 
+CONTENT_ENGINE = "process"
+
+HOST = "au.jora.com"
+RATE_LIMIT = 3
+RATE_BURST = 6
+RATE_MIN = 1
+RATE_MAX = 12
+
+# Tags kept when parsing pages, see utils.soup.strainer: the rest of a
+# page is skipped instead of built into the tree
+INFO_PARSE_ONLY = {"name": "ul", "attrs": {"id": "jobresults"}}
+SUBCATEGORY_PARSE_ONLY = {"name": "div", "attrs": {"class": "browse keyword"}}
+JD_PARSE_ONLY = {"name": "div", "attrs": {"class": "summary"}}
+
 JORA_STATES = {
     "NSW": "New South Wales",
     "QLD": "Queensland",
@@ -12,14 +26,30 @@ JORA_STATES = {
     "ACT": "Australian Capital Territory",
 }
 
-JORA_ATTRIBUTES = {
-    "jobTitle": "jobtitle",
-    "jobCompany": "company",
-    "jobLocation": "location",
-    "jobShortDescription": "summary",
-    "jobListingDate": "date",
-    "salary": "salary",
-}
+# Fields of a job article, see base.extractor.Extractor:
+# selectors are tried in order, process names the post-processor
+JORA_FIELDS = [
+    {"key": "jobTitle", "select": [{"name": "a"}]},
+    {"key": "jobCompany", "select": [{"name": "span", "class": "company"}]},
+    {
+        "key": "jobLocation",
+        "select": [{"name": "span", "class": "location"}],
+        "process": "location",
+        "states": JORA_STATES,
+    },
+    {
+        "key": "jobShortDescription",
+        "select": [{"name": "div", "class": "summary"}],
+        "trim": ",...",
+    },
+    # Turned into the post time by the scraper
+    {"key": "jobListingDate", "select": [{"name": "span", "class": "date"}]},
+    {
+        "key": "salary",
+        "select": [{"name": "div", "class": "salary"}],
+        "process": "salary",
+    },
+]
 
 JORA_CATEGORIES = [
     "Accounting",
@@ -1,6 +1,50 @@
 URL = "https://www.seek.com.au/"
 SERVICE_NAME = "seek"
 
+CONTENT_ENGINE = "process"
+
+HOST = "www.seek.com.au"
+RATE_LIMIT = 5
+RATE_BURST = 10
+RATE_MIN = 1
+RATE_MAX = 20
+
+# Tags kept when parsing pages, see utils.soup.strainer: the rest of a
+# page is skipped instead of built into the tree.
+# Expired jobs are told from the raw page, their div is never parsed
+INFO_PARSE_ONLY = {
+    "attrs": {
+        "data-automation": ["normalJob", "searchZeroResults", "totalJobsCount"]
+    }
+}
+JD_PARSE_ONLY = {"name": "div", "attrs": {"class": ["templatetext", "_2e4Pi2B"]}}
+
+# Fields of a job article, see base.extractor.Extractor: all are found
+# by their data-automation attribute, kept as is and left out if missing
+SEEK_FIELDS = [
+    {
+        "key": key,
+        "select": [{"attrs": {"data-automation": key}}],
+        "strip": None,
+        "missing": None,
+    }
+    for key in (
+        "jobTitle",
+        "jobClassification",
+        "jobSubClassification",
+        "jobArea",
+        "jobLocation",
+        "jobListingDate",
+        "jobShortDescription",
+    )
+] + [
+    {
+        "key": "jobCompany",
+        "select": [{"attrs": {"data-automation": "jobCompany"}}],
+        "process": "advertiser",
+    }
+]
+
 SEEK_LINK = {
     "Accounting": "jobs-in-accounting",
     "Administration & Office Support": "jobs-in-administration-office-support",
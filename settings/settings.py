@@ -1 +1,144 @@
 DB_HOST = "postgresql://steve@localhost:5432/bitko"
+
+# Redis holding job queues and state shared by all scraper processes
+REDIS_HOST = "localhost"
+REDIS_PORT = 6379
+REDIS_PASSWORD = "stevedang"
+REDIS_DB = 0
+
+# Job info rows are buffered per process and inserted in batches,
+# a batch is flushed when it is full or older than INFO_BATCH_SECONDS
+INFO_BATCH_SIZE = 50
+INFO_BATCH_SECONDS = 10
+# A batch failing to insert is kept for INFO_BATCH_RETRIES more flushes,
+# then inserted row by row, dropping and logging the rows failing alone
+INFO_BATCH_RETRIES = 3
+
+# Same for jd saved by content scrapers
+JD_BATCH_SIZE = 50
+JD_BATCH_SECONDS = 10
+JD_BATCH_RETRIES = 3
+
+# One connection pool is shared by all scrapers of a process,
+# connections are opened on first query if DB_LAZY_CONNECT.
+# The pool opens DB_POOL_MIN connections and closes any connection
+# returned above that many, losing its prepared statements, so all
+# DB_POOL_MAX are kept open
+DB_POOL_MAX = 4
+DB_POOL_MIN = DB_POOL_MAX
+DB_LAZY_CONNECT = True
+
+# Jobids missing jd are streamed from db in chunks of this size
+MISSING_JD_CHUNK_SIZE = 50
+
+# Create new {site}jobs tables partitioned by month of scraped_at,
+# partitions are created PARTITION_MONTHS_AHEAD months in advance
+# and detached to PARTITION_ARCHIVE_SCHEMA by archive_partitions
+# once they are PARTITION_KEEP_MONTHS months old (None keeps them all)
+PARTITIONED_TABLES = False
+PARTITION_MONTHS_AHEAD = 2
+PARTITION_ARCHIVE_SCHEMA = "archive"
+PARTITION_KEEP_MONTHS = None
+
+# Pooled HTTP session shared by all scrapers of a process:
+# number of hosts kept in pool and connections kept per host
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 20
+
+# Content scrapers of a site run with the CONTENT_ENGINE of its settings:
+# one request at a time per process ("process"), many requests on an
+# event loop ("async") or fetch, parse and save in stages ("pipeline")
+
+# Content scrapers run with CONTENT_ENGINE = "async" keep up to
+# ASYNC_CONCURRENCY requests in flight per process, with at most
+# ASYNC_PER_HOST connections to one host
+ASYNC_CONCURRENCY = 100
+ASYNC_PER_HOST = 20
+ASYNC_TIMEOUT = 30
+
+# Requests are limited per HOST given in each site's settings: RATE_LIMIT
+# requests per second by all processes together, RATE_BURST at once after
+# a quiet period. The rate then adapts between RATE_MIN and RATE_MAX of
+# the site: it grows by AIMD_INCREASE requests per second each second
+# while responses are 200 and faster than AIMD_SLOW_SECONDS, and are
+# multiplied by AIMD_DECREASE on redirects, 429s, timeouts and connection
+# errors, at most once every AIMD_COOLDOWN seconds
+AIMD_INCREASE = 0.5
+AIMD_DECREASE = 0.5
+AIMD_SLOW_SECONDS = 2
+AIMD_COOLDOWN = 2
+
+# Seconds to wait for a connection and for data of a response
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 20
+
+# Wall-clock budgets in seconds of a category crawl, of one jd and of a
+# whole session. Work cut by a deadline is kept in {site}_unfinished queue
+CATEGORY_DEADLINE = 30 * 60
+JD_DEADLINE = 60
+SESSION_DEADLINE = 4 * 60 * 60
+
+# Proxies are sent with requests if USE_PROXIES, picked by success rate
+# over latency EWMA. A failing proxy cools down PROXY_COOLDOWN seconds,
+# doubled on each failure in a row, and is evicted after
+# PROXY_EVICT_FAILURES in a row. New proxies are only downloaded when
+# fewer than PROXY_MIN_HEALTHY are usable
+USE_PROXIES = False
+PROXY_EWMA_ALPHA = 0.3
+PROXY_COOLDOWN = 30
+PROXY_EVICT_FAILURES = 5
+PROXY_MIN_HEALTHY = 10
+
+# Proxies and user agents are shared through Redis by refresher.py, which
+# downloads new lists every REGISTRY_REFRESH_SECONDS, or sooner when
+# scrapers run short of healthy proxies but no more than once every
+# REGISTRY_MIN_INTERVAL seconds. Scrapers look for a new version at most
+# every REGISTRY_CHECK_SECONDS
+REGISTRY_REFRESH_SECONDS = 30 * 60
+REGISTRY_MIN_INTERVAL = 60
+REGISTRY_CHECK_SECONDS = 30
+
+# Failed requests are tried up to RETRY_MAX_ATTEMPTS times in all, waiting
+# a random time up to RETRY_BASE_DELAY * 2 ** attempt, at most
+# RETRY_MAX_DELAY. Retries to a site are limited to RETRY_BUDGET_RATIO of
+# its requests, with up to RETRY_BUDGET_CAP retries saved up
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_CAP = 10
+
+# Content scrapers hedge jd requests if HEDGE_JD_FETCHES: a request slower
+# than HEDGE_PERCENTILE of the last HEDGE_WINDOW ones is sent again with
+# another proxy and header, the first response is kept. Nothing is hedged
+# before HEDGE_MIN_SAMPLES requests were timed
+HEDGE_JD_FETCHES = False
+HEDGE_PERCENTILE = 95
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+# A host's circuit opens after CIRCUIT_FAILURES blocks (redirects, 403s,
+# 429s) within CIRCUIT_WINDOW seconds, pausing every scraper for
+# CIRCUIT_OPEN_SECONDS. One request then probes the host: a block doubles
+# the pause up to CIRCUIT_MAX_OPEN, a page closes the circuit. The others
+# ask again every CIRCUIT_POLL_SECONDS, and a probe lost with its process
+# is given to another after CIRCUIT_PROBE_TIMEOUT
+CIRCUIT_FAILURES = 10
+CIRCUIT_WINDOW = 60
+CIRCUIT_OPEN_SECONDS = 30
+CIRCUIT_MAX_OPEN = 600
+CIRCUIT_POLL_SECONDS = 5
+CIRCUIT_PROBE_TIMEOUT = CONNECT_TIMEOUT + READ_TIMEOUT + 5
+
+# BeautifulSoup builder parsing every page: "lxml" is several times faster
+# than the pure python "html.parser", used instead if lxml is not installed
+HTML_PARSER = "lxml"
+
+# Content scrapers with CONTENT_ENGINE = "pipeline" fetch with
+# PIPELINE_FETCHERS threads, keep HTTP_POOL_MAXSIZE above it (above twice
+# as many with HEDGE_JD_FETCHES, each fetch may race a hedge), and parse
+# with PIPELINE_PARSERS processes. At most PIPELINE_QUEUE_SIZE fetched
+# pages wait for the parsers
+PIPELINE_FETCHERS = 16
+PIPELINE_PARSERS = 2
+PIPELINE_QUEUE_SIZE = 32
@@ -0,0 +1,21 @@
+#
+# Shared helpers of the tests: pages saved from the sites under fixtures/
+#
+# =====================================================================
+
+import os
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read_page(name):
+    """Return the html of a saved page"""
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def page():
+    return read_page
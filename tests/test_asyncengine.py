@@ -0,0 +1,125 @@
+#
+# Async engine sending requests through proxies of the pool
+#
+# =====================================================================
+
+import asyncio
+
+import aiohttp
+import pytest
+
+from base import asyncengine
+from base.asyncengine import AsyncContentEngine, proxy_url
+from utils.proxypool import ProxyPool
+
+PAGE = b"<html><body><div class='summary'>jd</div></body></html>"
+
+
+class Breaker:
+    def check(self, url):
+        return 0, None
+
+    def report(self, url, ok, probe=None):
+        return False
+
+
+class Limiter:
+    def reserve(self, url):
+        return 0
+
+    def observe(self, url, status=None, elapsed=None):
+        pass
+
+
+class Scraper:
+    """What get_page uses of a content scraper"""
+
+    def __init__(self, proxy):
+        self.proxy_pool = ProxyPool([proxy])
+        self.breaker = Breaker()
+        self.limiter = Limiter()
+        self.record = {"total_time_circuit_wait": 0, "total_time_rate_wait": 0}
+
+    def get_proxies(self):
+        proxy = self.proxy_pool.pick()
+        return {"http": proxy, "https": proxy}
+
+
+async def start_proxy(seen):
+    """Start an HTTP proxy answering every request with PAGE,
+    keeping the request lines it gets in seen
+    """
+
+    async def handle(reader, writer):
+        seen.append((await reader.readline()).decode().strip())
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+            b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(PAGE) + PAGE
+        )
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def get_page(scraper, url):
+    engine = AsyncContentEngine(scraper, "test")
+
+    async def main():
+        async with aiohttp.ClientSession() as session:
+            return await engine.get_page(session, url, {"User-Agent": "test"})
+
+    try:
+        return asyncio.run(main())
+    finally:
+        engine._redis.shutdown()
+        engine._db.shutdown()
+
+
+def test_proxy_url():
+    assert proxy_url("1.2.3.4:8080") == "http://1.2.3.4:8080"
+    assert proxy_url("http://1.2.3.4:8080") == "http://1.2.3.4:8080"
+    assert proxy_url(None) is None
+
+
+def test_page_through_proxy(monkeypatch):
+    monkeypatch.setattr(asyncengine, "USE_PROXIES", True)
+    seen = []
+
+    async def main():
+        server = await start_proxy(seen)
+        port = server.sockets[0].getsockname()[1]
+        scraper = Scraper("127.0.0.1:{}".format(port))
+        engine = AsyncContentEngine(scraper, "test")
+        try:
+            async with aiohttp.ClientSession() as session:
+                page = await engine.get_page(
+                    session, "http://jobs.example/job/1", {"User-Agent": "test"}
+                )
+        finally:
+            server.close()
+            engine._redis.shutdown()
+            engine._db.shutdown()
+        return scraper, page
+
+    scraper, (status, html) = asyncio.run(main())
+
+    assert (status, html) == (200, PAGE.decode())
+    # The request went to the proxy, which was told it worked
+    assert seen == ["GET http://jobs.example/job/1 HTTP/1.1"]
+    health = list(scraper.proxy_pool.health.values())[0]
+    assert (health.successes, health.failures) == (1, 0)
+
+
+@pytest.mark.parametrize("proxy", ["127.0.0.1:1", "127.0.0.1:port"])
+def test_bad_proxy_reported(monkeypatch, proxy):
+    monkeypatch.setattr(asyncengine, "USE_PROXIES", True)
+    scraper = Scraper(proxy)
+
+    with pytest.raises((aiohttp.InvalidURL, aiohttp.ClientProxyConnectionError)):
+        get_page(scraper, "http://jobs.example/job/1")
+
+    health = list(scraper.proxy_pool.health.values())[0]
+    assert health.failures == 1
@@ -0,0 +1,256 @@
+#
+# Extractor built from the *_FIELDS settings gives the same job info as
+# the if/elif chains of the info scrapers it replaced
+#
+# =====================================================================
+
+import logging
+from datetime import datetime
+
+import pytest
+from bs4 import BeautifulSoup
+
+from base.extractor import Extractor
+from indeed_scraper.indeedinfo import IndeedJobInfoScraper
+from jora_scraper.jorainfo import JoraJobInfoScraper
+from settings.indeedsettings import INDEED_FIELDS, INDEED_STATES
+from settings.jorasettings import JORA_FIELDS, JORA_STATES
+from settings.seeksettings import SEEK_FIELDS
+
+PERIOD = ["hour", "day", "week", "month", "year"]
+PERIODICALLY = ["hourly", "daily", "weekly", "monthly", "yearly"]
+
+
+# +  -  -  - OLD CHAINS -  -  - +
+
+# Field extraction of the info scrapers before the Extractor, listing
+# dates kept as shown since they are turned into post times after
+
+
+def old_location(info, key, result, states):
+    info["jobState"] = "<missing>"
+    info["jobArea"] = "<missing>"
+    if result is None:
+        info[key] = "<missing>"
+        return
+    result = result.get_text().strip(" \n")
+    info[key] = result
+    new_value = result.split()
+    if len(new_value) >= 2:
+        info["jobState"] = new_value[-1]
+        info["jobArea"] = " ".join(new_value[:-1])
+        for k, val in states.items():
+            if " ".join(new_value) == val:
+                info["jobState"] = k
+                info["jobArea"] = "<missing>"
+    elif len(new_value) == 1:
+        for k, val in states.items():
+            if new_value[0] == k or new_value[0] == val:
+                info["jobState"] = k
+
+
+def old_salary(info, key, result):
+    if not result:
+        info[key] = "<missing>"
+        return
+    result = result.get_text().strip(" \n").split()
+    for idx in range(len(PERIOD)):
+        if len(result) == 3 and result[2] == PERIOD[idx]:
+            info[key] = "{} {}".format(result[0], PERIODICALLY[idx])
+        if len(result) == 5 and result[4] == PERIOD[idx]:
+            info[key] = "{}-{} {}".format(result[0], result[2], PERIODICALLY[idx])
+
+
+def old_text(info, key, result, trim=False):
+    if result is None:
+        info[key] = "<missing>"
+        return
+    result = result.get_text().strip(" \n")
+    if trim:
+        result = result.strip(",...")
+    info[key] = result
+
+
+def old_seek(article):
+    info = {}
+    for k in [
+        "jobTitle",
+        "jobCompany",
+        "jobLocation",
+        "jobClassification",
+        "jobSubClassification",
+        "jobArea",
+        "jobListingDate",
+        "jobShortDescription",
+    ]:
+        tag = article.find(attrs={"data-automation": k})
+        if tag:
+            info[k] = tag.text
+            if k == "jobCompany" and tag.has_attr("href"):
+                advertiserid = tag["href"][19:]
+                if advertiserid.isdigit():
+                    info["advertiserid"] = advertiserid
+                else:
+                    info["advertiserid"] = "<missing advertiserid>"
+    return info
+
+
+def old_indeed(article):
+    info = {}
+    result = article.find("a", class_="jobtitle")
+    if not result:
+        result = article.find("a", class_="jobtitle turnstileLink")
+    if not result:
+        result = article.find("a")
+    old_text(info, "jobTitle", result)
+    old_text(info, "jobCompany", article.find(class_="company"))
+    old_location(info, "jobLocation", article.find(class_="location"), INDEED_STATES)
+    old_text(info, "jobShortDescription", article.find(class_="summary"), trim=True)
+    old_text(info, "jobListingDate", article.find("span", class_="date"))
+
+    result = article.find("span", class_="sponsoredGray")
+    if result:
+        info["sponsored"] = True
+        result = result.get_text().strip(" \n").split()
+        if len(result) >= 2:
+            info["sponsored_by"] = result[-1]
+        else:
+            info["sponsored_by"] = "<missing>"
+    else:
+        info["sponsored"] = False
+        info["sponsored_by"] = "<missing>"
+
+    old_salary(info, "salary", article.find("span", class_="no-wrap"))
+
+    result = article.find("span", class_="slNoUnderline")
+    if result:
+        info["numReviews"] = result.get_text().strip(" \n").split()[0]
+    else:
+        info["numReviews"] = "<missing>"
+    return info
+
+
+def old_jora(article):
+    info = {}
+    result = article.a
+    if result:
+        info["jobTitle"] = result.get_text().strip(" \n")
+    else:
+        info["jobTitle"] = "<missing>"
+    old_text(info, "jobCompany", article.find("span", class_="company"))
+    old_location(
+        info, "jobLocation", article.find("span", class_="location"), JORA_STATES
+    )
+    old_salary(info, "salary", article.find("div", class_="salary"))
+    old_text(info, "jobListingDate", article.find("span", class_="date"))
+    old_text(
+        info, "jobShortDescription", article.find("div", class_="summary"), trim=True
+    )
+    return info
+
+
+# +  -  -  - ARTICLES -  -  - +
+
+
+def seek_articles(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.find_all("article", attrs={"data-automation": "normalJob"})
+
+
+def indeed_articles(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.find("td", id="resultsCol").select(".row")
+
+
+def jora_articles(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.find("ul", id="jobresults").find_all("li", class_="result")
+
+
+SITES = [
+    ("seek_listing.html", seek_articles, SEEK_FIELDS, old_seek),
+    ("indeed_listing.html", indeed_articles, INDEED_FIELDS, old_indeed),
+    ("jora_listing.html", jora_articles, JORA_FIELDS, old_jora),
+]
+
+
+def article(html):
+    return BeautifulSoup(html, "html.parser").find()
+
+
+def info_scraper(cls, fields):
+    """Info scraper of cls able to scrape_job_info, without the
+    connections made by its __init__
+    """
+    scraper = cls.__new__(cls)
+    scraper.extractor = Extractor(fields)
+    scraper.log = logging.getLogger(__name__)
+    return scraper
+
+
+# +  -  -  - TESTS -  -  - +
+
+
+@pytest.mark.parametrize("name, articles, fields, old", SITES)
+def test_same_as_old_chain(page, name, articles, fields, old):
+    extractor = Extractor(fields)
+    found = articles(page(name))
+
+    assert found
+    for job in found:
+        assert extractor.extract(job) == old(job)
+
+
+def test_indeed_missing_fields():
+    job = article(
+        '<div class="row result" data-jk="f1"><a class="jobtitle">Payroll</a>'
+        '<span class="date">3 days ago</span></div>'
+    )
+    info = Extractor(INDEED_FIELDS).extract(job)
+
+    assert info == old_indeed(job)
+    # Fields the site left out are kept as <missing>, the article is not
+    for key in ("jobCompany", "jobLocation", "jobState", "jobArea", "salary"):
+        assert info[key] == "<missing>"
+
+
+def test_seek_missing_fields_left_out():
+    job = article(
+        '<article data-automation="normalJob" data-job-id="1">'
+        '<a data-automation="jobTitle">Payroll</a></article>'
+    )
+    info = Extractor(SEEK_FIELDS).extract(job)
+
+    assert info == old_seek(job) == {"jobTitle": "Payroll"}
+
+
+@pytest.mark.parametrize(
+    "cls, fields, html",
+    [
+        (
+            IndeedJobInfoScraper,
+            INDEED_FIELDS,
+            '<div class="row result" data-jk="f1"><a class="jobtitle">Payroll</a>'
+            '<span class="date">{}</span></div>',
+        ),
+        (
+            JoraJobInfoScraper,
+            JORA_FIELDS,
+            '<li class="result" id="j_f1"><a>Payroll</a>'
+            '<span class="date">{}</span></li>',
+        ),
+    ],
+)
+def test_scrape_job_info_missing_fields(cls, fields, html):
+    scraper = info_scraper(cls, fields)
+    now = datetime(2020, 3, 10, 12, 0)
+
+    info, time_limit = scraper.scrape_job_info(article(html.format("3d ago")), 7, now)
+    assert time_limit
+    assert info["jobid"] == "f1"
+    assert info["jobCompany"] == info["jobLocation"] == "<missing>"
+    assert info["jobListingDate"] == "2020-03-07 12:00:00"
+
+    # Only jobs older than the day limit come back empty
+    info, time_limit = scraper.scrape_job_info(article(html.format("9d ago")), 7, now)
+    assert (info, time_limit) == ({}, False)
@@ -0,0 +1,68 @@
+#
+# Requests and connections of the shared session counted across pools
+# evicted by the pool managers
+#
+# =====================================================================
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from base.session import CountingAdapter, connection_stats
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servers():
+    """Urls of two hosts, so a pool manager keeping one pool evicts"""
+    started = [ThreadingHTTPServer(("127.0.0.1", 0), Handler) for _ in range(2)]
+    for server in started:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield ["http://127.0.0.1:{}/".format(s.server_address[1]) for s in started]
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def session_keeping(pools):
+    session = requests.Session()
+    adapter = CountingAdapter(pool_connections=pools)
+    session.mount("http://", adapter)
+    return session
+
+
+def test_counts_kept_across_evictions(servers):
+    session = session_keeping(1)
+    first, second = servers
+
+    for url in (first, first, second, first):
+        session.get(url).close()
+
+    # Only the last pool is still held, with one request
+    assert len(session.get_adapter(first).poolmanager.pools) == 1
+    assert connection_stats(session) == (4, 3)
+
+
+def test_counts_without_eviction(servers):
+    session = session_keeping(10)
+    first, second = servers
+
+    for url in (first, first, second, first):
+        session.get(url).close()
+
+    assert connection_stats(session) == (4, 2)
@@ -0,0 +1,176 @@
+#
+# Saved pages parsed as the scrapers do, with the lxml builder and the
+# strainers of *_PARSE_ONLY, give the same fields and jd as whole pages
+# parsed with html.parser
+#
+# =====================================================================
+
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+from base.extractor import Extractor
+from indeed_scraper import indeedcontent
+from jora_scraper import joracontent
+from seek_scraper import seekcontent
+from settings import indeedsettings, jorasettings, seeksettings
+from utils import soup as soup_utils
+from utils.soup import make_soup, strainer
+
+
+def whole_page(html):
+    """Parse a page whole, as the scrapers did before"""
+    return BeautifulSoup(html, "html.parser")
+
+
+# +  -  -  - LISTINGS -  -  - +
+
+# What each info scraper reads of a page of job articles
+
+
+def seek_listing(soup):
+    extractor = Extractor(seeksettings.SEEK_FIELDS)
+    total = soup.find("strong", attrs={"data-automation": "totalJobsCount"})
+    zero = soup.find("div", attrs={"data-automation": "searchZeroResults"})
+    articles = soup.find_all("article", attrs={"data-automation": "normalJob"})
+    jobs = [dict(extractor.extract(a), jobid=a["data-job-id"]) for a in articles]
+    return total.get_text(), zero is not None, jobs
+
+
+def indeed_listing(soup):
+    extractor = Extractor(indeedsettings.INDEED_FIELDS)
+    articles = soup.find("td", id="resultsCol").select(".row")
+    return [
+        dict(extractor.extract(a), jobid=a.get("data-jk") or a.get("data-tk"))
+        for a in articles
+    ]
+
+
+def jora_listing(soup):
+    extractor = Extractor(jorasettings.JORA_FIELDS)
+    articles = soup.find("ul", id="jobresults").find_all("li", class_="result")
+    return [dict(extractor.extract(a), jobid=a.attrs["id"][2:]) for a in articles]
+
+
+LISTINGS = [
+    ("seek_listing.html", seeksettings.INFO_PARSE_ONLY, seek_listing),
+    ("indeed_listing.html", indeedsettings.INFO_PARSE_ONLY, indeed_listing),
+    ("jora_listing.html", jorasettings.INFO_PARSE_ONLY, jora_listing),
+]
+
+
+# +  -  -  - JOB ADS -  -  - +
+
+# parse_job_content of each content scraper as it was before
+
+
+def seek_jd(html):
+    soup = whole_page(html)
+    if soup.find("div", attrs={"data-automation": "expiredJobPage"}):
+        return None
+    content = soup.find("div", class_="templatetext")
+    if not content:
+        content = soup.find("div", class_="_2e4Pi2B")
+    if content:
+        return str(content)
+    return None
+
+
+def indeed_jd(html):
+    soup = whole_page(re.sub("<!--|-->", "", html))
+    jd = soup.find("div", class_="jobsearch-JobComponent-description icl-u-xs-mt--md")
+    if not jd:
+        jd = soup.find("span", class_="summary")
+    if not jd:
+        jd = soup.find("span", id="job_summary")
+    if jd:
+        return str(jd)
+    if soup.find("div", class_="container"):
+        return "<missing>"
+    return None
+
+
+def jora_jd(html):
+    soup = whole_page(re.sub("<!--|-->", "", html))
+    jd = soup.find("div", class_="summary")
+    if jd:
+        return str(jd)
+    return "<missing>"
+
+
+JDS = [
+    ("seek_jd.html", seekcontent.parse_job_content, seek_jd),
+    ("seek_jd_expired.html", seekcontent.parse_job_content, seek_jd),
+    ("indeed_jd.html", indeedcontent.parse_job_content, indeed_jd),
+    ("indeed_jd_missing.html", indeedcontent.parse_job_content, indeed_jd),
+    ("jora_jd.html", joracontent.parse_job_content, jora_jd),
+]
+
+
+# +  -  -  - TESTS -  -  - +
+
+
+def test_pages_are_parsed_with_lxml():
+    assert soup_utils.PARSER == "lxml"
+
+
+@pytest.mark.parametrize("name, parse_only, read", LISTINGS)
+def test_listing_same_as_whole_page(page, name, parse_only, read):
+    html = page(name)
+    soup = make_soup(html, strainer(parse_only))
+
+    assert read(soup) == read(whole_page(html))
+    # Only the tags read were built
+    assert soup.find("script") is None
+
+
+@pytest.mark.parametrize("name, parse, reference", JDS)
+def test_jd_same_as_whole_page(page, name, parse, reference):
+    html = page(name)
+
+    assert parse(html) == reference(html)
+
+
+def test_listings_have_jobs(page):
+    # Guards the tests above against pages matching nothing
+    assert len(seek_listing(whole_page(page("seek_listing.html")))[2]) == 3
+    assert len(indeed_listing(whole_page(page("indeed_listing.html")))) == 5
+    assert len(jora_listing(whole_page(page("jora_listing.html")))) == 4
+
+
+def test_jd_found(page):
+    assert seekcontent.parse_job_content(page("seek_jd.html")).startswith("<div")
+    assert seekcontent.parse_job_content(page("seek_jd_expired.html")) is None
+    assert indeedcontent.parse_job_content(page("indeed_jd.html")).startswith("<div")
+    assert indeedcontent.parse_job_content(page("indeed_jd_missing.html")) == (
+        "<missing>"
+    )
+    assert joracontent.parse_job_content(page("jora_jd.html")).startswith("<div")
+
+
+@pytest.mark.parametrize(
+    "tag",
+    [
+        '<div data-automation="expiredJobPage">',
+        "<div data-automation='expiredJobPage'>",
+        "<div data-automation=expiredJobPage>",
+        '<div class="x" data-automation = "expiredJobPage" >',
+        '<DIV\n  data-automation="expiredJobPage"/>',
+    ],
+)
+def test_expired_page_attribute_styles(tag):
+    assert seekcontent.is_job_expired("<body>" + tag + "</div></body>")
+    assert seek_jd("<body>" + tag + "</div></body>") is None
+
+
+@pytest.mark.parametrize(
+    "tag",
+    [
+        '<div data-automation="expiredJobPageLink">',
+        '<a data-automation="expiredJobPage">',
+        '<div data-automation="jobAdDetails">',
+    ],
+)
+def test_not_expired_page(tag):
+    assert not seekcontent.is_job_expired("<body>" + tag + "</div></body>")
@@ -0,0 +1,89 @@
+#
+# Batch writers keeping a failed batch for the next flush, or inserting
+# it row by row when no flush comes after
+#
+# =====================================================================
+
+import logging
+
+import pytest
+
+from base.writer import InfoBatchWriter, JdBatchWriter
+
+
+class Queue:
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+class Scraper:
+    """What the writers use of a scraper"""
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self.rqueue = Queue()
+        self.record = {}
+
+    def count(self, key, amount=1):
+        self.record[key] = self.record.get(key, 0) + amount
+
+
+def failing_batches(writer, inserted):
+    """Make writer fail on batches of more than one row, as a
+    transient error would, and insert single rows
+    """
+
+    def insert(rows):
+        if len(rows) > 1:
+            raise ConnectionError("server closed the connection")
+        return inserted(rows)
+
+    writer.insert = insert
+
+
+@pytest.fixture
+def info_writer():
+    writer = InfoBatchWriter(Scraper(), "test", size=10, retries=3)
+    failing_batches(writer, lambda rows: [rows[0][0]])
+    for jobid in ("1", "2"):
+        writer.add({"jobid": jobid, "scraped_at": "2020-03-10 12:00:00"})
+    return writer
+
+
+@pytest.fixture
+def jd_writer():
+    writer = JdBatchWriter(Scraper(), "test", size=10, retries=3)
+    failing_batches(writer, len)
+    for jobid in ("1", "2"):
+        writer.add(jobid, "<div>jd</div>")
+    return writer
+
+
+def test_info_batch_kept_for_next_flush(info_writer):
+    with pytest.raises(ConnectionError):
+        info_writer.flush()
+
+    assert [row[0] for row in info_writer.rows] == ["1", "2"]
+    assert info_writer.scraper.rqueue.items == []
+
+
+def test_info_final_flush_inserts_rows(info_writer):
+    assert info_writer.flush(final=True) == ["1", "2"]
+    assert info_writer.rows == []
+    assert info_writer.scraper.rqueue.items == ["1", "2"]
+
+
+def test_jd_batch_kept_for_next_flush(jd_writer):
+    with pytest.raises(ConnectionError):
+        jd_writer.flush()
+
+    assert [row[0] for row in jd_writer.rows] == ["1", "2"]
+
+
+def test_jd_final_flush_inserts_rows(jd_writer):
+    assert jd_writer.flush(final=True) == 2
+    assert jd_writer.rows == []
+    assert jd_writer.scraper.record["jd_rows_written"] == 2
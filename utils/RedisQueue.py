@@ -2,14 +2,21 @@ import json
 
 import redis
 
+from settings.settings import REDIS_DB, REDIS_HOST, REDIS_PASSWORD, REDIS_PORT
+
+
+def get_redis():
+    """Return a client of the Redis shared by all scrapers"""
+    return redis.StrictRedis(
+        password=REDIS_PASSWORD, port=REDIS_PORT, host=REDIS_HOST, db=REDIS_DB
+    )
+
 
 class RedisQueue:
     """A queeue made with Redis list allows FIFO features"""
 
     def __init__(self, qkey):
-        self._queue = redis.StrictRedis(
-            password="stevedang", port=6379, host="localhost", db=0
-        )
+        self._queue = get_redis()
         self.key = qkey
 
     def size(self):
@@ -0,0 +1,185 @@
+#
+# Circuit breaker per target host kept in Redis, so a site blocking us
+# pauses every info and content process at once and one of them probes
+# whether the block is over
+#
+# =====================================================================
+
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from settings.settings import (
+    CIRCUIT_FAILURES,
+    CIRCUIT_MAX_OPEN,
+    CIRCUIT_OPEN_SECONDS,
+    CIRCUIT_POLL_SECONDS,
+    CIRCUIT_PROBE_TIMEOUT,
+    CIRCUIT_WINDOW,
+)
+from utils.RedisQueue import get_redis
+
+# States of a circuit
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Closed: go. Open: wait until it may be probed. Otherwise the first
+# caller taking the probe lock goes as the probe, the others poll
+CHECK_SCRIPT = """
+local state = redis.call("HGET", KEYS[1], "state")
+if not state or state == "closed" then
+    return "0"
+end
+local now = tonumber(ARGV[1])
+if state == "open" then
+    local open_until = tonumber(redis.call("HGET", KEYS[1], "open_until"))
+    if now < open_until then
+        return tostring(open_until - now)
+    end
+end
+if redis.call("SET", KEYS[2], ARGV[2], "NX", "EX", ARGV[3]) then
+    redis.call("HSET", KEYS[1], "state", "half_open")
+    return "probe"
+end
+return ARGV[4]
+"""
+
+# The probe closes the circuit or opens it again for twice as long;
+# blocks seen while closed open it once `failures` fall in one window.
+# ARGV[1] is "1" for a page, "0" for a block, "" when the request
+# failed for another reason, which only gives the probe up
+REPORT_SCRIPT = """
+local state = redis.call("HGET", KEYS[1], "state") or "closed"
+local ok = ARGV[1]
+local now = tonumber(ARGV[3])
+local base = tonumber(ARGV[6])
+if ARGV[2] ~= "" and redis.call("GET", KEYS[2]) == ARGV[2] then
+    redis.call("DEL", KEYS[2])
+    if ok == "1" then
+        redis.call("HMSET", KEYS[1], "state", "closed", "open_for", base)
+        redis.call("DEL", KEYS[3])
+        return "closed"
+    elseif ok == "0" then
+        local open_for = tonumber(redis.call("HGET", KEYS[1], "open_for")) or base
+        open_for = math.min(tonumber(ARGV[7]), open_for * 2)
+        redis.call(
+            "HMSET", KEYS[1],
+            "state", "open", "open_until", now + open_for, "open_for", open_for
+        )
+        return "opened"
+    end
+    return state
+end
+if ok ~= "0" or state ~= "closed" then
+    return state
+end
+local failures = redis.call("INCR", KEYS[3])
+if failures == 1 then
+    redis.call("EXPIRE", KEYS[3], ARGV[5])
+end
+if failures < tonumber(ARGV[4]) then
+    return state
+end
+redis.call(
+    "HMSET", KEYS[1],
+    "state", "open", "open_until", now + base, "open_for", base
+)
+redis.call("DEL", KEYS[3])
+return "opened"
+"""
+
+
+def is_block(status, missing_status=()):
+    """Return True if a response with HTTP status means we are blocked
+
+    # Arguments:
+        status: HTTP status
+        missing_status: statuses the site answers for a missing job,
+                        e.g. Indeed redirecting expired jobs
+    """
+    if status in missing_status:
+        return False
+    return 300 <= status < 400 or status in (403, 429)
+
+
+class CircuitBreaker:
+    """Circuit breaker of every host, shared by all processes.
+
+    A host's circuit opens after `failures` blocks within `window`
+    seconds. Requests then wait `open_seconds`, when one of them probes
+    the host: a page closes the circuit, a block opens it again for
+    twice as long, up to `max_open` seconds.
+    """
+
+    def __init__(
+        self,
+        failures=CIRCUIT_FAILURES,
+        window=CIRCUIT_WINDOW,
+        open_seconds=CIRCUIT_OPEN_SECONDS,
+        max_open=CIRCUIT_MAX_OPEN,
+        poll=CIRCUIT_POLL_SECONDS,
+        probe_timeout=CIRCUIT_PROBE_TIMEOUT,
+    ):
+        self.failures = failures
+        self.window = window
+        self.open_seconds = open_seconds
+        self.max_open = max_open
+        self.poll = poll
+        self.probe_timeout = probe_timeout
+        self._redis = get_redis()
+        self._check = self._redis.register_script(CHECK_SCRIPT)
+        self._report = self._redis.register_script(REPORT_SCRIPT)
+
+    def keys(self, url):
+        host = urlsplit(url).netloc
+        return [
+            "circuit:{}".format(host),
+            "circuit:{}:probe".format(host),
+            "circuit:{}:failures".format(host),
+        ]
+
+    def check(self, url):
+        """Ask whether a request to url may be sent
+
+        # Returns:
+            seconds to wait before asking again, 0 to send it,
+            and the probe token if the request probes the host
+        """
+        token = uuid.uuid4().hex
+        result = self._check(
+            keys=self.keys(url)[:2],
+            args=[time.time(), token, self.probe_timeout, self.poll],
+        )
+        if result == b"probe":
+            return 0, token
+        return float(result), None
+
+    def report(self, url, ok, probe=None):
+        """Report the outcome of a request to url
+
+        # Arguments:
+            url: url requested
+            ok: True for a page, False for a block, None if the request
+                failed otherwise
+            probe: probe token returned by check
+        # Returns:
+            True if this report opened the circuit
+        """
+        # Pages only matter to a probe, sparing a round trip per request
+        if ok is not False and probe is None:
+            return False
+        flag = "" if ok is None else str(int(ok))
+        result = self._report(
+            keys=self.keys(url),
+            args=[
+                flag,
+                probe or "",
+                time.time(),
+                self.failures,
+                self.window,
+                self.open_seconds,
+                self.max_open,
+            ],
+        )
+        return result == b"opened"
@@ -0,0 +1,77 @@
+#
+# Listing dates of job ads ("3d ago", "30+ days ago", "about 4 hours
+# ago", "Just posted") turned into the time jobs were posted
+#
+# =====================================================================
+
+import re
+from datetime import timedelta
+from functools import lru_cache
+
+# Seconds in a unit, by every spelling the sites use
+UNITS = {
+    name: seconds
+    for seconds, names in (
+        (1, ("s", "sec", "secs", "second", "seconds")),
+        (60, ("m", "min", "mins", "minute", "minutes")),
+        (3600, ("h", "hr", "hrs", "hour", "hours")),
+        (86400, ("d", "day", "days")),
+        (7 * 86400, ("w", "week", "weeks")),
+        (30 * 86400, ("mo", "month", "months")),
+    )
+    for name in names
+}
+
+# Listings of jobs posted moments ago
+JUST_POSTED = {"just posted", "just now", "today", "new"}
+
+# An amount and a unit, e.g. "3d ago", "30+ days ago", "about 4 hours ago",
+# "less than a minute ago"; "a" or "an" stands for 1
+AGE = re.compile(r"^(?:about |over |less than )?(\d+|an?)\+? ?([a-z]+)(?: ago)?$")
+
+
+@lru_cache(maxsize=1024)
+def parse_age(listing_date):
+    """Return how long ago a job was posted
+
+    # Arguments:
+        listing_date: listing date as shown by the site
+    # Returns:
+        timedelta, None if listing_date is not understood
+    """
+    text = " ".join(listing_date.lower().split())
+    if text in JUST_POSTED:
+        return timedelta(0)
+
+    match = AGE.match(text)
+    if match is None:
+        return None
+    amount, unit = match.groups()
+    if unit not in UNITS:
+        return None
+    amount = 1 if amount in ("a", "an") else int(amount)
+    return timedelta(seconds=amount * UNITS[unit])
+
+
+def posted_time(listing_date, now):
+    """Return the time a job was posted, None if listing_date
+    is missing or not understood
+    """
+    if not listing_date:
+        return None
+    age = parse_age(listing_date)
+    if age is None:
+        return None
+    return now - age
+
+
+def posted_times(listing_dates, now):
+    """Return the time each job of a page was posted,
+    all taken back from the same reference time `now`
+    """
+    return [posted_time(listing_date, now) for listing_date in listing_dates]
+
+
+def within_days(posted, now, days):
+    """Return True if a job posted at `posted` is at most `days` days old"""
+    return (now - posted).days <= int(float(days))
@@ -0,0 +1,51 @@
+#
+# Wall-clock deadlines of scraping work and the request timeouts they allow
+#
+# =====================================================================
+
+import time
+
+from settings.settings import CONNECT_TIMEOUT, READ_TIMEOUT
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work is attempted after its deadline"""
+
+
+class Deadline:
+    """Wall-clock budget of a piece of work, started at creation.
+    Holds an absolute time so it can be passed to other processes
+
+    # Arguments:
+        seconds: budget from now, None for no limit
+        parent: deadline of the enclosing work, never outlived
+    """
+
+    def __init__(self, seconds=None, parent=None):
+        self.expires_at = None if seconds is None else time.time() + seconds
+        if parent is not None and parent.expires_at is not None:
+            if self.expires_at is None or parent.expires_at < self.expires_at:
+                self.expires_at = parent.expires_at
+
+    def remaining(self):
+        """Return seconds left, None if there is no limit"""
+        if self.expires_at is None:
+            return None
+        return max(0, self.expires_at - time.time())
+
+    def expired(self):
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    def check(self):
+        """Raise DeadlineExceeded if the deadline has passed"""
+        if self.expired():
+            raise DeadlineExceeded(
+                "deadline passed {:.1f}s ago".format(time.time() - self.expires_at)
+            )
+
+    def timeout(self, connect=CONNECT_TIMEOUT, read=READ_TIMEOUT):
+        """Return (connect, read) timeouts of requests cut to the time left"""
+        left = self.remaining()
+        if left is None:
+            return connect, read
+        return min(connect, left), min(read, left)
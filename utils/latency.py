@@ -0,0 +1,30 @@
+#
+# Window of recent request latencies, used to tell when a request is
+# slow enough to be hedged
+#
+# =====================================================================
+
+from collections import deque
+
+from settings.settings import HEDGE_MIN_SAMPLES, HEDGE_WINDOW
+
+
+class LatencyWindow:
+    """Last `size` latencies, in seconds"""
+
+    def __init__(self, size=HEDGE_WINDOW, min_samples=HEDGE_MIN_SAMPLES):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def percentile(self, p):
+        """Return the p-th percentile of the window,
+        None until min_samples latencies were seen
+        """
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
@@ -0,0 +1,146 @@
+#
+# Pool of proxies picked by health instead of in turn:
+# success rate, latency EWMA and cooldown are kept per proxy
+#
+# =====================================================================
+
+import random
+import time
+
+from settings.settings import (
+    PROXY_COOLDOWN,
+    PROXY_EVICT_FAILURES,
+    PROXY_EWMA_ALPHA,
+)
+
+# Latency assumed for a proxy not measured yet, and the floor used for
+# weights so one lucky fast response does not take all the traffic
+DEFAULT_LATENCY = 1.0
+MIN_LATENCY = 0.05
+
+# Longest cooldown, however long the failure streak
+MAX_COOLDOWN = 600
+
+
+class ProxyHealth:
+    """Health of one proxy"""
+
+    __slots__ = ("successes", "failures", "streak", "latency", "cooldown_until")
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.streak = 0
+        self.latency = None
+        self.cooldown_until = 0
+
+    def success_rate(self):
+        # Laplace prior: an unused proxy starts at 0.5
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def weight(self):
+        latency = DEFAULT_LATENCY if self.latency is None else self.latency
+        return self.success_rate() / max(latency, MIN_LATENCY)
+
+
+class ProxyPool:
+    """Proxies weighted by success rate over latency EWMA.
+
+    A failing proxy cools down for `cooldown` seconds, doubling with each
+    failure in a row, and is evicted after `evict_after` failures in a row.
+    """
+
+    def __init__(
+        self,
+        proxies=(),
+        alpha=PROXY_EWMA_ALPHA,
+        cooldown=PROXY_COOLDOWN,
+        evict_after=PROXY_EVICT_FAILURES,
+    ):
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.evict_after = evict_after
+        self.health = {}
+        self.evicted = 0
+        self.add(proxies)
+
+    def __len__(self):
+        return len(self.health)
+
+    def add(self, proxies):
+        """Add proxies, keeping health of those already known"""
+        for proxy in proxies:
+            if proxy not in self.health:
+                self.health[proxy] = ProxyHealth()
+
+    def available(self, now=None):
+        """Return proxies not cooling down"""
+        now = time.time() if now is None else now
+        return [p for p, h in list(self.health.items()) if h.cooldown_until <= now]
+
+    def healthy(self):
+        """Return number of proxies not cooling down"""
+        return len(self.available())
+
+    def pick(self):
+        """Return a proxy chosen at random weighted by health,
+        the one back soonest if all are cooling down, None if pool is empty
+        """
+        # Copied, as hedged requests report from two threads
+        health = list(self.health.items())
+        if not health:
+            return None
+        now = time.time()
+        candidates = [(p, h) for p, h in health if h.cooldown_until <= now]
+        if not candidates:
+            return min(health, key=lambda ph: ph[1].cooldown_until)[0]
+        weights = [h.weight() for _, h in candidates]
+        return random.choices(candidates, weights=weights)[0][0]
+
+    def report(self, proxy, ok, latency=None):
+        """Update health of proxy with the outcome of a request
+
+        # Arguments:
+            proxy: proxy used
+            ok: True if the request went through the proxy
+            latency: seconds the request took
+        """
+        health = self.health.get(proxy)
+        if health is None:
+            return
+
+        if ok:
+            health.successes += 1
+            health.streak = 0
+            if latency is not None:
+                if health.latency is None:
+                    health.latency = latency
+                else:
+                    health.latency += self.alpha * (latency - health.latency)
+            return
+
+        health.failures += 1
+        health.streak += 1
+        if health.streak >= self.evict_after:
+            # Threads may report the same proxy at once, only the first
+            # one evicts it
+            if self.health.pop(proxy, None) is not None:
+                self.evicted += 1
+            return
+        cooldown = min(self.cooldown * 2 ** (health.streak - 1), MAX_COOLDOWN)
+        health.cooldown_until = time.time() + cooldown
+
+    def stats(self):
+        """Return a summary of the pool's health"""
+        health = list(self.health.values())
+        measured = [h.latency for h in health if h.latency is not None]
+        successes = sum(h.successes for h in health)
+        failures = sum(h.failures for h in health)
+        return {
+            "proxies": len(health),
+            "healthy": self.healthy(),
+            "evicted": self.evicted,
+            "successes": successes,
+            "failures": failures,
+            "avg_latency": sum(measured) / len(measured) if measured else None,
+        }
@@ -0,0 +1,160 @@
+#
+# Token bucket per target host kept in Redis, so every info and content
+# process of every site draws from the same budget
+#
+# =====================================================================
+
+import time
+from urllib.parse import urlsplit
+
+from settings import indeedsettings, jorasettings, seeksettings
+from settings.settings import (
+    AIMD_COOLDOWN,
+    AIMD_DECREASE,
+    AIMD_INCREASE,
+    AIMD_SLOW_SECONDS,
+)
+from utils.RedisQueue import get_redis
+
+# (rate, burst, min rate, max rate) per host, from settings of each site
+RATE_LIMITS = {
+    site.HOST: (site.RATE_LIMIT, site.RATE_BURST, site.RATE_MIN, site.RATE_MAX)
+    for site in (seeksettings, indeedsettings, jorasettings)
+}
+
+# Refill the bucket for the time passed since the last call, then take
+# one token. The bucket may go below zero: a caller owning a negative
+# token is told how long to wait for it, so waiting callers are served
+# in order without polling Redis. Only the bucket (KEYS[1]) expires once
+# full again, the rate learned by AIMD is read from KEYS[2] which is kept.
+RESERVE_SCRIPT = """
+local rate = tonumber(redis.call("HGET", KEYS[2], "rate")) or tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call("HGET", KEYS[1], "tokens"))
+local ts = tonumber(redis.call("HGET", KEYS[1], "ts"))
+if tokens == nil then
+    tokens = burst
+    ts = now
+end
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - 1
+redis.call("HMSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("EXPIRE", KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+if tokens >= 0 then
+    return "0"
+end
+return tostring(-tokens / rate)
+"""
+
+# AIMD on the rate of a host: every fast 200 adds increase / rate, so
+# the rate grows by about `increase` per second at full speed; a bounce
+# multiplies it by `decrease`, at most once per cooldown so a burst of
+# failed requests in flight counts as one signal. The rate and the time
+# of the last cut are kept in a key of their own (KEYS[1]) with no TTL.
+ADJUST_SCRIPT = """
+local mode = ARGV[1]
+local start = tonumber(ARGV[2])
+local low = tonumber(ARGV[3])
+local high = tonumber(ARGV[4])
+local now = tonumber(ARGV[5])
+local rate = tonumber(redis.call("HGET", KEYS[1], "rate")) or start
+if mode == "increase" then
+    rate = math.min(high, rate + tonumber(ARGV[6]) / rate)
+else
+    local cut_at = tonumber(redis.call("HGET", KEYS[1], "cut_at")) or 0
+    if now - cut_at < tonumber(ARGV[7]) then
+        return tostring(rate)
+    end
+    rate = math.max(low, rate * tonumber(ARGV[8]))
+    redis.call("HSET", KEYS[1], "cut_at", now)
+end
+redis.call("HSET", KEYS[1], "rate", rate)
+return tostring(rate)
+"""
+
+
+class RateLimiter:
+    """Rate limiter of all hosts listed in RATE_LIMITS,
+    requests to other hosts are never delayed.
+    The rate of a host starts at RATE_LIMIT and is adjusted between
+    RATE_MIN and RATE_MAX from the responses reported to observe()
+    """
+
+    def __init__(self, limits=RATE_LIMITS):
+        self.limits = limits
+        self._redis = get_redis()
+        self._reserve = self._redis.register_script(RESERVE_SCRIPT)
+        self._adjust = self._redis.register_script(ADJUST_SCRIPT)
+
+    def key(self, host):
+        return "ratelimit:{}".format(host)
+
+    def aimd_key(self, host):
+        return "ratelimit:{}:aimd".format(host)
+
+    def reserve(self, url):
+        """Take a token of the host of url
+
+        # Arguments:
+            url: url about to be requested
+        # Returns:
+            seconds to wait before sending the request
+        """
+        host = urlsplit(url).netloc
+        if host not in self.limits:
+            return 0
+        rate, burst = self.limits[host][:2]
+        wait = self._reserve(
+            keys=[self.key(host), self.aimd_key(host)],
+            args=[rate, burst, time.time()],
+        )
+        return float(wait)
+
+    def acquire(self, url):
+        """Block until a request to url is allowed
+
+        # Returns:
+            seconds spent waiting
+        """
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def observe(self, url, status=None, elapsed=0):
+        """Adjust the rate of the host of url from the outcome of a request
+
+        # Arguments:
+            url: url requested
+            status: HTTP status, None if the request timed out
+                    or could not connect
+            elapsed: seconds the request took
+        # Returns:
+            new rate of the host, None if it did not change
+        """
+        host = urlsplit(url).netloc
+        if host not in self.limits:
+            return None
+
+        if status is None or 300 <= status < 400 or status == 429:
+            mode = "decrease"
+        elif status == 200 and elapsed < AIMD_SLOW_SECONDS:
+            mode = "increase"
+        else:
+            return None
+
+        rate, burst, low, high = self.limits[host]
+        new_rate = self._adjust(
+            keys=[self.aimd_key(host)],
+            args=[
+                mode,
+                rate,
+                low,
+                high,
+                time.time(),
+                AIMD_INCREASE,
+                AIMD_COOLDOWN,
+                AIMD_DECREASE,
+            ],
+        )
+        return float(new_rate)
@@ -0,0 +1,71 @@
+#
+# Proxies and user agents shared by all scrapers through Redis,
+# published with a version by refresher.py
+#
+# =====================================================================
+
+import time
+
+from utils.RedisQueue import get_redis
+
+PROXIES_KEY = "registry:proxies"
+AGENTS_KEY = "registry:user_agents"
+VERSION_KEY = "registry:version"
+REFRESH_KEY = "registry:refresh"
+
+
+class Registry:
+    """Versioned lists of proxies and user agents kept in Redis"""
+
+    def __init__(self):
+        self._redis = get_redis()
+
+    def version(self):
+        """Return version of the lists, 0 if nothing was published yet"""
+        version = self._redis.get(VERSION_KEY)
+        return int(version) if version else 0
+
+    def load(self):
+        """Return version, proxies and user agents read together"""
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.get(VERSION_KEY)
+        pipe.smembers(PROXIES_KEY)
+        pipe.smembers(AGENTS_KEY)
+        version, proxies, agents = pipe.execute()
+        return (
+            int(version) if version else 0,
+            {p.decode("utf-8") for p in proxies},
+            {a.decode("utf-8") for a in agents},
+        )
+
+    def publish(self, proxies, agents):
+        """Replace the lists and bump the version in one transaction,
+        so readers see either the old or the new lists.
+        An empty list keeps the one published before.
+
+        # Returns:
+            new version
+        """
+        pipe = self._redis.pipeline(transaction=True)
+        for key, members in ((PROXIES_KEY, proxies), (AGENTS_KEY, agents)):
+            if members:
+                new_key = "{}:new".format(key)
+                pipe.delete(new_key)
+                pipe.sadd(new_key, *members)
+                pipe.rename(new_key, key)
+        pipe.incr(VERSION_KEY)
+        # Requests made before this refresh are answered by it
+        pipe.delete(REFRESH_KEY)
+        return pipe.execute()[-2]
+
+    def request_refresh(self):
+        """Ask the refresher for new lists without waiting for them"""
+        self._redis.rpush(REFRESH_KEY, time.time())
+
+    def wait_refresh_request(self, timeout):
+        """Block until a scraper asks for new lists or timeout seconds pass
+
+        # Returns:
+            True if a refresh was asked for
+        """
+        return self._redis.blpop(REFRESH_KEY, timeout=timeout) is not None
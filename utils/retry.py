@@ -0,0 +1,158 @@
+#
+# Retry policy of fetches: classified outcomes, jittered exponential
+# backoff and a retry budget per site
+#
+# =====================================================================
+
+import random
+from urllib.parse import urlsplit
+
+from requests import exceptions
+
+from settings.settings import (
+    RETRY_BASE_DELAY,
+    RETRY_BUDGET_CAP,
+    RETRY_BUDGET_RATIO,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY,
+)
+
+# +  -  -  - OUTCOMES -  -  - +
+
+OK = "ok"
+BOUNCE = "bounce"
+SERVER_ERROR = "server_error"
+SSL = "ssl"
+PROXY = "proxy"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+REQUEST = "request"
+# Page served without its content, retried for sites known to do so
+INCOMPLETE = "incomplete"
+
+# Outcomes worth another try
+RETRYABLE = {BOUNCE, SERVER_ERROR, SSL, PROXY, TIMEOUT, CONNECTION, INCOMPLETE}
+
+# Record key counting each failed outcome
+ERROR_COUNTERS = {
+    BOUNCE: "bounces",
+    SERVER_ERROR: "server_errors",
+    SSL: "ssl_errors",
+    PROXY: "proxy_errors",
+    TIMEOUT: "timeout_errors",
+    CONNECTION: "conn_errors",
+    REQUEST: "request_errors",
+}
+
+
+def classify_status(status):
+    """Return outcome of a response with HTTP status"""
+    if 300 <= status < 400 or status == 429:
+        return BOUNCE
+    if status >= 500:
+        return SERVER_ERROR
+    return OK
+
+
+def classify_error(error):
+    """Return outcome of a request that raised error"""
+    if isinstance(error, exceptions.SSLError):
+        return SSL
+    if isinstance(error, exceptions.ProxyError):
+        return PROXY
+    if isinstance(error, exceptions.Timeout):
+        return TIMEOUT
+    if isinstance(error, exceptions.ConnectionError):
+        return CONNECTION
+    return REQUEST
+
+
+# +  -  -  - POLICY -  -  - +
+
+
+class RetryBudget:
+    """Retries allowed as a share of requests made to a site:
+    every request saves `ratio` of a retry, up to `cap` retries
+    """
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, cap=RETRY_BUDGET_CAP):
+        self.ratio = ratio
+        self.cap = cap
+        self.tokens = cap
+
+    def deposit(self):
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def withdraw(self):
+        """Take one retry, return False if none is left"""
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+# Budgets of this process, one per host
+_budgets = {}
+
+
+def get_budget(url):
+    """Return retry budget of the host of url"""
+    host = urlsplit(url).netloc
+    if host not in _budgets:
+        _budgets[host] = RetryBudget()
+    return _budgets[host]
+
+
+class RetryPolicy:
+    """Decide whether and when a failed fetch is tried again.
+
+    Delays are drawn at random up to the exponential backoff, so workers
+    failing together do not retry together.
+    """
+
+    def __init__(
+        self,
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY,
+        max_delay=RETRY_MAX_DELAY,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def started(self, url):
+        """Note a new fetch of url, adding to the retry budget of its site"""
+        get_budget(url).deposit()
+
+    def backoff(self, attempt):
+        """Return a random delay up to the backoff after attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def retry_delay(self, url, outcome, attempt, deadline=None, record=None):
+        """Return seconds to wait before trying url again,
+        None if it should not be retried
+
+        # Arguments:
+            url: url fetched
+            outcome: outcome of the last attempt
+            attempt: number of attempts made so far
+            deadline: deadline of the work, no retry ends after it
+            record: scraper record counting retries and denied retries
+        """
+        if outcome not in RETRYABLE or attempt >= self.max_attempts:
+            return None
+
+        delay = self.backoff(attempt)
+        if deadline is not None:
+            left = deadline.remaining()
+            if left is not None and left <= delay:
+                return None
+
+        if not get_budget(url).withdraw():
+            if record is not None:
+                record["retries_denied"] += 1
+            return None
+
+        if record is not None:
+            record["retries"] += 1
+        return delay
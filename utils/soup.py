@@ -0,0 +1,54 @@
+#
+# Parsing of pages into BeautifulSoup trees, with the builder set in
+# HTML_PARSER when it is installed
+#
+# =====================================================================
+
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+
+from settings.settings import HTML_PARSER
+
+# Pure python builder shipped with bs4, used when HTML_PARSER is missing
+FALLBACK_PARSER = "html.parser"
+
+PARSER = HTML_PARSER if builder_registry.lookup(HTML_PARSER) else FALLBACK_PARSER
+
+
+def make_soup(markup, parse_only=None):
+    """Parse a page
+
+    # Arguments:
+        markup: html of the page
+        parse_only: SoupStrainer of the tags to keep, None keeps all
+    # Returns:
+        BeautifulSoup tree of the page
+    """
+    return BeautifulSoup(markup, PARSER, parse_only=parse_only)
+
+
+def strainer(spec):
+    """Build the SoupStrainer of a site's *_PARSE_ONLY setting
+
+    # Arguments:
+        spec: dict of the tag "name" and "attrs" to keep, as given to
+              find(), None to keep the whole page
+    # Returns:
+        SoupStrainer, None if spec is None
+    """
+    if not spec:
+        return None
+    attrs = dict(spec.get("attrs", {}))
+
+    # Strainers see the class attribute before it is split, so a class
+    # is matched as one of the words of it, as find() does
+    classes = attrs.get("class")
+    if classes:
+        if isinstance(classes, str):
+            classes = [classes]
+        attrs["class"] = re.compile(
+            r"(^|\s)({})(\s|$)".format("|".join(re.escape(c) for c in classes))
+        )
+    return SoupStrainer(spec.get("name"), attrs)
@@ -6,6 +6,9 @@ import urllib3
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Downloaded lists are kept here as a fallback of the Redis registry
+PROXY_FILES = "./utils/proxy_files/"
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_13_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/67.0.3396.99 Safari/537.36"
 }
@@ -22,7 +25,8 @@ def download_free_proxies(to_csv=True):
     df.reset_index(inplace=True)
 
     if to_csv:
-        df.to_csv("./proxy_files/proxies.csv")
+        df.to_csv(PROXY_FILES + "proxies.csv")
+    return proxies_from_frame(df)
 
 
 def download_agent_headers(to_csv=True):
@@ -41,7 +45,33 @@ def download_agent_headers(to_csv=True):
 
     results = pd.concat(dfs)
     if to_csv:
-        results.to_csv("./proxy_files/user_agents.csv")
+        results.to_csv(PROXY_FILES + "user_agents.csv")
+    return list(results["User agent"].dropna())
+
+
+def proxies_from_frame(df):
+    """Return proxies as 'ip:port' from a table of free-proxy-list.net"""
+    return [
+        ":".join([r["IP Address"], str(int(float(r["Port"])))])
+        for _, r in df.iterrows()
+    ]
+
+
+def read_proxies():
+    """Return proxies saved by download_free_proxies"""
+    return proxies_from_frame(pd.read_csv(PROXY_FILES + "proxies.csv"))
+
+
+def read_user_agents():
+    """Return user agents saved by download_agent_headers"""
+    df = pd.read_csv(PROXY_FILES + "user_agents.csv")
+    return list(df["User agent"].dropna())
+
+
+def month_start(day, months=0):
+    """Return the first day of the month `months` months after `day`"""
+    year, month = divmod(day.month - 1 + months, 12)
+    return day.replace(year=day.year + year, month=month + 1, day=1)
 
 
 if __name__ == "__main__":